@@ -0,0 +1,275 @@
+# 端到端采集性能测试
+# 用pty虚拟串口代替真实设备，按指定速率发送数据，经 SerialManager -> 数据库/图表 完整处理，
+# 统计持续吞吐量、丢失和迟到的样本数，以及从收到字节到数据库提交、到图表刷新的延迟分位数，结果输出为JSON，
+# 便于在不同提交之间比较解析、写入和绘制的性能变化
+# 用法: python benchmark.py --rate 5000 --duration 10 --protocol ascii --devices 2 --output result.json
+
+import os
+import sys
+import pty
+import tty
+import json
+import time
+import argparse
+import platform
+import resource
+import threading
+import subprocess
+
+# 没有显示器的机器上使用offscreen平台
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+
+import numpy as np
+from PyQt5.QtCore import QTimer
+from sensor_core import ChannelRegistry, BinaryFrameDecoder, setup_logging
+
+# 虚拟串口设备，在独立线程中按固定速率向pty主端写入数据，读取端像真实串口一样打开从端
+class PtyDevice(threading.Thread):
+
+    # 预先生成的数据周期长度(行或帧数)，发送时循环使用
+    PATTERN_SIZE = 1000
+
+    # 初始化虚拟设备，rate为每秒发送的行(帧)数，tick为发送间隔(s)
+    def __init__(self, channels, rate, protocol="ascii", tick=0.002, seed=0):
+        super().__init__(daemon=True)
+        self.rate = rate
+        self.tick = tick
+        self.master, self.slave = pty.openpty()
+        tty.setraw(self.slave)
+        self.path = os.ttyname(self.slave)
+        self.sent = 0  # 已发送的行(帧)数
+        self.behind = 0  # 写入跟不上速率的次数，说明读取端处理不过来
+        self._running = False
+        
+        # 生成一个周期的数据: 0/1通道随机翻转，模拟量通道为正弦波
+        rng = np.random.default_rng(seed)
+        n = self.PATTERN_SIZE
+        rows = []
+        for channel in channels:
+            if channel.is_binary:
+                rows.append((rng.random(n) < 0.3).astype(np.int64) * int(channel.maximum))
+            else:
+                span = channel.maximum - channel.minimum
+                wave = (channel.minimum + channel.maximum) / 2 + 0.4 * span * np.sin(np.arange(n) * 2 * np.pi / n)
+                rows.append(np.round(wave).astype(np.int64))
+        values = np.column_stack(rows).tolist()
+        if protocol == "binary":
+            self.chunks = [BinaryFrameDecoder.encode_frame(channels, row) for row in values]
+        else:
+            self.chunks = [(",".join(str(v) for v in row) + "\n").encode() for row in values]
+
+    # 发送线程主循环，按经过的时间计算应发送的行数，一次写入
+    def run(self):
+        self._running = True
+        start = time.perf_counter()
+        n = len(self.chunks)
+        while self._running:
+            due = int((time.perf_counter() - start) * self.rate)
+            count = due - self.sent
+            if count > 0:
+                first = self.sent % n
+                indices = (np.arange(first, first + count) % n).tolist()
+                os.write(self.master, b"".join([self.chunks[i] for i in indices]))
+                self.sent += count
+                # 一次要补发多个间隔的数据，说明写入被阻塞(读取端处理不过来)或发送线程被延误
+                if count > 5 * self.rate * self.tick:
+                    self.behind += 1
+            time.sleep(self.tick)
+
+    # 停止发送
+    def stop(self):
+        self._running = False
+        self.join(2)
+
+    # 关闭pty
+    def close(self):
+        os.close(self.master)
+        os.close(self.slave)
+
+# 统计延迟分布，单位ms
+def latency_summary(chunks):
+    if not chunks:
+        return {"count": 0}
+    latencies = np.concatenate(chunks) * 1000
+    p50, p90, p99 = np.percentile(latencies, [50, 90, 99]).tolist()
+    return {
+        "count": int(len(latencies)),
+        "mean_ms": float(latencies.mean()),
+        "p50_ms": p50,
+        "p90_ms": p90,
+        "p99_ms": p99,
+        "max_ms": float(latencies.max()),
+    }
+
+# 当前代码的git提交，用于比较不同提交的测试结果
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip() or None
+    except OSError:
+        return None
+
+# 生成测试用的通道配置，count为空时使用默认的热敏/光敏两通道
+def make_channels(count=None):
+    if not count:
+        return ChannelRegistry.default()
+    items = [{"name": "thermal", "kind": "binary", "min": 0, "max": 1}]
+    items += [{"name": f"ch{i}", "kind": "analog", "min": 0, "max": 4095} for i in range(1, count)]
+    return ChannelRegistry.from_config(items)
+
+# 运行一次测试，返回结果字典
+def run_benchmark(rate=1000, duration=10.0, protocol="ascii", devices=1, channel_count=None,
+                  gui=True, baud=115200, db_name=None, drain_timeout=10.0, storage="raw"):
+    channels = make_channels(channel_count)
+    if db_name is None:
+        db_name = f"benchmark_{os.getpid()}.db"
+    for suffix in ("", "-wal", "-shm"):
+        if os.path.exists(db_name + suffix):
+            os.remove(db_name + suffix)
+
+    commit_latencies = []
+    render_latencies = []
+
+    # 图形界面模式使用完整的主窗口，否则只有采集和存储
+    if gui:
+        from PyQt5.QtWidgets import QApplication
+        from main import MainWindow
+        app = QApplication.instance() or QApplication(sys.argv[:1])
+        window = MainWindow(channels, db_name, storage=storage)
+        window.show()
+        db_manager = window.db_manager
+        serial_manager = window.serial_manager
+        window.chart_manager.render_callback = lambda timestamps_ms: render_latencies.append(
+            time.time() - timestamps_ms / 1000)
+    else:
+        from PyQt5.QtCore import QCoreApplication
+        from sensor_core import DatabaseManager, SerialManager
+        app = QCoreApplication.instance() or QCoreApplication(sys.argv[:1])
+        window = None
+        db_manager = DatabaseManager(db_name, channels, storage=storage)
+        serial_manager = SerialManager(channels, db_manager.insert_batch)
+    db_manager.writer.commit_callback = lambda timestamps, committed: commit_latencies.append(
+        committed - timestamps)
+
+    # 每个虚拟设备连接一个串口，连接后再开始发送，避免打开串口时清空输入缓冲区丢掉数据
+    feeders = [PtyDevice(channels, rate, protocol, seed=i) for i in range(devices)]
+    for feeder in feeders:
+        serial_manager.connect_port(feeder.path, baud, protocol, db_manager.get_device_id(feeder.path))
+
+    start = time.perf_counter()
+    for feeder in feeders:
+        feeder.start()
+    cpu_start = time.process_time()
+
+    # 发送duration秒后停止，等待剩余数据写入数据库
+    state = {"phase": "feeding", "stop_time": None}
+
+    def poll():
+        now = time.perf_counter()
+        if state["phase"] == "feeding" and now - start >= duration:
+            for feeder in feeders:
+                feeder.stop()
+            state["phase"] = "draining"
+            state["stop_time"] = now
+        elif state["phase"] == "draining":
+            sent = sum(feeder.sent for feeder in feeders)
+            if db_manager.get_writer_stats()["rows_written"] >= sent or now - state["stop_time"] > drain_timeout:
+                app.quit()
+
+    timer = QTimer()
+    timer.timeout.connect(poll)
+    timer.start(20)
+    app.exec_()
+    timer.stop()
+    feed_elapsed = state["stop_time"] - start
+    total_elapsed = time.perf_counter() - start
+    cpu_seconds = time.process_time() - cpu_start
+
+    device_stats = serial_manager.get_device_stats()
+    merger_stats = serial_manager.merger.get_stats()
+    writer_stats = db_manager.get_writer_stats()
+    queue_stats = dict(serial_manager.get_queue_stats(), **db_manager.get_queue_stats())
+    if window is not None:
+        window.close()
+    else:
+        serial_manager.close()
+        db_manager.close()
+    for feeder in feeders:
+        feeder.close()
+    # 数据库文件(含WAL)的大小，比较不同存储方式写入的数据量
+    db_bytes = 0
+    for suffix in ("", "-wal", "-shm"):
+        if os.path.exists(db_name + suffix):
+            db_bytes += os.path.getsize(db_name + suffix)
+            os.remove(db_name + suffix)
+
+    sent = sum(feeder.sent for feeder in feeders)
+    committed = writer_stats["rows_written"]
+    return {
+        "commit": git_commit(),
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "config": {
+            "rate_per_device": rate,
+            "devices": devices,
+            "channels": len(channels),
+            "protocol": protocol,
+            "duration_s": duration,
+            "gui": gui,
+            "storage": storage,
+        },
+        "samples_sent": sent,
+        "samples_committed": committed,
+        "samples_dropped": max(0, sent - committed),
+        "late_samples": merger_stats["late_samples"],
+        "parse_errors": sum(device["parse_errors"] for device in device_stats.values()),
+        "feeder_behind": sum(feeder.behind for feeder in feeders),
+        "throughput_per_s": committed / feed_elapsed,
+        "drain_s": total_elapsed - feed_elapsed,
+        "cpu_percent": 100 * cpu_seconds / total_elapsed,
+        "peak_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+        "rows_stored": writer_stats["rows_stored"],
+        "db_bytes": db_bytes,
+        "latency_to_commit": latency_summary(commit_latencies),
+        "latency_to_chart": latency_summary(render_latencies) if gui else None,
+        "writer": writer_stats,
+        "merger": merger_stats,
+        "queues": queue_stats,
+    }
+
+# 解析命令行参数并运行测试
+def main():
+    parser = argparse.ArgumentParser(description="端到端采集性能测试")
+    parser.add_argument("--rate", type=int, nargs="+", default=[1000],
+                        help="每个设备每秒发送的行(帧)数，可以指定多个速率依次测试")
+    parser.add_argument("--duration", type=float, default=10.0, help="每次测试发送数据的时间(s)")
+    parser.add_argument("--protocol", choices=("ascii", "binary"), default="ascii", help="数据协议")
+    parser.add_argument("--devices", type=int, default=1, help="同时连接的虚拟设备数")
+    parser.add_argument("--channels", type=int, default=None, help="通道数，默认使用热敏/光敏两通道")
+    parser.add_argument("--no-gui", action="store_true", help="不创建主窗口，只测试采集和存储")
+    parser.add_argument("--storage", choices=("raw", "compressed"), default="raw", help="原始数据的存储方式")
+    parser.add_argument("--output", help="结果JSON文件，默认输出到标准输出")
+    args = parser.parse_args()
+
+    # 程序运行时的输出转到标准错误，标准输出只保留JSON结果
+    stdout = sys.stdout
+    sys.stdout = sys.stderr
+    # 测试时只输出警告和错误，逐条的状态日志会影响测得的性能
+    setup_logging("WARNING")
+    results = []
+    for rate in args.rate:
+        print(f"测试: 每个设备 {rate} 条/s, {args.devices} 个设备, 协议 {args.protocol}, {args.duration} s",
+              file=sys.stderr)
+        results.append(run_benchmark(rate, args.duration, args.protocol, args.devices, args.channels,
+                                     not args.no_gui, storage=args.storage))
+    sys.stdout = stdout
+
+    text = json.dumps(results if len(results) > 1 else results[0], ensure_ascii=False, indent=2)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(text + "\n")
+    else:
+        stdout.write(text + "\n")
+
+if __name__ == "__main__":
+    main()
@@ -34,529 +34,763 @@ if os.path.exists(qt5_plugins_path):
     os.environ["QT_PLUGIN_PATH"] = qt5_plugins_path
     print(f"设置QT_PLUGIN_PATH为: {qt5_plugins_path}")
 
-import os
+# 无界面模式(--headless)只运行采集和存储，命令行导出(--export)和整理数据库(--vacuum)完成后退出，
+# 都在导入QtWidgets和QtChart之前进入
+if __name__ == "__main__" and {"--headless", "--export", "--vacuum"} & set(sys.argv[1:]):
+    from sensor_core import headless_main
+    sys.exit(headless_main(sys.argv[1:]))
+
 import time
-import random
-import math
-import sqlite3
-import serial
-import serial.tools.list_ports
+import logging
+import numpy as np
 from datetime import datetime, timedelta
 from PyQt5.QtWidgets import (QApplication, QMainWindow, QWidget, QVBoxLayout, 
                             QHBoxLayout, QGridLayout, QLabel, QPushButton, 
                             QComboBox, QGroupBox, QRadioButton, QMessageBox,
-                            QSplitter)
-from PyQt5.QtCore import Qt, QTimer, pyqtSignal, QObject, QDateTime, QPointF
+                            QSplitter, QScrollArea, QDockWidget, QTableWidget, QTableWidgetItem,
+                            QHeaderView, QAction, QDialog, QDialogButtonBox, QFormLayout, QDateTimeEdit,
+                            QLineEdit, QFileDialog, QProgressDialog)
+from PyQt5.QtCore import Qt, QTimer, QThread, pyqtSignal, QDateTime, QPointF, QPoint, QRect
 from PyQt5.QtGui import QPainter, QFont, QColor, QPen
 from PyQt5.QtChart import (QChart, QChartView, QLineSeries, QDateTimeAxis, 
                           QValueAxis, QScatterSeries)
+from sensor_core import (ChannelRegistry, DatabaseManager, SerialManager, DataSimulator, parse_args,
+                         simulator_options, LatencyHistogram, EventLoopMonitor, PerformanceMonitor,
+                         setup_logging, queue_options, QUEUE_DEFAULTS, DataExporter, HistoryTileLoader,
+                         SharedSampleRing, RemoteAcquisition, HotStore, RollingStats)
 
-# 数据库管理类，负责数据的存储和查询
-class DatabaseManager:
-    
-    def __init__(self, db_name="sensor_data.db"):
-
-        # 初始化数据库连接并创建表
-        self.db_name = db_name
-        self.conn = None
-        self.cursor = None
-        self.connect()
-        self.create_tables()
-    
-    def connect(self):
-
-        # 连接到数据库
-        try:
-            self.conn = sqlite3.connect(self.db_name)
-            self.cursor = self.conn.cursor()
-            print(f"成功连接到数据库: {self.db_name}")
-        except sqlite3.Error as e:
-            print(f"数据库连接错误: {e}")
-
-    # 创建传感器数据表
-    def create_tables(self):
-        try:
-            self.cursor.execute('''
-                CREATE TABLE IF NOT EXISTS sensor_data (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    timestamp DATETIME DEFAULT CURRENT_TIMESTAMP,
-                    thermal_value INTEGER,
-                    light_value INTEGER
-                )
-            ''')
-            self.conn.commit()
-            print("数据表创建成功")
-        except sqlite3.Error as e:
-            print(f"创建表错误: {e}")
-
-    # 插入传感器数据
-    def insert_data(self, thermal_value, light_value):
-        try:
-            self.cursor.execute('''
-                INSERT INTO sensor_data (timestamp, thermal_value, light_value)
-                VALUES (datetime('now', 'localtime'), ?, ?)
-            ''', (thermal_value, light_value))
-            self.conn.commit()
-            return True
-        except sqlite3.Error as e:
-            print(f"插入数据错误: {e}")
-            return False
+# 界面组件的日志记录器
+ui_log = logging.getLogger("sensor.ui")
 
-    # 获取最近指定分钟的数据
-    def get_recent_data(self, minutes=60):
-        try:
-            self.cursor.execute('''
-                SELECT timestamp, thermal_value, light_value
-                FROM sensor_data
-                WHERE timestamp >= datetime('now', 'localtime', ?)
-                ORDER BY timestamp
-            ''', (f'-{minutes} minutes',))
-            return self.cursor.fetchall()
-        except sqlite3.Error as e:
-            print(f"查询数据错误: {e}")
-            return []
-
-    # 清理指定分钟之前的旧数据
-    def clean_old_data(self, minutes=60):
-        try:
-            self.cursor.execute('''
-                DELETE FROM sensor_data
-                WHERE timestamp < datetime('now', 'localtime', ?)
-            ''', (f'-{minutes} minutes',))
-            self.conn.commit()
-            print(f"已清理 {self.cursor.rowcount} 条旧数据")
-        except sqlite3.Error as e:
-            print(f"清理数据错误: {e}")
-
-    # 关闭数据库连接
-    def close(self):
-        if self.conn:
-            self.conn.close()
-            print("数据库连接已关闭")
-
-# 串口管理类，负责串口通信
-class SerialManager(QObject):
+# 图表数据抽稀器，把可见范围内的原始数据压缩到与像素宽度相当的点数，绘制开销与原始点数无关
+class Decimator:
 
-    # 定义信号
-    data_received = pyqtSignal(int, int)  # 热敏值, 光敏值
-    connection_status = pyqtSignal(bool, str)  # 连接状态, 消息
+    MODES = ("minmax", "lttb")
+
+    # 初始化抽稀器，mode为"minmax"(每像素列保留首/末/最小/最大值)或"lttb"(最大三角形三桶算法)
+    def __init__(self, mode="minmax"):
+        self.mode = mode
+
+    # 抽稀一个通道的数据，timestamps须按时间排序
+    # binary为True的通道(如热敏状态)始终使用minmax，保证每个0/1跳变都能显示出来
+    def decimate(self, timestamps, values, t0, t1, width_px, binary=False):
+        columns = max(1, int(width_px))
+        if binary or self.mode == "minmax":
+            return self.minmax(timestamps, values, t0, t1, columns)
+        return self.lttb(timestamps, values, 2 * columns)
+
+    # 按像素列分组，每列保留第一个、最后一个、最小值和最大值四个点(M4算法)
+    # 输出最多4倍列数个点，与原始数据画出的折线在像素级别上一致
+    @staticmethod
+    def minmax(timestamps, values, t0, t1, columns):
+        count = len(timestamps)
+        if count <= 4 * columns or t1 <= t0:
+            return timestamps, values
+        
+        cols = ((timestamps - t0) * (columns / (t1 - t0))).astype(np.int64)
+        np.clip(cols, -1, columns, out=cols)
+        starts = np.concatenate(([0], np.flatnonzero(np.diff(cols)) + 1))
+        ends = np.append(starts[1:], count) - 1
+        
+        # 每列的最小值和最大值，再找出各列中第一个等于该值的位置
+        group = np.repeat(np.arange(len(starts)), ends - starts + 1)
+        extremes = [starts, ends]
+        for reduce in (np.minimum, np.maximum):
+            hits = np.flatnonzero(values == reduce.reduceat(values, starts)[group])
+            first = np.flatnonzero(np.diff(group[hits], prepend=-1))
+            extremes.append(hits[first])
+        index = np.unique(np.concatenate(extremes))
+        return timestamps[index], values[index]
 
-    # 初始化串口管理器
-    def __init__(self):
+    # 最大三角形三桶(LTTB)降采样，保留视觉上最重要的点
+    @staticmethod
+    def lttb(timestamps, values, threshold):
+        count = len(timestamps)
+        if threshold >= count or threshold < 3:
+            return timestamps, values
+        
+        # 首尾点固定保留，中间的点分成 threshold - 2 个桶
+        edges = np.linspace(1, count - 1, threshold - 1).astype(np.int64)
+        index = np.empty(threshold, dtype=np.int64)
+        index[0] = 0
+        index[-1] = count - 1
+        selected = 0
+        for i in range(threshold - 2):
+            start, end = edges[i], edges[i + 1]
+            # 下一个桶的平均点
+            next_end = edges[i + 2] if i + 2 < len(edges) else count
+            next_start = end if end < next_end else next_end - 1
+            avg_x = timestamps[next_start:next_end].mean()
+            avg_y = values[next_start:next_end].mean()
+            
+            # 在当前桶中选择与上一个选中点、下一个桶平均点构成三角形面积最大的点
+            ax, ay = timestamps[selected], values[selected]
+            area = np.abs((ax - avg_x) * (values[start:end] - ay)
+                          - (ax - timestamps[start:end]) * (avg_y - ay))
+            selected = start + int(np.argmax(area))
+            index[i + 1] = selected
+        return timestamps[index], values[index]
+
+# 记录每次重绘耗时的图表视图
+class TimedChartView(QChartView):
+
+    # 初始化图表视图，histogram为空时不记录
+    def __init__(self, histogram=None):
         super().__init__()
-        self.serial_port = None
-        self.is_connected = False
-        self.port_name = ""
-        self.baud_rate = 115200  # 默认波特率
-        self.read_timer = QTimer()
-        self.read_timer.timeout.connect(self.read_data)
-        self.read_interval = 100  # 读取间隔(ms)
-
-    # 获取可用的串口列表
-    def get_available_ports(self):
-        ports = []
-        for port in serial.tools.list_ports.comports():
-            ports.append(port.device)
-        return ports
-
-    # 连接到指定串口
-    def connect_port(self, port_name, baud_rate=115200):
-        if self.is_connected:
-            self.disconnect_port()
-        
-        try:
-            self.serial_port = serial.Serial(
-                port=port_name,
-                baudrate=baud_rate,
-                bytesize=serial.EIGHTBITS,
-                parity=serial.PARITY_NONE,
-                stopbits=serial.STOPBITS_ONE,
-                timeout=0.1
-            )
-            self.is_connected = True
-            self.port_name = port_name
-            self.baud_rate = baud_rate
-            self.read_timer.start(self.read_interval)
-            self.connection_status.emit(True, f"已连接到 {port_name}")
-            print(f"已连接到串口: {port_name}, 波特率: {baud_rate}")
-            return True
-        except serial.SerialException as e:
-            self.is_connected = False
-            self.connection_status.emit(False, f"连接失败: {str(e)}")
-            print(f"串口连接错误: {e}")
-            return False
+        self.histogram = histogram
+        self.wheel_handler = None  # 滚轮事件处理函数，返回True表示已处理
 
-    # 断开串口连接
-    def disconnect_port(self):
-        if self.is_connected and self.serial_port:
-            self.read_timer.stop()
-            self.serial_port.close()
-            self.is_connected = False
-            self.connection_status.emit(False, f"已断开连接")
-            print("串口连接已断开")
-
-    # 读取串口数据
-    def read_data(self):
-        if not self.is_connected or not self.serial_port:
+    # 重绘并记录耗时
+    def paintEvent(self, event):
+        if self.histogram is None:
+            super().paintEvent(event)
             return
-        
-        try:
-            if self.serial_port.in_waiting > 0:
-                line = self.serial_port.readline().decode('utf-8').strip()
-                if line:
-                    self.parse_data(line)
-        except serial.SerialException as e:
-            print(f"读取串口数据错误: {e}")
-            self.disconnect_port()
-
-    # 解析传感器数据
-    def parse_data(self, data_str):
-        try:
-            # 数据格式: 热敏状态,光照值
-            parts = data_str.split(',')
-            if len(parts) >= 2:
-                thermal_value = int(parts[0])
-                light_value = int(parts[1])
-                self.data_received.emit(thermal_value, light_value)
-                print(f"接收到数据: 热敏={thermal_value}, 光敏={light_value}")
-        except (ValueError, IndexError) as e:
-            print(f"数据解析错误: {e}, 原始数据: {data_str}")
-
-# 模拟数据生成器类
-class DataSimulator(QObject):
+        start = time.perf_counter()
+        super().paintEvent(event)
+        self.histogram.record(time.perf_counter() - start)
 
-    # 定义信号
-    data_generated = pyqtSignal(int, int)  # 热敏值, 光敏值
+    # 滚轮事件先交给 wheel_handler 处理(历史浏览时缩放和平移)，未处理时按默认方式滚动
+    def wheelEvent(self, event):
+        if self.wheel_handler is not None and self.wheel_handler(event):
+            event.accept()
+            return
+        super().wheelEvent(event)
 
-    # 初始化模拟数据生成器
-    def __init__(self):
-        super().__init__()
-        self.is_running = False
-        self.timer = QTimer()
-        self.timer.timeout.connect(self.generate_data)
-        self.interval = 1000  # 生成间隔(ms)
-
-    # 开始生成模拟数据
-    def start(self):
-        self.is_running = True
-        self.timer.start(self.interval)
-        print("模拟数据生成器已启动")
-
-    # 停止生成模拟数据
-    def stop(self):
-        self.is_running = False
-        self.timer.stop()
-        print("模拟数据生成器已停止")
-
-    # 生成随机模拟数据
-    def generate_data(self):
-
-        # 热敏传感器: 0或1，增加1出现的概率
-        # 每5次数据中随机出现1-2次高温(1)，模拟温度变化
-        thermal_value = 1 if random.random() < 0.3 else 0
-        
-        # 光敏传感器: 100-2000范围，使数值变化更明显
-        # 使用正弦波模拟光照变化，更接近真实场景
-        time_factor = time.time() % 60  # 60秒周期
-        base_value = 1000 + 800 * math.sin(time_factor * math.pi / 30)
-        variation = random.randint(-100, 100)  # 添加随机波动
-        light_value = int(base_value + variation)
-        light_value = max(100, min(2000, light_value))  # 确保在范围内
-        
-        self.data_generated.emit(thermal_value, light_value)
-        print(f"生成模拟数据: 热敏={thermal_value}, 光敏={light_value}")
-
-# 图表管理类，负责图表的创建和更新
-class ChartManager:
+# 单个通道的图表，包括图表视图、折线、当前值标记和坐标轴，由通道定义生成
+class ChannelChart:
 
-    # 初始化图表管理器
-    def __init__(self, thermal_chart_view, light_chart_view):
-        self.thermal_chart_view = thermal_chart_view
-        self.light_chart_view = light_chart_view
-        
-        # 设置图表视图的最小尺寸
-        self.thermal_chart_view.setMinimumSize(800, 400)
-        self.light_chart_view.setMinimumSize(800, 400)
-        
-        # 创建热敏传感器图表
-        self.thermal_chart = QChart()
-        self.thermal_chart.setTitle("热敏传感器数据")
-        self.thermal_chart.setTitleFont(QFont("Arial", 12, QFont.Bold))
-        self.thermal_chart.setAnimationOptions(QChart.NoAnimation)  # 禁用动画以提高响应速度
-        self.thermal_chart.legend().setVisible(True)
-        self.thermal_chart.legend().setAlignment(Qt.AlignBottom)
-        self.thermal_chart.legend().setFont(QFont("Arial", 10))
-        
-        # 创建光敏传感器图表
-        self.light_chart = QChart()
-        self.light_chart.setTitle("光敏传感器数据")
-        self.light_chart.setTitleFont(QFont("Arial", 12, QFont.Bold))
-        self.light_chart.setAnimationOptions(QChart.NoAnimation)  # 禁用动画以提高响应速度
-        self.light_chart.legend().setVisible(True)
-        self.light_chart.legend().setAlignment(Qt.AlignBottom)
-        self.light_chart.legend().setFont(QFont("Arial", 10))
+    # 初始化通道图表，paint_histogram为记录重绘耗时的直方图
+    def __init__(self, channel, paint_histogram=None):
+        self.channel = channel
+        self.last_value = None  # 当前值标记对应的数值，0/1通道状态不变时不重设颜色
         
-        # 创建数据系列
-        self.thermal_series = QLineSeries()
-        self.thermal_series.setName("热敏状态")
-        pen = self.thermal_series.pen()
-        pen.setWidth(2)  # 加粗线条
-        self.thermal_series.setPen(pen)
+        # 创建图表视图
+        self.view = TimedChartView(paint_histogram)
+        self.view.setMinimumSize(800, 300)
+        self.view.setRenderHint(QPainter.Antialiasing)  # 抗锯齿
+        self.view.setRubberBand(QChartView.RectangleRubberBand)  # 允许矩形选择缩放
+        
+        # 创建图表
+        self.chart = QChart()
+        self.chart.setTitle(channel.title)
+        self.chart.setTitleFont(QFont("Arial", 12, QFont.Bold))
+        self.chart.setAnimationOptions(QChart.NoAnimation)  # 禁用动画以提高响应速度
+        self.chart.legend().setVisible(True)
+        self.chart.legend().setAlignment(Qt.AlignBottom)
+        self.chart.legend().setFont(QFont("Arial", 10))
         
-        self.light_series = QLineSeries()
-        self.light_series.setName("光照值")
-        pen = self.light_series.pen()
+        # 创建数据系列
+        self.series = QLineSeries()
+        self.series.setName(channel.label)
+        pen = self.series.pen()
         pen.setWidth(2)  # 加粗线条
-        self.light_series.setPen(pen)
+        self.series.setPen(pen)
         
         # 创建散点系列（用于显示当前值）
-        self.thermal_scatter = QScatterSeries()
-        self.thermal_scatter.setName("当前值")
-        self.thermal_scatter.setMarkerSize(12)  # 增大标记点大小
-        self.thermal_scatter.setColor(Qt.red)  # 设置标记点颜色
-        
-        self.light_scatter = QScatterSeries()
-        self.light_scatter.setName("当前值")
-        self.light_scatter.setMarkerSize(12)  # 增大标记点大小
-        self.light_scatter.setColor(Qt.red)  # 设置标记点颜色
+        self.scatter = QScatterSeries()
+        self.scatter.setName("当前值")
+        self.scatter.setMarkerSize(12)  # 增大标记点大小
+        self.scatter.setColor(Qt.red)  # 设置标记点颜色
         
         # 添加系列到图表
-        self.thermal_chart.addSeries(self.thermal_series)
-        self.thermal_chart.addSeries(self.thermal_scatter)
-        self.light_chart.addSeries(self.light_series)
-        self.light_chart.addSeries(self.light_scatter)
+        self.chart.addSeries(self.series)
+        self.chart.addSeries(self.scatter)
         
         # 创建坐标轴
         self.setup_axes()
         
         # 设置图表视图
-        self.thermal_chart_view.setChart(self.thermal_chart)
-        self.thermal_chart_view.setRenderHint(QPainter.Antialiasing)
-        self.light_chart_view.setChart(self.light_chart)
-        self.light_chart_view.setRenderHint(QPainter.Antialiasing)
+        self.view.setChart(self.chart)
 
-    # 设置图表坐标轴
+    # 设置图表坐标轴，值轴的范围和标题由通道的量程、单位和状态说明决定
     def setup_axes(self):
-
+        channel = self.channel
+        
         # 创建时间轴
-        self.thermal_time_axis = QDateTimeAxis()
-        self.thermal_time_axis.setFormat("HH:mm:ss")
-        self.thermal_time_axis.setTitleText("时间")
-        self.thermal_time_axis.setTitleFont(QFont("Arial", 10, QFont.Bold))
-        self.thermal_time_axis.setLabelsFont(QFont("Arial", 9))
-        self.thermal_time_axis.setTickCount(10)  # 增加刻度数量
-        self.thermal_time_axis.setGridLineVisible(True)  # 显示网格线
-        
-        self.light_time_axis = QDateTimeAxis()
-        self.light_time_axis.setFormat("HH:mm:ss")
-        self.light_time_axis.setTitleText("时间")
-        self.light_time_axis.setTitleFont(QFont("Arial", 10, QFont.Bold))
-        self.light_time_axis.setLabelsFont(QFont("Arial", 9))
-        self.light_time_axis.setTickCount(10)  # 增加刻度数量
-        self.light_time_axis.setGridLineVisible(True)  # 显示网格线
+        self.time_axis = QDateTimeAxis()
+        self.time_axis.setFormat("HH:mm:ss")
+        self.time_axis.setTitleText("时间")
+        self.time_axis.setTitleFont(QFont("Arial", 10, QFont.Bold))
+        self.time_axis.setLabelsFont(QFont("Arial", 9))
+        self.time_axis.setTickCount(10)  # 增加刻度数量
+        self.time_axis.setGridLineVisible(True)  # 显示网格线
         
         # 创建值轴
-        self.thermal_value_axis = QValueAxis()
-        self.thermal_value_axis.setRange(0, 1.5)  # 热敏传感器y轴范围: 0-1.5，使变化更明显
-        self.thermal_value_axis.setTitleText("状态 (0=正常, 1=高温)")
-        self.thermal_value_axis.setTitleFont(QFont("Arial", 10, QFont.Bold))
-        self.thermal_value_axis.setLabelsFont(QFont("Arial", 9))
-        self.thermal_value_axis.setTickCount(3)  # 设置刻度数量
-        self.thermal_value_axis.setMinorTickCount(1)  # 添加小刻度
-        self.thermal_value_axis.setGridLineVisible(True)  # 显示网格线
-        self.thermal_value_axis.setGridLineColor(QColor(200, 200, 200))  # 设置网格线颜色
-        
-        self.light_value_axis = QValueAxis()
-        self.light_value_axis.setRange(100, 4000)  # 光敏传感器y轴范围: 100-4000
-        self.light_value_axis.setTitleText("光照值")
-        self.light_value_axis.setTitleFont(QFont("Arial", 10, QFont.Bold))
-        self.light_value_axis.setLabelsFont(QFont("Arial", 9))
-        self.light_value_axis.setTickCount(10)  # 增加刻度数量
-        self.light_value_axis.setMinorTickCount(1)  # 添加小刻度
-        self.light_value_axis.setGridLineVisible(True)  # 显示网格线
-        self.light_value_axis.setGridLineColor(QColor(200, 200, 200))  # 设置网格线颜色
+        self.value_axis = QValueAxis()
+        if channel.is_binary:
+            # 0/1通道y轴上方多留0.5，使变化更明显
+            self.value_axis.setRange(channel.minimum, channel.maximum + 0.5)
+            states = ", ".join(f"{value}={text}" for value, text in sorted(channel.states.items()))
+            self.value_axis.setTitleText(f"状态 ({states})" if states else channel.label)
+            self.value_axis.setTickCount(3)  # 设置刻度数量
+        else:
+            self.value_axis.setRange(channel.minimum, channel.maximum)
+            self.value_axis.setTitleText(f"{channel.label} ({channel.unit})" if channel.unit else channel.label)
+            self.value_axis.setTickCount(10)  # 增加刻度数量
+        self.value_axis.setTitleFont(QFont("Arial", 10, QFont.Bold))
+        self.value_axis.setLabelsFont(QFont("Arial", 9))
+        self.value_axis.setMinorTickCount(1)  # 添加小刻度
+        self.value_axis.setGridLineVisible(True)  # 显示网格线
+        self.value_axis.setGridLineColor(QColor(200, 200, 200))  # 设置网格线颜色
         
         # 添加坐标轴到图表
-        self.thermal_chart.addAxis(self.thermal_time_axis, Qt.AlignBottom)
-        self.thermal_chart.addAxis(self.thermal_value_axis, Qt.AlignLeft)
-        self.thermal_series.attachAxis(self.thermal_time_axis)
-        self.thermal_series.attachAxis(self.thermal_value_axis)
-        self.thermal_scatter.attachAxis(self.thermal_time_axis)
-        self.thermal_scatter.attachAxis(self.thermal_value_axis)
-        
-        self.light_chart.addAxis(self.light_time_axis, Qt.AlignBottom)
-        self.light_chart.addAxis(self.light_value_axis, Qt.AlignLeft)
-        self.light_series.attachAxis(self.light_time_axis)
-        self.light_series.attachAxis(self.light_value_axis)
-        self.light_scatter.attachAxis(self.light_time_axis)
-        self.light_scatter.attachAxis(self.light_value_axis)
+        self.chart.addAxis(self.time_axis, Qt.AlignBottom)
+        self.chart.addAxis(self.value_axis, Qt.AlignLeft)
+        self.series.attachAxis(self.time_axis)
+        self.series.attachAxis(self.value_axis)
+        self.scatter.attachAxis(self.time_axis)
+        self.scatter.attachAxis(self.value_axis)
+
+    # 更新当前值标记，只保留最后一个点
+    def set_current(self, timestamp_ms, value):
+        self.scatter.replace([QPointF(timestamp_ms, value)])
+        
+        # 0/1通道根据状态设置不同的颜色，状态变化时才重设
+        if self.channel.is_binary and value != self.last_value:
+            self.last_value = value
+            if value >= self.channel.maximum:
+                # 高状态(如高温) - 红色
+                self.scatter.setColor(Qt.red)
+                self.scatter.setMarkerSize(15)  # 增大高状态点的大小
+            else:
+                # 正常状态 - 绿色
+                self.scatter.setColor(Qt.green)
+                self.scatter.setMarkerSize(12)
+
+# 图表管理类，负责图表的创建和更新，每个通道一个图表
+class ChartManager:
+
+    # 历史浏览时滚轮每一格的缩放比例和平移比例(占可见范围)
+    WHEEL_ZOOM = 0.8
+    WHEEL_PAN = 0.1
+    # 历史浏览的最小可见范围(ms)
+    MIN_SPAN_MS = 100
+
+    # 初始化图表管理器，channels为通道注册表，hot_store为保存最近数据的 HotStore，图表直接从中读取数据
+    def __init__(self, channels, hot_store):
+        self.channels = channels
+        self.hot_store = hot_store
+        self.window_minutes = 10  # 图表显示最近10分钟的数据
+        self.decimator = Decimator("minmax")
+        self.follow_live = True  # 为False时(用户缩放后)坐标轴不再跟随最新数据
+        self._updating_range = False  # 正在由程序设置坐标轴范围
+        self.pending = []  # 等待下一帧绘制的批次: [(毫秒时间戳数组, 数值数组), ...]
+        self.device_id = 0  # 图表显示的设备ID，其他设备的数据不进入图表
+        self.render_callback = None  # 每帧绘制完成后调用 render_callback(本帧的毫秒时间戳数组)，用于测量端到端延迟
+        self.viewport = None  # 图表所在滚动区域的视口，用于跳过滚动到视野之外的图表
+        self.tile_loader = None  # 历史浏览的数据块加载器
+        self.history_mode = False  # 为True时图表显示数据库中的历史数据，可以任意缩放和平移
+        self._tiles_dirty = False  # 有新加载的数据块，下一帧重新绘制
+        
+        # 性能统计
+        self.render_histogram = LatencyHistogram()  # 每帧更新图表的耗时
+        self.latency_histogram = LatencyHistogram()  # 每个样本从接收到进入图表的延迟
+        self.paint_histogram = LatencyHistogram()  # 每次重绘图表视图的耗时
+        
+        # 按通道配置创建图表
+        self.charts = [ChannelChart(channel, self.paint_histogram) for channel in channels]
+        self.chart_views = [chart.view for chart in self.charts]
+        
+        # 视图尺寸变化或矩形缩放后按新的像素宽度和时间范围重新抽稀
+        for chart in self.charts:
+            chart.chart.plotAreaChanged.connect(self.refresh_series)
+            chart.time_axis.rangeChanged.connect(self.on_time_range_changed)
+            chart.view.wheel_handler = lambda event, chart=chart: self.on_wheel(chart, event)
+
+    # 设置历史浏览的数据块加载器 HistoryTileLoader
+    def set_tile_loader(self, tile_loader):
+        self.tile_loader = tile_loader
+        tile_loader.tile_loaded.connect(self.on_tile_loaded)
+        tile_loader.extent_loaded.connect(self.on_extent_loaded)
 
     # 更新图表的时间范围，默认显示最近10分钟的数据，这样变化会更加明显
     def update_time_range(self, minutes=10):
         now = QDateTime.currentDateTime()
         start_time = now.addSecs(-minutes * 60)
         
-        self.thermal_time_axis.setRange(start_time, now)
-        self.light_time_axis.setRange(start_time, now)
-        
-        # 限制数据点数量，防止内存占用过大和图表过于拥挤
-        self._limit_data_points(start_time.toMSecsSinceEpoch())
+        if self.follow_live:
+            self._updating_range = True
+            for chart in self.charts:
+                chart.time_axis.setRange(start_time, now)
+            self._updating_range = False
 
-    # 限制数据点数量，删除时间范围外的点
-    def _limit_data_points(self, min_timestamp_ms):
+    # 设置图表所在滚动区域的视口
+    def set_viewport(self, viewport):
+        self.viewport = viewport
 
-        # 删除时间范围外的点
-        points_to_remove = 0
-        for i in range(self.thermal_series.count()):
-            if self.thermal_series.at(i).x() < min_timestamp_ms:
-                points_to_remove += 1
-            else:
-                break
-        
-        if points_to_remove > 0:
-            # 创建新的点列表，不包含要删除的点
-            new_thermal_points = []
-            for i in range(points_to_remove, self.thermal_series.count()):
-                new_thermal_points.append(self.thermal_series.at(i))
-            
-            self.thermal_series.clear()
-            self.thermal_series.append(new_thermal_points)
-        
-        # 对光敏传感器数据执行相同操作
-        points_to_remove = 0
-        for i in range(self.light_series.count()):
-            if self.light_series.at(i).x() < min_timestamp_ms:
-                points_to_remove += 1
-            else:
-                break
-        
-        if points_to_remove > 0:
-            new_light_points = []
-            for i in range(points_to_remove, self.light_series.count()):
-                new_light_points.append(self.light_series.at(i))
-            
-            self.light_series.clear()
-            self.light_series.append(new_light_points)
+    # 图表视图是否在滚动区域的可见范围内
+    def is_visible(self, view):
+        if self.viewport is None:
+            return True
+        top_left = view.mapTo(self.viewport, QPoint(0, 0))
+        return QRect(top_left, view.size()).intersects(self.viewport.rect())
 
-    # 添加数据点到图表
-    def add_data_point(self, thermal_value, light_value):
-        now = QDateTime.currentDateTime()
-        timestamp_ms = now.toMSecsSinceEpoch()
-        
-        # 添加到折线图
-        self.thermal_series.append(timestamp_ms, thermal_value)
-        self.light_series.append(timestamp_ms, light_value)
-        
-        # 更新散点图（当前值），根据热敏值设置不同颜色
-        self.thermal_scatter.clear()
-        self.thermal_scatter.append(timestamp_ms, thermal_value)
+    # 取出时间轴可见范围内的数据，按绘图区宽度抽稀后一次性替换折线图中的全部点
+    # 滚动到视野之外的图表不绘制，重新可见时由 refresh_series 补上
+    def _push_series(self):
+        if self.history_mode:
+            self._push_history()
+            return
+        visible = [(i, chart) for i, chart in enumerate(self.charts) if self.is_visible(chart.view)]
+        if not visible:
+            return
+        # 在锁内一次拷贝所有可见图表的时间范围，之后的查找和抽稀不会与合并线程的写入冲突
+        ranges = [(chart.time_axis.min().toMSecsSinceEpoch(), chart.time_axis.max().toMSecsSinceEpoch())
+                  for _, chart in visible]
+        timestamps, values = self.hot_store.window(self.device_id, min(t0 for t0, _ in ranges),
+                                                   max(t1 for _, t1 in ranges))
+        for (i, chart), (t0, t1) in zip(visible, ranges):
+            # 可见范围两侧各多保留一个点，使折线延伸到边界
+            lo = max(0, int(np.searchsorted(timestamps, t0, side='left')) - 1)
+            hi = int(np.searchsorted(timestamps, t1, side='right')) + 1
+            xs, ys = self.decimator.decimate(timestamps[lo:hi], values[lo:hi, i], t0, t1,
+                                             chart.chart.plotArea().width(), chart.channel.is_binary)
+            chart.series.replace([QPointF(x, y) for x, y in zip(xs.tolist(), ys.tolist())])
+
+    # 历史浏览: 按可见范围和绘图区宽度从数据块缓存中取数据，缺少的数据块在后台加载，加载完成后再次绘制
+    # 每个时间桶画出最小值和最大值两个点，再按绘图区宽度抽稀
+    def _push_history(self):
+        if self.tile_loader is None:
+            return
+        t0 = self.charts[0].time_axis.min().toMSecsSinceEpoch()
+        t1 = self.charts[0].time_axis.max().toMSecsSinceEpoch()
+        width = max(chart.chart.plotArea().width() for chart in self.charts)
+        bucket_ms, tiles, missing = self.tile_loader.request(self.device_id, t0, t1, max(1, int(width)))
+        if missing:
+            ui_log.debug("历史浏览: 桶宽度 %d ms, 已缓存 %d 块, 加载中 %d 块", bucket_ms, len(tiles), missing)
+        
+        # 可见范围超过一天时时间轴显示日期
+        time_format = "MM-dd HH:mm" if t1 - t0 > 24 * 60 * 60 * 1000 else "HH:mm:ss"
+        for chart in self.charts:
+            if chart.time_axis.format() != time_format:
+                chart.time_axis.setFormat(time_format)
+        if not tiles:
+            for chart in self.charts:
+                chart.series.clear()
+            return
         
-        # 根据热敏值设置不同的颜色
-        if thermal_value == 1:
-            # 高温状态 - 红色
-            self.thermal_scatter.setColor(Qt.red)
-            self.thermal_scatter.setMarkerSize(15)  # 增大高温点的大小
+        # 可见范围两侧各多保留一个时间桶，使折线延伸到边界
+        timestamps = np.concatenate([tile[1] for tile in tiles])
+        lo = max(0, int(np.searchsorted(timestamps, t0, side='left')) - 1)
+        hi = int(np.searchsorted(timestamps, t1, side='right')) + 1
+        widths = np.concatenate([np.full(len(tile[1]), tile[0]) for tile in tiles])[lo:hi]
+        timestamps = timestamps[lo:hi].astype(np.float64)
+        xs_all = np.column_stack((timestamps, timestamps + widths / 2)).ravel()
+        mins = np.concatenate([tile[3] for tile in tiles])[lo:hi]
+        maxs = np.concatenate([tile[4] for tile in tiles])[lo:hi]
+        for i, chart in enumerate(self.charts):
+            if not self.is_visible(chart.view):
+                continue
+            ys_all = np.column_stack((mins[:, i], maxs[:, i])).ravel()
+            xs, ys = self.decimator.decimate(xs_all, ys_all, t0, t1, chart.chart.plotArea().width(),
+                                             chart.channel.is_binary)
+            chart.series.replace([QPointF(x, y) for x, y in zip(xs.tolist(), ys.tolist())])
+
+    # 重新抽稀并刷新折线图
+    def refresh_series(self, *args):
+        self._push_series()
+
+    # 时间轴范围变化: 由用户缩放引起时停止跟随最新数据，并按新范围重新抽稀
+    # 历史浏览时所有图表使用相同的时间范围
+    def on_time_range_changed(self, minimum, maximum):
+        if self._updating_range:
+            return
+        self.follow_live = False
+        if self.history_mode:
+            self._set_time_range(minimum, maximum)
+        self._push_series()
+
+    # 把所有图表的时间轴设置为 [minimum, maximum]
+    def _set_time_range(self, minimum, maximum):
+        self._updating_range = True
+        for chart in self.charts:
+            chart.time_axis.setRange(minimum, maximum)
+        self._updating_range = False
+
+    # 历史浏览时用滚轮缩放(以鼠标位置为中心)，按住Shift或横向滚动时平移；其他时候不处理
+    def on_wheel(self, chart, event):
+        if not self.history_mode:
+            return False
+        t0 = chart.time_axis.min().toMSecsSinceEpoch()
+        t1 = chart.time_axis.max().toMSecsSinceEpoch()
+        span = t1 - t0
+        delta = event.angleDelta()
+        if delta.x() or event.modifiers() & Qt.ShiftModifier:
+            shift = -(delta.x() or delta.y()) / 120 * self.WHEEL_PAN * span
+            t0, t1 = t0 + shift, t1 + shift
         else:
-            # 正常状态 - 绿色
-            self.thermal_scatter.setColor(Qt.green)
-            self.thermal_scatter.setMarkerSize(12)
+            factor = self.WHEEL_ZOOM ** (delta.y() / 120)
+            center = min(max(chart.chart.mapToValue(QPointF(event.pos())).x(), t0), t1)
+            factor = max(factor, self.MIN_SPAN_MS / max(1, span))
+            t0 = center - (center - t0) * factor
+            t1 = center + (t1 - center) * factor
+        chart.time_axis.setRange(QDateTime.fromMSecsSinceEpoch(int(t0)), QDateTime.fromMSecsSinceEpoch(int(t1)))
+        return True
+
+    # 进入历史浏览，先保持当前的时间范围，查询到数据库的时间范围后显示全部历史数据
+    def enter_history_mode(self):
+        if self.tile_loader is None or self.history_mode:
+            return
+        self.history_mode = True
+        self.follow_live = False
+        axis = self.charts[0].time_axis
+        self._set_time_range(axis.min(), axis.max())
+        self.tile_loader.request_extent(self.device_id)
+        self._push_series()
+
+    # 数据块加载完成，属于当前设备时在下一帧重新绘制
+    def on_tile_loaded(self, key):
+        if self.history_mode and key[0] == self.device_id:
+            self._tiles_dirty = True
+
+    # 数据库的时间范围查询完成，历史浏览时显示该设备的全部数据
+    def on_extent_loaded(self, device_id, first_ms, last_ms):
+        if not self.history_mode or device_id != self.device_id or first_ms is None:
+            return
+        end_ms = max(last_ms, QDateTime.currentMSecsSinceEpoch())
+        self._set_time_range(QDateTime.fromMSecsSinceEpoch(int(first_ms)),
+                             QDateTime.fromMSecsSinceEpoch(int(end_ms)))
+        self._push_series()
+
+    # 取消缩放，退出历史浏览，恢复跟随最新数据
+    def reset_zoom(self):
+        self.history_mode = False
+        self._tiles_dirty = False
+        for chart in self.charts:
+            chart.chart.zoomReset()
+            chart.time_axis.setFormat("HH:mm:ss")
+        self.follow_live = True
+        self.update_time_range(self.window_minutes)
+        self._push_series()
+
+    # 设置抽稀方式: "minmax" 或 "lttb"
+    def set_decimation_mode(self, mode):
+        if mode not in Decimator.MODES:
+            raise ValueError(f"未知的抽稀方式: {mode}")
+        self.decimator.mode = mode
+        self._push_series()
+
+    # 添加数据点到图表，values为按通道顺序排列的一组数值，timestamp_ms为接收时间，为空时使用当前时间
+    # 数据只进入待绘制队列，由 render_frame 按帧率统一绘制
+    def add_data_point(self, values, timestamp_ms=None):
+        if timestamp_ms is None:
+            timestamp_ms = QDateTime.currentDateTime().toMSecsSinceEpoch()
+        self.pending.append((np.array([timestamp_ms], dtype=np.float64),
+                             np.array([values], dtype=np.float64)))
+
+    # 批量添加数据点: timestamps为接收时间戳(s)数组，values为 (样本数, 通道数) 的数组
+    # device_ids为每个样本的设备ID数组，只保留当前显示设备的数据；为空时全部保留
+    def add_samples(self, timestamps, values, device_ids=None):
+        if device_ids is not None:
+            mask = device_ids == self.device_id
+            if not mask.all():
+                timestamps, values = timestamps[mask], values[mask]
+            if not len(timestamps):
+                return
+        self.pending.append((np.asarray(timestamps, dtype=np.float64) * 1000, values))
+
+    # 切换图表显示的设备，显示内存中该设备的数据，由调用方加载内存中没有的较早数据
+    def set_device(self, device_id):
+        self.device_id = device_id
+        self.pending = []
+        for chart in self.charts:
+            chart.series.clear()
+            chart.scatter.clear()
+            chart.last_value = None
+        self._show_latest()
+        self._push_series()
+
+    # 散点图显示内存中当前设备的最新数据
+    def _show_latest(self):
+        latest = self.hot_store.latest(self.device_id)
+        if latest is None:
+            return
+        timestamp_ms, values = latest
+        for chart, value in zip(self.charts, values.tolist()):
+            chart.set_current(timestamp_ms, value)
+
+    # 绘制一帧: 数据已经在内存存储中，按新数据更新一次坐标轴和当前值标记并重新抽稀
+    # 没有新数据时直接返回False，不做任何工作；历史浏览时图表只在有新数据块时重绘
+    def render_frame(self):
+        if self._tiles_dirty:
+            self._tiles_dirty = False
+            self._push_series()
+        if not self.pending:
+            return False
+        start = time.perf_counter()
+        pending = self.pending
+        self.pending = []
         
-        self.light_scatter.clear()
-        self.light_scatter.append(timestamp_ms, light_value)
+        timestamps = np.concatenate([timestamps for timestamps, _ in pending])
+        values = np.concatenate([values for _, values in pending])
         
-        # 更新时间范围 - 显示最近10分钟的数据，使变化更明显
-        self.update_time_range(10)
+        # 更新散点图（当前值）
+        last_timestamp_ms = float(timestamps[-1])
+        for chart, value in zip(self.charts, values[-1].tolist()):
+            chart.set_current(last_timestamp_ms, value)
         
-        # 强制图表更新
-        self.thermal_chart_view.update()
-        self.light_chart_view.update()
+        # 更新时间范围 - 显示最近10分钟的数据，使变化更明显
+        self.update_time_range(self.window_minutes)
+        if not self.history_mode:
+            self._push_series()
+        self.render_histogram.record(time.perf_counter() - start, len(timestamps))
+        self.latency_histogram.record_many(time.time() - timestamps / 1000)
+        if self.render_callback is not None:
+            self.render_callback(timestamps)
+        return True
 
-    # 加载历史数据到图表
-    def load_historical_data(self, data_list):
-        self.thermal_series.clear()
-        self.light_series.clear()
+    # 性能监测的处理阶段: [(阶段名称, 说明, 直方图), ...]
+    def get_histograms(self):
+        return [("chart_render", "图表更新(每帧)", self.render_histogram),
+                ("chart_latency", "接收到进入图表(每个样本)", self.latency_histogram),
+                ("paint", "图表重绘(每个视图)", self.paint_histogram)]
+
+    # 加载数据库中的较早数据到图表，参数为按时间排序的毫秒时间戳数组和 (样本数, 通道数) 的数值数组，
+    # 以及查询的时间范围 [start_ms, end_ms)；数据补充到内存存储中已有的数据之前
+    # device_id与当前显示的设备不同(加载期间切换了设备)时忽略
+    def load_historical_data(self, timestamps, values, device_id, start_ms, end_ms):
+        if not self.hot_store.backfill(device_id, start_ms, end_ms, timestamps, values):
+            ui_log.warning("加载历史数据期间内存中的数据已被覆盖，图表只显示内存中的数据")
+        if device_id != self.device_id:
+            return
         
-        # 创建两个不同的散点系列，分别用于正常温度和高温状态
-        normal_points = []
-        high_temp_points = []
-        
-        for timestamp_str, thermal_value, light_value in data_list:
-            # 将SQLite时间戳字符串转换为QDateTime
-            dt = QDateTime.fromString(timestamp_str, "yyyy-MM-dd HH:mm:ss")
-            timestamp_ms = dt.toMSecsSinceEpoch()
-            
-            # 根据温度状态添加到不同的点集合
-            if thermal_value == 1:
-                high_temp_points.append(QPointF(timestamp_ms, thermal_value))
-            else:
-                normal_points.append(QPointF(timestamp_ms, thermal_value))
-            
-            # 添加到折线图
-            self.thermal_series.append(timestamp_ms, thermal_value)
-            self.light_series.append(timestamp_ms, light_value)
-        
-        # 如果有数据，更新散点图显示最后一个点
-        if data_list:
-            last_timestamp_str, last_thermal, last_light = data_list[-1]
-            last_dt = QDateTime.fromString(last_timestamp_str, "yyyy-MM-dd HH:mm:ss")
-            last_timestamp_ms = last_dt.toMSecsSinceEpoch()
-            
-            # 根据最后一个点的温度状态设置散点颜色和大小
-            self.thermal_scatter.clear()
-            self.thermal_scatter.append(last_timestamp_ms, last_thermal)
-            
-            if last_thermal == 1:
-                self.thermal_scatter.setColor(Qt.red)
-                self.thermal_scatter.setMarkerSize(15)
-            else:
-                self.thermal_scatter.setColor(Qt.green)
-                self.thermal_scatter.setMarkerSize(12)
-            
-            self.light_scatter.clear()
-            self.light_scatter.append(last_timestamp_ms, last_light)
+        # 还没有实时数据时，散点图显示历史数据的最后一个点
+        if not self.pending:
+            self._show_latest()
         
         # 更新时间范围
-        self.update_time_range()
+        self.update_time_range(self.window_minutes)
+        self._push_series()
+
+# 历史数据加载线程，在后台查询数据库并转换为数组，完成后通过信号交给图表
+class HistoryLoader(QThread):
+
+    # 定义信号
+    # 毫秒时间戳数组, (样本数, 通道数) 的数值数组, 设备ID, 查询起点(ms), 查询终点(ms)
+    loaded = pyqtSignal(object, object, int, object, object)
+
+    # 初始化历史数据加载线程，加载设备device_id在 [start_ms, end_ms) 范围内的数据
+    def __init__(self, db_manager, start_ms, end_ms, device_id=0):
+        super().__init__()
+        self.db_manager = db_manager
+        self.start_ms = start_ms
+        self.end_ms = end_ms
+        self.device_id = device_id
+
+    # 查询并发出历史数据
+    def run(self):
+        start = time.perf_counter()
+        timestamps, values = self.db_manager.get_range_arrays(self.start_ms, self.end_ms, device_id=self.device_id)
+        ui_log.info("已加载 %d 条历史数据, 耗时 %.1f ms", len(timestamps), (time.perf_counter() - start) * 1000)
+        self.loaded.emit(timestamps, values, self.device_id, self.start_ms, self.end_ms)
+
+# 数据导出线程，在后台按块读取数据库并写入文件，通过信号报告进度和结果
+class ExportWorker(QThread):
+
+    # 定义信号
+    progress = pyqtSignal(object, object)  # 已导出行数, 总行数
+    done = pyqtSignal(bool, str)  # 是否成功, 消息
+
+    # 初始化导出线程，exporter为 DataExporter
+    def __init__(self, exporter):
+        super().__init__()
+        self.exporter = exporter
+
+    # 执行导出并发出结果
+    def run(self):
+        exporter = self.exporter
+        if exporter.run(self.progress.emit):
+            self.done.emit(True, f"已导出 {exporter.rows_exported} 条数据到 {exporter.path}")
+        elif exporter.cancelled:
+            self.done.emit(False, "导出已取消")
+        else:
+            self.done.emit(False, f"导出失败: {exporter.error}")
+
+# 导出数据对话框，选择时间范围、设备、格式和保存位置
+class ExportDialog(QDialog):
+
+    # 初始化对话框，devices为 [(设备ID, 名称), ...]，默认导出最近一小时的数据
+    def __init__(self, devices, parent=None):
+        super().__init__(parent)
+        self.setWindowTitle("导出数据")
+        layout = QFormLayout(self)
+        
+        now = QDateTime.currentDateTime()
+        self.start_edit = QDateTimeEdit(now.addSecs(-3600))
+        self.end_edit = QDateTimeEdit(now)
+        for edit in (self.start_edit, self.end_edit):
+            edit.setCalendarPopup(True)
+            edit.setDisplayFormat("yyyy-MM-dd HH:mm:ss")
+        
+        self.device_combo = QComboBox()
+        self.device_combo.addItem("全部设备", None)
+        for device_id, name in devices:
+            self.device_combo.addItem(name, device_id)
+        
+        self.format_combo = QComboBox()
+        self.format_combo.addItem("CSV文件", "csv")
+        self.format_combo.addItem("NumPy列文件(目录)", "npy")
+        
+        self.path_edit = QLineEdit()
+        browse_button = QPushButton("浏览...")
+        browse_button.clicked.connect(self.browse)
+        path_layout = QHBoxLayout()
+        path_layout.addWidget(self.path_edit)
+        path_layout.addWidget(browse_button)
+        
+        buttons = QDialogButtonBox(QDialogButtonBox.Ok | QDialogButtonBox.Cancel)
+        buttons.accepted.connect(self.accept)
+        buttons.rejected.connect(self.reject)
+        
+        layout.addRow("开始时间:", self.start_edit)
+        layout.addRow("结束时间:", self.end_edit)
+        layout.addRow("设备:", self.device_combo)
+        layout.addRow("格式:", self.format_combo)
+        layout.addRow("保存到:", path_layout)
+        layout.addRow(buttons)
+
+    # 选择保存位置，CSV为文件，NumPy列文件为一个新目录
+    def browse(self):
+        if self.format_combo.currentData() == "csv":
+            path, _ = QFileDialog.getSaveFileName(self, "导出为CSV文件", "sensor_data.csv", "CSV文件 (*.csv)")
+        else:
+            path, _ = QFileDialog.getSaveFileName(self, "导出为NumPy列文件目录", "sensor_data_export")
+        if path:
+            self.path_edit.setText(path)
+
+    # 检查输入后关闭对话框
+    def accept(self):
+        if not self.path_edit.text().strip():
+            QMessageBox.warning(self, "导出数据", "请选择保存位置")
+            return
+        if self.end_edit.dateTime() <= self.start_edit.dateTime():
+            QMessageBox.warning(self, "导出数据", "结束时间必须晚于开始时间")
+            return
+        super().accept()
+
+    # 选择的导出参数: (路径, 开始时间ms, 结束时间ms, 设备ID, 格式)
+    def get_options(self):
+        return (self.path_edit.text().strip(), self.start_edit.dateTime().toMSecsSinceEpoch(),
+                self.end_edit.dateTime().toMSecsSinceEpoch(), self.device_combo.currentData(),
+                self.format_combo.currentData())
+
 
 # 主窗口类，负责UI和应用程序逻辑
 class MainWindow(QMainWindow):
 
-    # 初始化主窗口
-    def __init__(self):
+    # 滚动统计显示的最短刷新间隔(s)
+    ROLLING_STATS_INTERVAL = 0.25
+
+    # 初始化主窗口，channels为通道注册表，为空时使用默认的热敏/光敏两通道，db_name为数据库文件
+    # simulator_options为 DataSimulator 的参数(速率、波形、随机数种子、突发模式)
+    # metrics_file为Prometheus文本格式的性能指标文件，为空时不写文件，metrics_interval为写入间隔(s)
+    # queues为 {队列名称: (策略, 容量)}，未指定的队列使用 QUEUE_DEFAULTS
+    # tile_cache_mb为历史浏览时数据块缓存占用内存的上限(MB)
+    # acquisition为 RemoteAcquisition 时串口读取和数据库写入在独立的采集进程中进行，界面只显示和查询
+    # hot_window为在内存中保留最近数据的时长(分钟)，hot_capacity为内存中每个设备最多保存的样本数
+    # storage和max_error为原始数据的存储方式和压缩的允许误差，archive和archive_days为过期原始数据的归档目录和保留天数，
+    # 见 DatabaseManager；使用独立的采集进程时归档由采集进程写入，界面只读取
+    def __init__(self, channels=None, db_name="sensor_data.db", simulator_options=None,
+                 metrics_file=None, metrics_interval=15.0, queues=None, tile_cache_mb=64.0, acquisition=None,
+                 hot_window=HotStore.DEFAULT_WINDOW / 60, hot_capacity=HotStore.DEFAULT_CAPACITY,
+                 storage="raw", max_error=None, archive=None, archive_days=None):
         super().__init__()
+        self.channels = channels or ChannelRegistry.default()
         
         # 设置窗口属性
         self.setWindowTitle("传感器数据可视化")
         self.resize(1200, 800)
         
+        # 最近的数据按列保存在内存中，图表、最近数据的查询和导出直接从内存中读取，更早的数据才查询数据库
+        self.hot_store = HotStore(len(self.channels), hot_window * 60, hot_capacity)
+        # 各通道在10秒、1分钟、10分钟窗口内的滚动统计，随合并后的数据增量更新
+        self.rolling_stats = RollingStats(self.channels)
+        self._rolling_stats_time = 0.0  # 上次刷新滚动统计显示的时间
+        
+        # 创建图表，每个通道一个图表
+        self.chart_manager = ChartManager(self.channels, self.hot_store)
+        
         # 创建组件
         self.setup_ui()
         
-        # 创建管理器
-        self.db_manager = DatabaseManager()
-        self.serial_manager = SerialManager()
-        self.data_simulator = DataSimulator()
-        self.chart_manager = ChartManager(self.thermal_chart_view, self.light_chart_view)
+        # 创建管理器，合并后的数据在合并线程中直接写入数据库，界面只从ui队列中取数据显示
+        # 使用独立的采集进程时由采集进程写入和清理数据库，界面进程的数据库连接只用于查询
+        queues = dict(QUEUE_DEFAULTS, **(queues or {}))
+        self.remote_acquisition = acquisition is not None
+        retention = dict.fromkeys(DatabaseManager.DEFAULT_RETENTION) if self.remote_acquisition else None
+        self.db_manager = DatabaseManager(db_name, self.channels, retention=retention,
+                                          queue_policy=queues["storage"][0], queue_capacity=queues["storage"][1],
+                                          hot_store=self.hot_store, storage=storage, max_error=max_error,
+                                          archive=archive, archive_days=archive_days)
+        if self.remote_acquisition:
+            self.serial_manager = acquisition
+        else:
+            self.serial_manager = SerialManager(self.channels, self.store_samples, queues)
+        self.data_simulator = DataSimulator(self.channels, **(simulator_options or {}))
+        self.simulator_device_id = self.db_manager.get_device_id("模拟数据")
+        self.history_loader = None  # 历史数据加载线程
+        self.lost_samples = 0  # 采集进程的共享内存中已被覆盖、内存存储中缺失的样本数
+        self.export_worker = None  # 数据导出线程
+        
+        # 历史浏览的数据块在后台线程中用独立的只读连接加载
+        self.tile_loader = HistoryTileLoader(self.db_manager, cache_bytes=int(tile_cache_mb * 1024 * 1024))
+        self.chart_manager.set_tile_loader(self.tile_loader)
+        
+        # 性能监测: 各处理阶段的延迟直方图和事件循环延迟
+        self.dispatch_histogram = LatencyHistogram()
+        self.event_loop_monitor = EventLoopMonitor()
+        self.performance_monitor = PerformanceMonitor(metrics_file, metrics_interval)
+        for stage in (self.serial_manager.get_histograms() + self.db_manager.get_histograms()
+                      + self.chart_manager.get_histograms() + self.tile_loader.get_histograms()):
+            self.performance_monitor.add_stage(*stage)
+        self.performance_monitor.add_stage("dispatch", "界面线程分发(每批)", self.dispatch_histogram)
+        self.performance_monitor.add_stage("rolling_stats", "滚动统计更新(每批)", self.rolling_stats.update_histogram)
+        self.performance_monitor.add_stage("event_loop_lag", "事件循环延迟", self.event_loop_monitor.histogram)
+        self.performance_monitor.add_queues(self.serial_manager.get_queue_stats)
+        if not self.remote_acquisition:
+            self.performance_monitor.add_queues(self.db_manager.get_queue_stats)
+        self.performance_monitor.add_metrics(
+            lambda: self.rolling_stats.prometheus_lines(dict(self.db_manager.get_devices())))
+        self.event_loop_monitor.start()
+        
+        # 默认显示最近有数据的设备
+        self.chart_manager.set_device(self.db_manager.get_latest_device_id())
         
         # 连接信号和槽
         self.connect_signals_slots()
         
-        # 初始化串口列表
-        self.refresh_port_list()
+        # 串口和模拟数据由采集进程按命令行参数管理，界面上不能修改
+        if self.remote_acquisition:
+            for widget in (self.port_combo, self.refresh_button, self.baud_combo, self.protocol_combo,
+                           self.connect_button, self.hardware_radio, self.simulation_radio):
+                widget.setEnabled(False)
+            self.serial_manager.start()
         
-        # 初始化定时器
-        self.clean_timer = QTimer()
-        self.clean_timer.timeout.connect(self.clean_old_data)
-        self.clean_timer.start(60000)  # 每分钟清理一次旧数据
+        # 初始化串口和设备列表
+        self.refresh_port_list()
+        self.refresh_device_list()
         
         # 加载历史数据
         self.load_historical_data()
         
+        # 统计定时器，每秒刷新一次各设备的吞吐量和错误计数，以及性能统计面板
+        self.stats_timer = QTimer()
+        self.stats_timer.timeout.connect(self.update_device_stats)
+        self.stats_timer.timeout.connect(self.update_performance_panel)
+        self.stats_timer.start(1000)
+        
+        # 绘制定时器，图表和标签按固定帧率刷新，与采样率无关
+        self.latest_sample = None  # 最新收到的数据，在下一帧显示
+        self.displayed_sample = None  # 标签上当前显示的数据
+        self.render_timer = QTimer()
+        self.render_timer.timeout.connect(self.render_frame)
+        self.set_render_fps(30)
+        
         # 默认选择实际硬件模式
         self.hardware_radio.setChecked(True)
         self.on_mode_changed()
         
-        print("应用程序初始化完成")
+        ui_log.info("应用程序初始化完成")
 
     # 设置用户界面
     def setup_ui(self):
@@ -580,8 +814,12 @@ class MainWindow(QMainWindow):
         self.refresh_button = QPushButton("刷新")
         self.baud_label = QLabel("波特率:")
         self.baud_combo = QComboBox()
-        self.baud_combo.addItems(["9600", "19200", "38400", "57600", "115200"])
+        self.baud_combo.addItems(["9600", "19200", "38400", "57600", "115200", "230400", "460800", "921600"])
         self.baud_combo.setCurrentText("115200")  # 默认波特率
+        self.protocol_label = QLabel("协议:")
+        self.protocol_combo = QComboBox()
+        self.protocol_combo.addItem("文本 (ASCII)", "ascii")
+        self.protocol_combo.addItem("二进制帧", "binary")
         self.connect_button = QPushButton("连接")
         
         serial_layout.addWidget(self.port_label, 0, 0)
@@ -590,6 +828,8 @@ class MainWindow(QMainWindow):
         serial_layout.addWidget(self.baud_label, 1, 0)
         serial_layout.addWidget(self.baud_combo, 1, 1)
         serial_layout.addWidget(self.connect_button, 1, 2)
+        serial_layout.addWidget(self.protocol_label, 2, 0)
+        serial_layout.addWidget(self.protocol_combo, 2, 1)
         
         # 创建模式选择组
         mode_group = QGroupBox("工作模式")
@@ -598,78 +838,134 @@ class MainWindow(QMainWindow):
         self.hardware_radio = QRadioButton("实际硬件")
         self.simulation_radio = QRadioButton("模拟数据")
         
+        self.decimation_combo = QComboBox()
+        self.decimation_combo.addItem("抽稀: 最小/最大值", "minmax")
+        self.decimation_combo.addItem("抽稀: LTTB", "lttb")
+        self.live_button = QPushButton("恢复实时显示")
+        self.history_button = QPushButton("历史浏览")  # 缩放和平移浏览数据库中的全部数据
+        self.history_button.setCheckable(True)
+        self.device_combo = QComboBox()  # 图表显示的设备
+        self.performance_button = QPushButton("性能统计")
+        self.performance_button.setCheckable(True)
+        
         mode_layout.addWidget(self.hardware_radio)
         mode_layout.addWidget(self.simulation_radio)
+        mode_layout.addWidget(self.device_combo)
+        mode_layout.addWidget(self.decimation_combo)
+        mode_layout.addWidget(self.live_button)
+        mode_layout.addWidget(self.history_button)
+        mode_layout.addWidget(self.performance_button)
         
         # 创建状态显示组
         status_group = QGroupBox("当前状态")
         status_layout = QGridLayout(status_group)
         
-        self.thermal_label = QLabel("热敏状态:")
-        self.thermal_value = QLabel("--")
-        self.thermal_value.setFont(QFont("Arial", 16, QFont.Bold))
-        self.light_label = QLabel("光照值:")
-        self.light_value = QLabel("--")
-        self.light_value.setFont(QFont("Arial", 16, QFont.Bold))
+        # 每个通道一行: 名称、当前值和滚动统计，通道较多时分成多列，每列最多8个通道
+        rows = min(len(self.channels), 8)
+        font_size = 16 if len(self.channels) <= 8 else 12
+        self.value_labels = []
+        self.rolling_stats_labels = []
+        for i, channel in enumerate(self.channels):
+            value_label = QLabel("--")
+            value_label.setFont(QFont("Arial", font_size, QFont.Bold))
+            stats_label = QLabel("--")
+            stats_label.setToolTip("滚动统计: 均值±标准差 [最小值, 最大值]，0/1通道为高电平样本占比和跳变次数")
+            status_layout.addWidget(QLabel(f"{channel.label}:"), i % rows, i // rows * 3)
+            status_layout.addWidget(value_label, i % rows, i // rows * 3 + 1)
+            status_layout.addWidget(stats_label, i % rows, i // rows * 3 + 2)
+            self.value_labels.append(value_label)
+            self.rolling_stats_labels.append(stats_label)
         self.status_label = QLabel("状态:")
         self.status_value = QLabel("未连接")
-        
-        status_layout.addWidget(self.thermal_label, 0, 0)
-        status_layout.addWidget(self.thermal_value, 0, 1)
-        status_layout.addWidget(self.light_label, 1, 0)
-        status_layout.addWidget(self.light_value, 1, 1)
-        status_layout.addWidget(self.status_label, 2, 0)
-        status_layout.addWidget(self.status_value, 2, 1)
+        self.device_stats_label = QLabel("设备:")
+        self.device_stats_value = QLabel("--")  # 各设备的吞吐量和错误计数
+        self.queue_stats_label = QLabel("队列:")
+        self.queue_stats_value = QLabel("--")  # 各队列的深度、最高水位和丢弃的样本数
+        
+        status_layout.addWidget(self.status_label, rows, 0)
+        status_layout.addWidget(self.status_value, rows, 1, 1, -1)
+        status_layout.addWidget(self.device_stats_label, rows + 1, 0, Qt.AlignTop)
+        status_layout.addWidget(self.device_stats_value, rows + 1, 1, 1, -1)
+        status_layout.addWidget(self.queue_stats_label, rows + 2, 0, Qt.AlignTop)
+        status_layout.addWidget(self.queue_stats_value, rows + 2, 1, 1, -1)
         
         # 添加控制面板组件
         control_layout.addWidget(serial_group)
         control_layout.addWidget(mode_group)
         control_layout.addWidget(status_group)
         
-        # 创建图表视图
+        # 创建图表视图，每个通道一个
         chart_splitter = QSplitter(Qt.Vertical)
-        
-        # 热敏传感器图表视图
-        self.thermal_chart_view = QChartView()
-        self.thermal_chart_view.setMinimumHeight(350)  # 增加高度
-        self.thermal_chart_view.setRenderHint(QPainter.Antialiasing)  # 抗锯齿
-        self.thermal_chart_view.setRubberBand(QChartView.RectangleRubberBand)  # 允许矩形选择缩放
-        
-        # 光敏传感器图表视图
-        self.light_chart_view = QChartView()
-        self.light_chart_view.setMinimumHeight(350)  # 增加高度
-        self.light_chart_view.setRenderHint(QPainter.Antialiasing)  # 抗锯齿
-        self.light_chart_view.setRubberBand(QChartView.RectangleRubberBand)  # 允许矩形选择缩放
-        
-        chart_splitter.addWidget(self.thermal_chart_view)
-        chart_splitter.addWidget(self.light_chart_view)
+        for chart_view in self.chart_manager.chart_views:
+            chart_splitter.addWidget(chart_view)
         
         # 设置分割比例
-        chart_splitter.setSizes([500, 500])  # 平均分配空间
+        chart_splitter.setSizes([500] * len(self.chart_manager.chart_views))  # 平均分配空间
+        
+        # 通道较多时图表区域可以上下滚动
+        self.chart_scroll = QScrollArea()
+        self.chart_scroll.setWidgetResizable(True)
+        self.chart_scroll.setWidget(chart_splitter)
+        self.chart_manager.set_viewport(self.chart_scroll.viewport())
         
         # 添加到主布局
         main_layout.addWidget(control_panel)
-        main_layout.addWidget(chart_splitter, 1)  # 图表占据更多空间
+        main_layout.addWidget(self.chart_scroll, 1)  # 图表占据更多空间
+        
+        # 性能统计面板，默认隐藏，每个处理阶段一行
+        self.performance_table = QTableWidget(0, 7)
+        self.performance_table.setHorizontalHeaderLabels(
+            ["阶段", "次数/s", "样本/s", "p50 (ms)", "p90 (ms)", "p99 (ms)", "最大 (ms)"])
+        self.performance_table.verticalHeader().setVisible(False)
+        self.performance_table.horizontalHeader().setSectionResizeMode(QHeaderView.ResizeToContents)
+        self.performance_table.setEditTriggers(QTableWidget.NoEditTriggers)
+        self.performance_dock = QDockWidget("性能统计", self)
+        self.performance_dock.setWidget(self.performance_table)
+        self.addDockWidget(Qt.RightDockWidgetArea, self.performance_dock)
+        self.performance_dock.hide()
+        
+        # 菜单栏
+        file_menu = self.menuBar().addMenu("文件")
+        self.export_action = QAction("导出数据...", self)
+        file_menu.addAction(self.export_action)
 
     # 连接信号和槽
     def connect_signals_slots(self):
         # 串口管理
         self.refresh_button.clicked.connect(self.refresh_port_list)
         self.connect_button.clicked.connect(self.toggle_connection)
+        self.port_combo.currentIndexChanged.connect(self.update_connection_controls)
         
         # 模式切换
         self.hardware_radio.toggled.connect(self.on_mode_changed)
         self.simulation_radio.toggled.connect(self.on_mode_changed)
         
+        # 图表显示
+        self.decimation_combo.currentIndexChanged.connect(
+            lambda: self.chart_manager.set_decimation_mode(self.decimation_combo.currentData()))
+        self.live_button.clicked.connect(self.resume_live_display)
+        self.history_button.toggled.connect(self.on_history_toggled)
+        self.device_combo.currentIndexChanged.connect(self.on_display_device_changed)
+        self.performance_button.toggled.connect(self.performance_dock.setVisible)
+        self.performance_dock.visibilityChanged.connect(self.on_performance_dock_visibility_changed)
+        self.export_action.triggered.connect(self.export_data)
+        self.chart_scroll.verticalScrollBar().valueChanged.connect(self.chart_manager.refresh_series)
+        
         # 数据接收
-        self.serial_manager.data_received.connect(self.on_data_received)
+        self.serial_manager.samples_received.connect(self.on_samples_received)
         self.serial_manager.connection_status.connect(self.on_connection_status_changed)
-        self.data_simulator.data_generated.connect(self.on_data_received)
+        self.data_simulator.samples_generated.connect(self.on_simulated_samples)
 
     # 刷新可用串口列表
     def refresh_port_list(self):
         self.port_combo.clear()
         ports = self.serial_manager.get_available_ports()
+        # 模拟数据的虚拟串口，以及已连接但当前不可见的串口也保留在列表中，便于断开
+        if self.data_simulator.pty_path is not None:
+            ports.insert(0, self.data_simulator.pty_path)
+        for port in self.serial_manager.readers:
+            if port not in ports:
+                ports.append(port)
         if ports:
             self.port_combo.addItems(ports)
             self.connect_button.setEnabled(True)
@@ -677,95 +973,305 @@ class MainWindow(QMainWindow):
             self.port_combo.addItem("无可用串口")
             self.connect_button.setEnabled(False)
 
-    # 切换串口连接状态
+    # 刷新图表可显示的设备列表
+    def refresh_device_list(self):
+        self.device_combo.blockSignals(True)
+        self.device_combo.clear()
+        for device_id, name in self.db_manager.get_devices():
+            self.device_combo.addItem(f"显示设备: {name}", device_id)
+        self.device_combo.setCurrentIndex(max(0, self.device_combo.findData(self.chart_manager.device_id)))
+        self.device_combo.blockSignals(False)
+
+    # 连接/断开当前选择的串口，可以依次连接多个串口同时采集
     def toggle_connection(self):
-        if self.serial_manager.is_connected:
-            self.serial_manager.disconnect_port()
-            self.connect_button.setText("连接")
-            self.port_combo.setEnabled(True)
-            self.baud_combo.setEnabled(True)
-            self.refresh_button.setEnabled(True)
-            
-            # 如果是模拟模式，停止模拟数据生成
-            if self.simulation_radio.isChecked():
-                self.data_simulator.stop()
+        port = self.port_combo.currentText()
+        if self.serial_manager.is_port_connected(port):
+            self.serial_manager.disconnect_port(port)
         else:
-            port = self.port_combo.currentText()
             baud = int(self.baud_combo.currentText())
+            protocol = self.protocol_combo.currentData()
+            device_id = self.db_manager.get_device_id(port)
             
-            if self.serial_manager.connect_port(port, baud):
-                self.connect_button.setText("断开")
-                self.port_combo.setEnabled(False)
-                self.baud_combo.setEnabled(False)
-                self.refresh_button.setEnabled(False)
-                
-                # 如果是模拟模式，启动模拟数据生成
-                if self.simulation_radio.isChecked():
-                    self.data_simulator.start()
+            if self.serial_manager.connect_port(port, baud, protocol, device_id):
+                self.refresh_device_list()
+        
+        self.update_connection_controls()
+        
+        # 如果是模拟模式，有串口连接时生成模拟数据
+        if self.simulation_radio.isChecked():
+            if self.serial_manager.is_connected:
+                self.data_simulator.start()
+            else:
+                self.data_simulator.stop()
+
+    # 按当前选择的串口是否已连接更新按钮和参数选项
+    def update_connection_controls(self):
+        connected = self.serial_manager.is_port_connected(self.port_combo.currentText())
+        self.connect_button.setText("断开" if connected else "连接")
+        self.baud_combo.setEnabled(not connected)
+        self.protocol_combo.setEnabled(not connected)
 
     # 处理工作模式变化
     def on_mode_changed(self):
         if self.hardware_radio.isChecked():
-            print("切换到实际硬件模式")
+            ui_log.info("切换到实际硬件模式")
             self.data_simulator.stop()
         else:
-            print("切换到模拟数据模式")
+            ui_log.info("切换到模拟数据模式")
             if self.serial_manager.is_connected:
                 self.data_simulator.start()
 
-    # 处理接收到的数据
-    def on_data_received(self, thermal_value, light_value):
+    # 模拟数据作为一个独立的设备并入数据流
+    def on_simulated_samples(self, timestamps, values):
+        self.serial_manager.put_samples(self.simulator_device_id, timestamps, values)
+
+    # 存储合并后的一批数据，在合并线程中调用: 更新滚动统计并写入数据库和内存存储
+    def store_samples(self, timestamps, values, device_ids):
+        self.rolling_stats.update(timestamps, values, device_ids)
+        self.db_manager.insert_batch(timestamps, values, device_ids)
+
+    # 处理合并后的一批数据: timestamps为接收时间戳(s)数组，values为 (样本数, 通道数) 的数组，
+    # device_ids为每个样本的设备ID数组；数据已经在合并线程中写入数据库和内存存储，这里只负责显示
+    # 使用采集进程时数据在这里加入内存存储，共享内存中有样本被覆盖时之前的数据不再完整
+    def on_samples_received(self, timestamps, values, device_ids):
+        if not len(timestamps):
+            return
+        start = time.perf_counter()
+        if self.remote_acquisition:
+            if self.serial_manager.lost_samples != self.lost_samples:
+                self.lost_samples = self.serial_manager.lost_samples
+                self.hot_store.mark_gap(int(timestamps[0] * 1000) + 1)
+            self.hot_store.append(timestamps, values, device_ids)
+            self.rolling_stats.update(timestamps, values, device_ids)
+        
+        # 图表还没有任何数据时切换到最先有数据的设备
+        chart_manager = self.chart_manager
+        if not self.hot_store.count(chart_manager.device_id) and not chart_manager.pending and \
+                not np.any(device_ids == chart_manager.device_id):
+            chart_manager.set_device(int(device_ids[0]))
+            self.refresh_device_list()
+        
+        # 当前显示设备的数据加入图表的待绘制队列，界面在下一帧统一刷新
+        shown = np.flatnonzero(device_ids == chart_manager.device_id)
+        if len(shown):
+            self.latest_sample = (timestamps[shown[-1]], values[shown[-1]].tolist())
+        chart_manager.add_samples(timestamps, values, device_ids)
+        self.dispatch_histogram.record(time.perf_counter() - start, len(timestamps))
 
-        # 更新UI显示，根据热敏值设置不同的颜色
-        self.thermal_value.setText(str(thermal_value))
-        if thermal_value == 1:
-            self.thermal_value.setStyleSheet("color: red; font-weight: bold;")
-            self.thermal_value.setText("1 (高温)")
+    # 切换图表显示的设备，并加载该设备的历史数据
+    def on_display_device_changed(self):
+        device_id = self.device_combo.currentData()
+        if device_id is None or device_id == self.chart_manager.device_id:
+            return
+        self.chart_manager.set_device(device_id)
+        self.displayed_sample = None
+        for value_label in self.value_labels:
+            value_label.setText("--")
+        latest = self.hot_store.latest(device_id)
+        self.latest_sample = None if latest is None else (latest[0] / 1000, latest[1].tolist())
+        self.load_historical_data()
+
+    # 切换历史浏览: 打开时显示数据库中的全部数据，滚轮缩放、Shift+滚轮平移；关闭时恢复实时显示
+    def on_history_toggled(self, checked):
+        if checked:
+            self.chart_manager.enter_history_mode()
+            self.status_value.setText("历史浏览: 滚轮缩放, Shift+滚轮平移, 拖动矩形放大")
         else:
-            self.thermal_value.setStyleSheet("color: green; font-weight: bold;")
-            self.thermal_value.setText("0 (正常)")
-        
-        self.light_value.setText(str(light_value))
-        
-        # 添加到图表
-        self.chart_manager.add_data_point(thermal_value, light_value)
+            self.chart_manager.reset_zoom()
+
+    # 取消缩放并退出历史浏览，恢复跟随最新数据
+    def resume_live_display(self):
+        self.history_button.setChecked(False)
+        self.chart_manager.reset_zoom()
+
+    # 刷新各设备的吞吐量和错误计数，以及各队列的状态
+    def update_device_stats(self):
+        self.queue_stats_value.setText("\n".join(
+            f"{name}: {stats['depth']}/{stats['capacity']}, 最高 {stats['high_water']}, "
+            f"丢弃 {stats['dropped_samples']}, 抽稀 {stats['decimated_samples']}"
+            for name, stats in self.performance_monitor.get_queue_stats().items()))
+        stats = self.serial_manager.get_device_stats()
+        if not stats:
+            self.device_stats_value.setText("--")
+            return
+        lines = []
+        for name, device in stats.items():
+            state = "" if device["connected"] else " (重连中)"
+            lines.append(f"{name}{state}: {device['samples_per_s']:.0f} 条/s, "
+                         f"错误 {device['parse_errors'] + device['read_errors']}, "
+                         f"重连 {device['reconnect_count']}")
+        self.device_stats_value.setText("\n".join(lines))
+
+    # 性能统计面板关闭(如点击面板的关闭按钮)时同步按钮状态
+    def on_performance_dock_visibility_changed(self, visible):
+        if not visible and self.performance_dock.isHidden():
+            self.performance_button.setChecked(False)
+
+    # 刷新性能统计面板，面板隐藏时跳过
+    def update_performance_panel(self):
+        if self.performance_dock.isHidden():
+            return
+        stats = self.performance_monitor.get_stats()
+        table = self.performance_table
+        table.setRowCount(len(stats))
+        for row, stage in enumerate(stats):
+            cells = [stage["description"], f"{stage['rate']:.1f}", f"{stage['item_rate']:.0f}",
+                     f"{stage['p50'] * 1000:.2f}", f"{stage['p90'] * 1000:.2f}",
+                     f"{stage['p99'] * 1000:.2f}", f"{stage['max'] * 1000:.2f}"]
+            for column, text in enumerate(cells):
+                item = table.item(row, column)
+                if item is None:
+                    item = QTableWidgetItem()
+                    table.setItem(row, column, item)
+                item.setText(text)
+
+    # 设置界面刷新帧率
+    def set_render_fps(self, fps):
+        self.render_timer.start(max(1, int(1000 / fps)))
+
+    # 绘制一帧: 刷新图表、滚动统计和当前值标签，数据没有变化时跳过
+    def render_frame(self):
+        self.chart_manager.render_frame()
+        self.update_rolling_stats()
         
-        # 存储到数据库
-        self.db_manager.insert_data(thermal_value, light_value)
+        if self.latest_sample is None or self.latest_sample is self.displayed_sample:
+            return
+        _, values = self.latest_sample
+        displayed = None if self.displayed_sample is None else self.displayed_sample[1]
+        
+        # 更新UI显示，只更新数值变化的通道；0/1通道根据状态设置不同的颜色
+        for i, (channel, value_label) in enumerate(zip(self.channels, self.value_labels)):
+            value = values[i]
+            if displayed is not None and displayed[i] == value:
+                continue
+            if channel.is_binary:
+                if value >= channel.maximum:
+                    value_label.setStyleSheet("color: red; font-weight: bold;")
+                else:
+                    value_label.setStyleSheet("color: green; font-weight: bold;")
+            value_label.setText(channel.format_value(value))
+        
+        self.displayed_sample = self.latest_sample
 
-    # 处理连接状态变化
+    # 刷新当前显示设备的滚动统计，文字变化太快时无法阅读，最多每 ROLLING_STATS_INTERVAL 秒刷新一次
+    def update_rolling_stats(self):
+        now = time.monotonic()
+        if now - self._rolling_stats_time < self.ROLLING_STATS_INTERVAL:
+            return
+        self._rolling_stats_time = now
+        snapshot = self.rolling_stats.snapshot(self.chart_manager.device_id)
+        for i, stats_label in enumerate(self.rolling_stats_labels):
+            text = self.rolling_stats.format_channel(i, snapshot) if snapshot else "--"
+            if stats_label.text() != text:
+                stats_label.setText(text)
+
+    # 处理连接状态变化，采集进程连接了新的串口时更新串口和设备列表
     def on_connection_status_changed(self, connected, message):
         self.status_value.setText(message)
+        if self.remote_acquisition:
+            self.refresh_port_list()
+            self.refresh_device_list()
 
     # 加载历史数据
+    # 图表时间范围内内存存储中没有的较早部分在后台线程中查询数据库，窗口先显示，数据加载完成后再补充到内存存储
     def load_historical_data(self):
-        data = self.db_manager.get_recent_data(60)  # 获取最近60分钟的数据
-        self.chart_manager.load_historical_data(data)
+        device_id = self.chart_manager.device_id
+        start_ms = int((time.time() - self.chart_manager.window_minutes * 60) * 1000)
+        end_ms = self.hot_store.covered_from(device_id)
+        if start_ms >= end_ms:
+            return
+        # 切换设备时上一次加载可能还没有结束，等它结束后再替换，结果按设备ID补充
+        if self.history_loader is not None:
+            self.history_loader.wait()
+        self.history_loader = HistoryLoader(self.db_manager, start_ms, end_ms, device_id)
+        self.history_loader.loaded.connect(self.chart_manager.load_historical_data)
+        self.history_loader.start()
 
-    # 清理旧数据
-    def clean_old_data(self):
-        self.db_manager.clean_old_data(60)  # 清理60分钟前的数据
+    # 导出数据: 在对话框中选择范围和格式后，在后台线程中导出，进度对话框可以取消导出
+    def export_data(self):
+        dialog = ExportDialog(self.db_manager.get_devices(), self)
+        if dialog.exec_() != QDialog.Accepted:
+            return
+        path, start_ms, end_ms, device_id, fmt = dialog.get_options()
+        exporter = DataExporter(self.db_manager, path, start_ms, end_ms, device_id, fmt)
+        
+        # 进度按千分比显示，避免行数超出进度条的整数范围
+        progress_dialog = QProgressDialog("正在导出数据...", "取消", 0, 1000, self)
+        progress_dialog.setWindowTitle("导出数据")
+        progress_dialog.setWindowModality(Qt.WindowModal)
+        progress_dialog.setMinimumDuration(0)
+        progress_dialog.canceled.connect(exporter.cancel)
+        
+        self.export_action.setEnabled(False)
+        self.export_worker = ExportWorker(exporter)
+        self.export_worker.progress.connect(
+            lambda done, total: progress_dialog.setValue(int(1000 * done / max(1, total))))
+        self.export_worker.done.connect(lambda ok, message: self.on_export_done(progress_dialog, ok, message))
+        self.export_worker.start()
+
+    # 导出结束，关闭进度对话框并显示结果
+    def on_export_done(self, progress_dialog, ok, message):
+        progress_dialog.canceled.disconnect()
+        progress_dialog.close()
+        self.export_action.setEnabled(True)
+        cancelled = self.export_worker.exporter.cancelled
+        self.export_worker = None
+        if ok:
+            QMessageBox.information(self, "导出数据", message)
+        elif not cancelled:
+            QMessageBox.warning(self, "导出数据", message)
+        self.status_value.setText(message)
 
     # 窗口关闭事件处理
     def closeEvent(self, event):
 
-        # 断开串口连接
-        if self.serial_manager.is_connected:
-            self.serial_manager.disconnect_port()
-
-        # 停止模拟数据生成
+        # 停止模拟数据生成和界面刷新
         self.data_simulator.stop()
+        self.render_timer.stop()
+        self.stats_timer.stop()
+        self.event_loop_monitor.stop()
+        if self.export_worker is not None:
+            self.export_worker.exporter.cancel()
+            self.export_worker.wait()
+
+        # 断开所有串口连接，合并线程发出剩余数据
+        self.serial_manager.close()
+        self.data_simulator.close_pty()
+        QApplication.processEvents()  # 处理合并线程最后发出的数据，使其写入数据库
         
-        # 关闭数据库连接
-        self.db_manager.close()
+        # 停止历史数据块的读取线程，关闭数据库连接，最多等待3秒提交剩余数据
+        self.tile_loader.stop()
+        self.db_manager.close(timeout=3.0)
+        self.performance_monitor.stop()
         
         # 接受关闭事件
         event.accept()
 
 # 主函数
+# 无界面模式在导入图形界面之前已经进入，这里只处理图形界面的参数
 def main():
+    args = parse_args(sys.argv[1:])
+    setup_logging(args.log_level, dict(args.log_component), args.log_file)
     app = QApplication(sys.argv)
-    window = MainWindow()
+
+    # 独立采集进程: 已有采集进程在运行(如界面重启)时直接连接，否则以无界面模式启动一个，其余参数原样传递
+    acquisition = None
+    if args.acquisition_process or args.ring:
+        ring = args.ring or SharedSampleRing.default_name(args.db)
+        command = None
+        if args.acquisition_process:
+            script = os.path.join(os.path.dirname(os.path.abspath(__file__)), "sensor_core.py")
+            argv = [arg for arg in sys.argv[1:] if arg != "--acquisition-process"]
+            command = [sys.executable, script] + argv + ["--ring", ring]
+        acquisition = RemoteAcquisition(ring, command)
+    window = MainWindow(ChannelRegistry.load(args.channels), args.db, simulator_options(args),
+                        args.metrics_file, args.metrics_interval, queue_options(args), args.tile_cache_mb,
+                        acquisition, args.hot_window, args.hot_capacity, args.storage, args.max_error,
+                        args.archive, args.archive_days)
+    if args.sim_pty and acquisition is None:
+        # 模拟数据写入虚拟串口，选择该串口并在模拟模式下连接即可经串口读取线程接收
+        window.data_simulator.open_pty(args.protocol)
+        window.refresh_port_list()
     window.show()
     sys.exit(app.exec_())
 
@@ -0,0 +1,4875 @@
+# 传感器数据采集核心模块: 通道配置、串口读取、多设备数据合并和数据库存储
+# 只依赖QtCore，不导入QtWidgets和QtChart，既供图形界面使用，也可以单独以无界面模式运行
+
+import os
+import re
+import sys
+import csv
+import json
+import time
+import math
+import queue
+import signal
+import atexit
+import struct
+import sqlite3
+import logging
+import logging.handlers
+import argparse
+import binascii
+import subprocess
+import collections
+import urllib.request
+import threading
+from multiprocessing import shared_memory, resource_tracker
+from datetime import datetime, timezone
+import numpy as np
+import serial
+import serial.tools.list_ports
+from PyQt5.QtCore import QCoreApplication, QTimer, QThread, pyqtSignal, QObject
+
+# 各组件的日志记录器，级别可以按组件单独设置，例如 sensor.serial=DEBUG
+serial_log = logging.getLogger("sensor.serial")
+db_log = logging.getLogger("sensor.db")
+sim_log = logging.getLogger("sensor.sim")
+perf_log = logging.getLogger("sensor.perf")
+app_log = logging.getLogger("sensor.app")
+
+# 当前的日志输出线程，由 setup_logging 创建
+_log_listener = None
+
+# 日志限流过滤器，同一位置的同一条警告/错误在interval秒内最多输出burst条，其余只计数，
+# 下一个时间窗口输出时附上被省略的条数，避免串口持续出错时日志刷屏
+class RateLimitFilter(logging.Filter):
+
+    # 初始化过滤器，只限制level及以上级别的日志
+    def __init__(self, interval=10.0, burst=5, level=logging.WARNING):
+        super().__init__()
+        self.interval = interval
+        self.burst = burst
+        self.level = level
+        self._windows = {}  # (记录器名称, 消息模板) -> [窗口开始时间, 已输出条数, 已省略条数]
+        self._lock = threading.Lock()
+
+    # 判断是否输出该条日志，消息模板相同即视为同一条，参数不同不影响
+    def filter(self, record):
+        if record.levelno < self.level:
+            return True
+        key = (record.name, record.msg)
+        now = time.monotonic()
+        with self._lock:
+            window = self._windows.get(key)
+            if window is None or now - window[0] >= self.interval:
+                suppressed = window[2] if window is not None else 0
+                window = self._windows[key] = [now, 0, 0]
+            else:
+                suppressed = 0
+            if window[1] >= self.burst:
+                window[2] += 1
+                return False
+            window[1] += 1
+        if suppressed:
+            record.msg = f"{record.msg} (过去 {self.interval:g} 秒内省略了 {suppressed} 条相同的日志)"
+        return True
+
+# 配置日志输出，level为整体级别，component_levels为 {组件名: 级别}，如 {"serial": "DEBUG"}
+# 调用方只把日志记录放入队列，由后台线程格式化并写入终端或log_file，采集线程不会因输出而阻塞
+# 返回后台输出线程(QueueListener)，程序退出时由 stop_logging 写完剩余的日志，重复调用时替换之前的配置
+def setup_logging(level="INFO", component_levels=None, log_file=None):
+    global _log_listener
+    stop_logging()
+    root = logging.getLogger("sensor")
+    root.setLevel(level)
+    root.propagate = False
+    for name, component_level in (component_levels or {}).items():
+        logging.getLogger(f"sensor.{name}").setLevel(component_level)
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+
+    if log_file:
+        output = logging.FileHandler(log_file, encoding="utf-8")
+    else:
+        output = logging.StreamHandler(sys.stdout)
+    output.setFormatter(logging.Formatter("%(asctime)s %(levelname)s [%(name)s] %(message)s"))
+
+    log_queue = queue.SimpleQueue()
+    handler = logging.handlers.QueueHandler(log_queue)
+    handler.addFilter(RateLimitFilter())
+    root.addHandler(handler)
+    _log_listener = logging.handlers.QueueListener(log_queue, output)
+    _log_listener.start()
+    atexit.unregister(stop_logging)
+    atexit.register(stop_logging)
+    return _log_listener
+
+# 停止日志输出线程，写完队列中剩余的日志后关闭输出
+def stop_logging():
+    global _log_listener
+    if _log_listener is None:
+        return
+    _log_listener.stop()
+    for handler in _log_listener.handlers:
+        handler.close()
+    _log_listener = None
+
+# 解析 --log-component 参数 "组件=级别"
+def parse_log_component(text):
+    name, sep, level = text.partition("=")
+    level = level.strip().upper()
+    if not sep or not name.strip() or not isinstance(logging.getLevelName(level), int):
+        raise argparse.ArgumentTypeError(f"组件日志级别格式应为 组件=级别，例如 serial=DEBUG: {text}")
+    return name.strip(), level
+
+# 通道定义，描述一个传感器通道的名称、类型、量程和单位
+class ChannelSpec:
+
+    KINDS = ("binary", "analog")
+    COMPRESSIONS = ("swinging_door", "deadband")  # 压缩存储时模拟量通道的压缩方法
+
+    # 初始化通道定义
+    # name为英文标识，同时用作数据库列名前缀；kind为"binary"(0/1状态量)或"analog"(模拟量)
+    # states为状态量各取值的说明，如 {0: "正常", 1: "高温"}
+    # compression和max_error为压缩存储时模拟量通道的压缩方法和允许误差，0/1通道总是按游程无损保存
+    def __init__(self, name, label, kind="analog", minimum=0, maximum=4095, unit="",
+                 states=None, title=None, compression="swinging_door", max_error=0.0):
+        if not re.fullmatch(r"[A-Za-z_][A-Za-z0-9_]*", name):
+            raise ValueError(f"通道名称只能包含字母、数字和下划线: {name}")
+        if kind not in self.KINDS:
+            raise ValueError(f"未知的通道类型: {kind}")
+        if compression not in self.COMPRESSIONS:
+            raise ValueError(f"未知的压缩方法: {compression}")
+        if max_error < 0:
+            raise ValueError(f"允许误差不能为负数: {max_error}")
+        self.name = name
+        self.label = label
+        self.kind = kind
+        self.minimum = minimum
+        self.maximum = maximum
+        self.unit = unit
+        self.states = {int(key): value for key, value in (states or {}).items()}
+        self.title = title or f"{label}数据"
+        self.compression = compression
+        self.max_error = float(max_error)
+
+    # 是否为0/1状态量
+    @property
+    def is_binary(self):
+        return self.kind == "binary"
+
+    # 原始数据表中的列名
+    @property
+    def column(self):
+        return f"{self.name}_value"
+
+    # 格式化显示数值
+    def format_value(self, value):
+        if self.is_binary:
+            state = self.states.get(int(value))
+            return f"{int(value)} ({state})" if state else str(int(value))
+        text = f"{value:g}"
+        return f"{text} {self.unit}" if self.unit else text
+
+# 通道注册表，按顺序保存所有通道定义，数据帧、数据库列和图表都由它生成
+class ChannelRegistry:
+
+    # 默认通道配置，与现有固件的 "热敏状态,光照值" 数据格式一致
+    DEFAULT_CHANNELS = [
+        {"name": "thermal", "label": "热敏状态", "kind": "binary", "min": 0, "max": 1,
+         "states": {0: "正常", 1: "高温"}, "title": "热敏传感器数据"},
+        {"name": "light", "label": "光照值", "kind": "analog", "min": 100, "max": 4000,
+         "title": "光敏传感器数据", "max_error": 5},
+    ]
+
+    # 初始化通道注册表
+    def __init__(self, channels):
+        self.channels = list(channels)
+        self._index = {}
+        for i, channel in enumerate(self.channels):
+            if channel.name in self._index:
+                raise ValueError(f"通道名称重复: {channel.name}")
+            self._index[channel.name] = i
+
+    # 由配置列表创建注册表，每项为 {"name", "label", "kind", "min", "max", "unit", "states", "title",
+    # "compression", "max_error"}
+    @classmethod
+    def from_config(cls, items):
+        return cls(ChannelSpec(item["name"], item.get("label", item["name"]),
+                               item.get("kind", "analog"), item.get("min", 0), item.get("max", 4095),
+                               item.get("unit", ""), item.get("states"), item.get("title"),
+                               item.get("compression", "swinging_door"), item.get("max_error", 0.0))
+                   for item in items)
+
+    # 默认的热敏/光敏两通道配置
+    @classmethod
+    def default(cls):
+        return cls.from_config(cls.DEFAULT_CHANNELS)
+
+    # 从JSON配置文件加载通道定义，文件不存在时使用默认配置
+    # 文件格式: {"channels": [{"name": "t1", "label": "温度1", "kind": "analog", ...}, ...]}
+    @classmethod
+    def load(cls, path="channels.json"):
+        if not os.path.exists(path):
+            return cls.default()
+        with open(path, encoding="utf-8") as f:
+            config = json.load(f)
+        registry = cls.from_config(config["channels"] if isinstance(config, dict) else config)
+        app_log.info("已从 %s 加载 %d 个通道", path, len(registry))
+        return registry
+
+    # 通道名称对应的序号
+    def index(self, name):
+        return self._index[name]
+
+    # 所有通道名称
+    @property
+    def names(self):
+        return [channel.name for channel in self.channels]
+
+    # 原始数据表中各通道的列名
+    @property
+    def columns(self):
+        return [channel.column for channel in self.channels]
+
+    def __len__(self):
+        return len(self.channels)
+
+    def __iter__(self):
+        return iter(self.channels)
+
+    def __getitem__(self, i):
+        return self.channels[i]
+
+# 延迟直方图，按HDR直方图的方式分桶: 小于 SUB_BUCKETS 微秒的值每微秒一个桶，
+# 更大的值每翻一倍分成 SUB_BUCKETS / 2 个等宽的桶，相对误差不超过约3%，内存固定，记录一次只是一次加法
+# 可以在多个线程中记录，读取时复制一份计数
+class LatencyHistogram:
+
+    # 每个数量级(2倍)的分桶数，决定精度
+    SUB_BITS = 6
+    SUB_BUCKETS = 1 << SUB_BITS
+    # 可记录的最大值约为 2^36 微秒(约19小时)，更大的值计入最后一个桶
+    MAX_SHIFT = 30
+
+    # 初始化直方图
+    def __init__(self):
+        half = self.SUB_BUCKETS // 2
+        self.counts = [0] * (self.SUB_BUCKETS + self.MAX_SHIFT * half)  # 单次记录时列表比NumPy数组快得多
+        self.count = 0  # 记录的事件数
+        self.items = 0  # 事件处理的样本数，用于计算吞吐量
+        self.total = 0.0  # 延迟总和(s)
+        self.max = 0.0  # 最大延迟(s)
+        self._lock = threading.Lock()
+
+    # 微秒值对应的桶序号，value_us为非负整数数组
+    @classmethod
+    def bucket_index(cls, value_us):
+        half = cls.SUB_BUCKETS // 2
+        _, exponent = np.frexp(value_us)  # exponent 即整数的二进制位数
+        shift = np.clip(exponent - cls.SUB_BITS, 0, cls.MAX_SHIFT)
+        index = np.where(shift == 0, value_us,
+                         cls.SUB_BUCKETS + (shift - 1) * half + (value_us >> shift) - half)
+        return np.minimum(index, cls.SUB_BUCKETS + cls.MAX_SHIFT * half - 1)
+
+    # 桶序号对应的数值范围下限(微秒)
+    @classmethod
+    def bucket_lower(cls, index):
+        half = cls.SUB_BUCKETS // 2
+        index = np.asarray(index, dtype=np.int64)
+        shift = np.maximum(0, (index - cls.SUB_BUCKETS) // half + 1)
+        return np.where(shift == 0, index, ((index - cls.SUB_BUCKETS) % half + half) << shift)
+
+    # 记录一次耗时seconds，items为这次处理的样本数
+    def record(self, seconds, items=1):
+        value_us = max(0, int(seconds * 1e6))
+        shift = min(value_us.bit_length() - self.SUB_BITS, self.MAX_SHIFT)
+        if shift <= 0:
+            index = value_us
+        else:
+            half = self.SUB_BUCKETS // 2
+            index = min(self.SUB_BUCKETS + (shift - 1) * half + (value_us >> shift) - half, len(self.counts) - 1)
+        with self._lock:
+            self.counts[index] += 1
+            self.count += 1
+            self.items += items
+            self.total += seconds
+            if seconds > self.max:
+                self.max = seconds
+
+    # 批量记录每个样本的延迟，seconds为延迟数组(s)
+    def record_many(self, seconds):
+        if not len(seconds):
+            return
+        value_us = np.maximum(np.asarray(seconds) * 1e6, 0).astype(np.int64)
+        counts = np.bincount(self.bucket_index(value_us))
+        indices = np.flatnonzero(counts)
+        with self._lock:
+            for index, count in zip(indices.tolist(), counts[indices].tolist()):
+                self.counts[index] += count
+            self.count += len(value_us)
+            self.items += len(value_us)
+            self.total += float(np.sum(seconds))
+            self.max = max(self.max, float(np.max(seconds)))
+
+    # 复制当前的计数，返回 (各桶计数, 事件数, 样本数, 延迟总和, 最大延迟)
+    def snapshot(self):
+        with self._lock:
+            return np.array(self.counts, dtype=np.int64), self.count, self.items, self.total, self.max
+
+    # 由各桶计数计算分位数(s)，quantiles为0~1之间的列表，取所在桶的中点，不超过记录的最大值maximum
+    @classmethod
+    def quantiles(cls, counts, quantiles, maximum=None):
+        total = counts.sum()
+        if total == 0:
+            return [0.0] * len(quantiles)
+        cumulative = np.cumsum(counts)
+        result = []
+        for q in quantiles:
+            index = int(np.searchsorted(cumulative, max(1, math.ceil(q * total))))
+            lower = cls.bucket_lower(index)
+            upper = cls.bucket_lower(index + 1)
+            value = float(lower + upper) / 2 / 1e6
+            result.append(value if maximum is None else min(value, maximum))
+        return result
+
+    # 清空所有计数
+    def reset(self):
+        with self._lock:
+            self.counts = [0] * len(self.counts)
+            self.count = 0
+            self.items = 0
+            self.total = 0.0
+            self.max = 0.0
+
+# 事件循环延迟监测，定时器每隔interval毫秒触发一次，实际触发时间比预期晚的部分就是事件循环的延迟
+# 延迟大说明界面线程被数据处理或绘制阻塞
+class EventLoopMonitor(QObject):
+
+    # 初始化事件循环监测
+    def __init__(self, interval=100):
+        super().__init__()
+        self.interval = interval
+        self.histogram = LatencyHistogram()
+        self.timer = QTimer()
+        self.timer.timeout.connect(self.on_timeout)
+        self._expected = None
+
+    # 开始监测
+    def start(self):
+        self._expected = time.perf_counter() + self.interval / 1000
+        self.timer.start(self.interval)
+
+    # 停止监测
+    def stop(self):
+        self.timer.stop()
+
+    # 记录本次触发的延迟
+    def on_timeout(self):
+        now = time.perf_counter()
+        self.histogram.record(max(0.0, now - self._expected))
+        self._expected = now + self.interval / 1000
+
+# 性能监测，汇总各处理阶段的延迟直方图，计算吞吐量和分位数，并定期写入Prometheus文本格式的文件，
+# 供node exporter的textfile collector采集
+class PerformanceMonitor(QObject):
+
+    # 输出的分位数
+    QUANTILES = (0.5, 0.9, 0.99)
+    # Prometheus直方图的桶上限(s)
+    PROMETHEUS_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05,
+                          0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+    # 初始化性能监测，metrics_file为Prometheus文本文件路径，为空时不写文件，interval为写文件间隔(s)
+    def __init__(self, metrics_file=None, interval=15.0):
+        super().__init__()
+        self.stages = []  # [(阶段名称, 说明, 直方图), ...]
+        self.queue_sources = []  # 返回 {队列名称: 队列统计} 的函数
+        self.metric_sources = []  # 返回Prometheus文本格式指标行列表的函数
+        self.metrics_file = metrics_file
+        self._last = {}  # 阶段名称 -> (时间, 事件数, 样本数)，用于计算速率
+        self.timer = QTimer()
+        self.timer.timeout.connect(self.write_metrics)
+        if metrics_file:
+            self.timer.start(int(interval * 1000))
+
+    # 添加一个处理阶段
+    def add_stage(self, name, description, histogram):
+        self.stages.append((name, description, histogram))
+
+    # 添加队列统计的来源，如 SerialManager.get_queue_stats
+    def add_queues(self, source):
+        self.queue_sources.append(source)
+
+    # 添加其他指标的来源，如 RollingStats.prometheus_lines
+    def add_metrics(self, source):
+        self.metric_sources.append(source)
+
+    # 获取所有队列的统计: {队列名称: {...}}
+    def get_queue_stats(self):
+        stats = {}
+        for source in self.queue_sources:
+            stats.update(source())
+        return stats
+
+    # 获取各阶段的统计: [{"stage", "description", "count", "items", "rate", "item_rate", "mean", "p50", "p90", "p99", "max"}, ...]
+    # 速率为自上次调用以来的每秒事件数和样本数，延迟单位为秒
+    def get_stats(self):
+        now = time.monotonic()
+        stats = []
+        for name, description, histogram in self.stages:
+            counts, count, items, total, maximum = histogram.snapshot()
+            last_time, last_count, last_items = self._last.get(name, (now, count, items))
+            elapsed = now - last_time
+            self._last[name] = (now, count, items)
+            p50, p90, p99 = LatencyHistogram.quantiles(counts, self.QUANTILES, maximum)
+            stats.append({
+                "stage": name,
+                "description": description,
+                "count": count,
+                "items": items,
+                "rate": (count - last_count) / elapsed if elapsed > 0 else 0.0,
+                "item_rate": (items - last_items) / elapsed if elapsed > 0 else 0.0,
+                "mean": total / count if count else 0.0,
+                "p50": p50,
+                "p90": p90,
+                "p99": p99,
+                "max": maximum,
+            })
+        return stats
+
+    # 生成Prometheus文本格式的指标
+    def prometheus_text(self):
+        lines = [
+            "# HELP sensor_stage_latency_seconds Latency of each processing stage.",
+            "# TYPE sensor_stage_latency_seconds histogram",
+        ]
+        bounds_us = np.array(self.PROMETHEUS_BUCKETS) * 1e6
+        summary = []
+        for name, _, histogram in self.stages:
+            counts, count, items, total, maximum = histogram.snapshot()
+            # 细分桶的上限不超过Prometheus桶的上限时计入该桶
+            upper = LatencyHistogram.bucket_lower(np.arange(1, len(counts) + 1))
+            cumulative = [int(counts[upper <= bound].sum()) for bound in bounds_us]
+            for bound, value in zip(self.PROMETHEUS_BUCKETS, cumulative):
+                lines.append(f'sensor_stage_latency_seconds_bucket{{stage="{name}",le="{bound:g}"}} {value}')
+            lines.append(f'sensor_stage_latency_seconds_bucket{{stage="{name}",le="+Inf"}} {count}')
+            lines.append(f'sensor_stage_latency_seconds_sum{{stage="{name}"}} {total:.9g}')
+            lines.append(f'sensor_stage_latency_seconds_count{{stage="{name}"}} {count}')
+            summary.append((name, items, LatencyHistogram.quantiles(counts, self.QUANTILES, maximum)))
+        lines += [
+            "# HELP sensor_stage_items_total Samples processed by each stage.",
+            "# TYPE sensor_stage_items_total counter",
+        ]
+        lines += [f'sensor_stage_items_total{{stage="{name}"}} {items}' for name, items, _ in summary]
+        lines += [
+            "# HELP sensor_stage_latency_quantile_seconds Latency quantiles of each stage since start.",
+            "# TYPE sensor_stage_latency_quantile_seconds gauge",
+        ]
+        for name, _, values in summary:
+            for q, value in zip(self.QUANTILES, values):
+                lines.append(f'sensor_stage_latency_quantile_seconds{{stage="{name}",quantile="{q:g}"}} {value:.9g}')
+        
+        # 各队列的深度、最高水位和丢弃/抽稀的样本数
+        queues = self.get_queue_stats()
+        for metric, key, kind, help_text in (
+                ("sensor_queue_depth_samples", "depth", "gauge", "Samples waiting in each queue."),
+                ("sensor_queue_high_water_samples", "high_water", "gauge", "Highest queue depth since start."),
+                ("sensor_queue_capacity_samples", "capacity", "gauge", "Queue capacity in samples."),
+                ("sensor_queue_dropped_samples_total", "dropped_samples", "counter", "Samples dropped by each queue."),
+                ("sensor_queue_decimated_samples_total", "decimated_samples", "counter",
+                 "Samples removed by decimation in each queue."),
+                ("sensor_queue_blocked_seconds_total", "blocked_time_s", "counter",
+                 "Time producers spent waiting for queue space.")):
+            lines += [f"# HELP {metric} {help_text}", f"# TYPE {metric} {kind}"]
+            lines += [f'{metric}{{queue="{name}",policy="{stats["policy"]}"}} {stats[key]:.9g}'
+                      for name, stats in queues.items()]
+        for source in self.metric_sources:
+            lines += source()
+        return "\n".join(lines) + "\n"
+
+    # 写入Prometheus文本文件，先写临时文件再重命名，采集端不会读到写了一半的文件
+    def write_metrics(self):
+        if not self.metrics_file:
+            return
+        temp = self.metrics_file + ".tmp"
+        try:
+            with open(temp, "w", encoding="utf-8") as f:
+                f.write(self.prometheus_text())
+            os.replace(temp, self.metrics_file)
+        except OSError as e:
+            perf_log.error("写入性能指标文件错误: %s", e)
+
+    # 停止定时写入，并写入最后一次
+    def stop(self):
+        self.timer.stop()
+        self.write_metrics()
+
+# 有界队列，连接采集、存储和界面各处理阶段，容量按样本数计算，队列满时按策略处理:
+#   block: 放入方等待，直到消费方取走数据，保证不丢数据，压力逐级传回上游
+#   drop_oldest: 丢弃最早的批次，保留最新的数据
+#   decimate: 队列中的数据和新数据每两个样本保留一个，仍然超出时再丢弃最早的批次，适用于界面显示
+# 队列中的批次为元组，其中的NumPy数组按第一维(样本)对齐，其他对象(如设备ID)原样保留；
+# 非元组的对象(如停止标记)不受容量限制，也不会被丢弃
+class BoundedQueue:
+
+    POLICIES = ("block", "drop_oldest", "decimate")
+
+    # 初始化队列，policy为队列满时的处理策略，capacity为最多容纳的样本数
+    # timeout为block策略下最长等待时间(s)，超时后丢弃新数据，为空时一直等待
+    def __init__(self, policy="block", capacity=100000, name="", timeout=None):
+        if policy not in self.POLICIES:
+            raise ValueError(f"未知的队列策略: {policy}")
+        if capacity <= 0:
+            raise ValueError(f"队列容量必须大于0: {capacity}")
+        self.capacity = capacity
+        self.policy = policy
+        self.name = name
+        self.timeout = timeout
+        self.on_ready = None  # 数据放入空队列时调用，用于通知其他线程中的消费方
+        self._items = collections.deque()
+        self._size = 0  # 队列中的样本数
+        self._lock = threading.Lock()
+        self._not_empty = threading.Condition(self._lock)
+        self._not_full = threading.Condition(self._lock)
+        
+        # 统计计数，均以样本数计
+        self.put_samples = 0  # 放入的样本数，包括之后被丢弃和抽稀的
+        self.dropped_samples = 0  # 丢弃的样本数
+        self.decimated_samples = 0  # 抽稀去掉的样本数
+        self.high_water = 0  # 队列中曾经达到的最大样本数
+        self.max_batches = 0  # 队列中曾经达到的最大批次数
+        self.blocked_count = 0  # 放入时等待的次数
+        self.blocked_time = 0.0  # 放入时等待的总时间(s)
+
+    # 批次中的样本数，即第一个数组的长度；非元组的对象为0
+    @staticmethod
+    def _count(item):
+        if isinstance(item, tuple):
+            for part in item:
+                if isinstance(part, np.ndarray):
+                    return len(part)
+        return 0
+
+    # 每step个样本保留一个，总是保留最后一个样本，使最新的数值不会因抽稀而丢失
+    @staticmethod
+    def _decimate(item, step=2):
+        count = BoundedQueue._count(item)
+        if count < 2:
+            return item
+        start = (count - 1) % step
+        return tuple(part[start::step] if isinstance(part, np.ndarray) else part for part in item)
+
+    # 只保留批次中最后count个样本
+    @staticmethod
+    def _tail(item, count):
+        return tuple(part[-count:] if isinstance(part, np.ndarray) else part for part in item)
+
+    # 放入一批数据，返回是否放入；队列满时按策略等待、丢弃或抽稀，可以在任意线程中调用
+    def put(self, item):
+        count = self._count(item)
+        with self._not_full:
+            was_empty = not self._items
+            self.put_samples += count
+            
+            # 单个批次超过容量时先按策略缩小这一批，block策略下整批放入，避免一直等待
+            if count > self.capacity and self.policy == "decimate":
+                item = self._decimate(item, -(-count // self.capacity))
+                self.decimated_samples += count - self._count(item)
+                count = self._count(item)
+            elif count > self.capacity and self.policy == "drop_oldest":
+                item = self._tail(item, self.capacity)
+                self.dropped_samples += count - self.capacity
+                count = self.capacity
+            if count and self._size and self._size + count > self.capacity:
+                if self.policy == "block":
+                    if not self._wait_for_space(count):
+                        self.dropped_samples += count
+                        return False
+                elif self.policy == "decimate":
+                    item, count = self._decimate_all(item, count)
+                    self._drop_oldest(count)
+                else:
+                    self._drop_oldest(count)
+            self._items.append(item)
+            self._size += count
+            if self._size > self.high_water:
+                self.high_water = self._size
+            if count and len(self._items) > self.max_batches:
+                self.max_batches = len(self._items)
+            self._not_empty.notify()
+        if was_empty and self.on_ready is not None:
+            self.on_ready()
+        return True
+
+    # 等待消费方取走数据，直到放得下count个样本，超时返回False
+    def _wait_for_space(self, count):
+        start = time.monotonic()
+        deadline = None if self.timeout is None else start + self.timeout
+        self.blocked_count += 1
+        try:
+            while self._size and self._size + count > self.capacity:
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    return False
+                self._not_full.wait(remaining)
+            return True
+        finally:
+            self.blocked_time += time.monotonic() - start
+
+    # 抽稀队列中的全部数据和新的一批数据，返回抽稀后的新批次及其样本数
+    def _decimate_all(self, item, count):
+        size = 0
+        for i, queued in enumerate(self._items):
+            queued = self._items[i] = self._decimate(queued)
+            size += self._count(queued)
+        self.decimated_samples += self._size - size
+        self._size = size
+        decimated = self._decimate(item)
+        remaining = self._count(decimated)
+        self.decimated_samples += count - remaining
+        return decimated, remaining
+
+    # 丢弃最早的批次，直到放得下count个样本
+    def _drop_oldest(self, count):
+        kept = []
+        while self._items and self._size + count > self.capacity:
+            item = self._items.popleft()
+            dropped = self._count(item)
+            if not dropped:
+                kept.append(item)  # 停止标记等控制对象不丢弃
+                continue
+            self._size -= dropped
+            self.dropped_samples += dropped
+        self._items.extendleft(reversed(kept))
+
+    # 取出一批数据，队列为空时最多等待timeout秒，超时抛出 queue.Empty，与 queue.Queue 相同
+    def get(self, block=True, timeout=None):
+        with self._not_empty:
+            if not block:
+                if not self._items:
+                    raise queue.Empty
+            elif timeout is None:
+                while not self._items:
+                    self._not_empty.wait()
+            else:
+                deadline = time.monotonic() + timeout
+                while not self._items:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        raise queue.Empty
+                    self._not_empty.wait(remaining)
+            item = self._items.popleft()
+            self._size -= self._count(item)
+            self._not_full.notify_all()
+            return item
+
+    # 不等待，队列为空时抛出 queue.Empty
+    def get_nowait(self):
+        return self.get(block=False)
+
+    # 队列中的批次数
+    def qsize(self):
+        return len(self._items)
+
+    # 队列中的样本数
+    @property
+    def size(self):
+        return self._size
+
+    # 获取队列统计信息
+    def get_stats(self):
+        with self._lock:
+            return {
+                "policy": self.policy,
+                "capacity": self.capacity,
+                "depth": self._size,
+                "batches": len(self._items),
+                "high_water": self.high_water,
+                "max_batches": self.max_batches,
+                "put_samples": self.put_samples,
+                "dropped_samples": self.dropped_samples,
+                "decimated_samples": self.decimated_samples,
+                "blocked_count": self.blocked_count,
+                "blocked_time_s": self.blocked_time,
+            }
+
+# 各队列默认的 (策略, 容量(样本数))，存储路径默认阻塞等待，保证不丢数据；界面路径在过载时抽稀
+QUEUE_DEFAULTS = {
+    "ingest": ("block", 100000),  # 读取线程 -> 合并线程
+    "storage": ("block", 200000),  # 合并线程 -> 数据库写入线程
+    "ui": ("decimate", 50000),  # 合并线程 -> 界面线程
+}
+
+# 定长环形缓冲区，保存一组通道共用的时间戳和各通道的数值，内存大小固定
+# 每个通道的数值保存为单独的一列连续数组，每个数据同时写入 i 和 i + capacity 两个位置，
+# 有效数据始终是一段连续的数组，可以直接切片而不用拷贝
+class RingBuffer:
+
+    # 初始化环形缓冲区，width为通道数，dtype为时间戳的类型
+    def __init__(self, capacity, width=1, dtype=np.float64):
+        self.capacity = capacity
+        self.width = width
+        self.timestamps = np.zeros(2 * capacity, dtype=dtype)
+        self.columns = np.zeros((width, 2 * capacity), dtype=np.float64)  # 每行为一个通道的数值列
+        self.start = 0  # 最早数据的位置
+        self.size = 0  # 有效数据个数
+
+    # 追加一批数据，values为 (样本数, 通道数) 的数组，超出容量时覆盖最早的数据
+    def extend(self, timestamps, values):
+        timestamps = np.asarray(timestamps, dtype=self.timestamps.dtype)
+        values = np.asarray(values, dtype=np.float64).reshape(-1, self.width)
+        count = len(timestamps)
+        if count == 0:
+            return
+        if count > self.capacity:
+            timestamps = timestamps[-self.capacity:]
+            values = values[-self.capacity:]
+            count = self.capacity
+        
+        end = (self.start + self.size) % self.capacity
+        first = min(count, self.capacity - end)
+        self._write(end, timestamps[:first], values[:first])
+        self._write(0, timestamps[first:], values[first:])
+        
+        self.size += count
+        if self.size > self.capacity:
+            self.start = (self.start + self.size - self.capacity) % self.capacity
+            self.size = self.capacity
+
+    # 在pos及其镜像位置写入数据
+    def _write(self, pos, timestamps, values):
+        count = len(timestamps)
+        if count == 0:
+            return
+        mirror = pos + self.capacity
+        self.timestamps[pos:pos + count] = timestamps
+        self.timestamps[mirror:mirror + count] = timestamps
+        self.columns[:, pos:pos + count] = values.T
+        self.columns[:, mirror:mirror + count] = values.T
+
+    # 丢弃时间戳小于min_timestamp的数据，二分查找，O(log n)
+    def trim_before(self, min_timestamp):
+        count = int(np.searchsorted(self.timestamps[self.start:self.start + self.size],
+                                    min_timestamp, side='left'))
+        if count:
+            self.start = (self.start + count) % self.capacity
+            self.size -= count
+        return count
+
+    # 清空缓冲区
+    def clear(self):
+        self.start = 0
+        self.size = 0
+
+    # 返回按时间排列的 (时间戳数组, (样本数, 通道数) 的数值数组)，均为内部数组的视图，数值数组的每列是连续的
+    def arrays(self):
+        end = self.start + self.size
+        return self.timestamps[self.start:end], self.columns[:, self.start:end].T
+
+    # 占用的内存字节数，创建时一次分配
+    @property
+    def nbytes(self):
+        return self.timestamps.nbytes + self.columns.nbytes
+
+    def __len__(self):
+        return self.size
+
+# 最近数据的内存列存储，每个设备一个 RingBuffer: 整数毫秒时间戳列和每个通道一列数值，查询时按时间二分查找
+# 每个设备只保留最近window秒、最多capacity条数据，内存在设备第一次有数据时一次分配，之后不再增长
+# 记录每个设备从哪个时间起内存中的数据是完整的，更早的数据由调用方到数据库中查询
+# 可以在合并线程中写入、在其他线程中查询，query 返回拷贝
+class HotStore:
+
+    # 默认保留最近15分钟、每个设备最多50万条数据
+    DEFAULT_WINDOW = 15 * 60
+    DEFAULT_CAPACITY = 500000
+
+    # 初始化内存存储，width为通道数，window为保留的时长(s)，capacity为每个设备最多保存的样本数
+    def __init__(self, width, window=DEFAULT_WINDOW, capacity=DEFAULT_CAPACITY):
+        self.width = width
+        self.window_ms = int(window * 1000)
+        self.capacity = capacity
+        self.buffers = {}  # 设备ID -> RingBuffer
+        self.complete_from = {}  # 设备ID -> 从该时间(ms)起内存中的数据是完整的
+        self.started_ms = int(time.time() * 1000)  # 在此之前的数据只在数据库中，新设备从此时起完整
+        self.lock = threading.Lock()
+        
+        # 统计计数
+        self.samples_appended = 0
+        self.samples_evicted = 0  # 未超出时间窗口、因超出容量被覆盖的样本数
+
+    # 追加合并后的一批数据: timestamps为接收时间戳(s)数组，values为 (样本数, 通道数) 的数组，
+    # device_ids为每个样本的设备ID数组，在合并线程(或界面线程)中调用
+    def append(self, timestamps, values, device_ids):
+        if not len(timestamps):
+            return
+        ts_ms = (np.asarray(timestamps) * 1000).astype(np.int64)  # 与数据库中的ts_ms相同
+        values = np.asarray(values, dtype=np.float64).reshape(-1, self.width)
+        device_ids = np.asarray(device_ids)
+        with self.lock:
+            first = int(device_ids[0])
+            if (device_ids == first).all():
+                self._append(first, ts_ms, values)
+            else:
+                for device_id in np.unique(device_ids).tolist():
+                    mask = device_ids == device_id
+                    self._append(device_id, ts_ms[mask], values[mask])
+            self.samples_appended += len(ts_ms)
+
+    # 追加一个设备的数据，超出容量或时间窗口的数据被丢弃，完整范围的起点随之后移
+    def _append(self, device_id, ts_ms, values):
+        buffer = self._buffer(device_id)
+        overflow = len(buffer) + len(ts_ms) - self.capacity
+        if overflow > 0:
+            timestamps, _ = buffer.arrays()
+            last = timestamps[overflow - 1] if overflow <= len(timestamps) else ts_ms[overflow - len(timestamps) - 1]
+            self._advance(device_id, int(last) + 1)
+            self.samples_evicted += overflow
+        buffer.extend(ts_ms, values)
+        cutoff = int(ts_ms[-1]) - self.window_ms
+        buffer.trim_before(cutoff)
+        self._advance(device_id, cutoff)
+
+    # 设备的环形缓冲区，第一次有数据时创建
+    def _buffer(self, device_id):
+        buffer = self.buffers.get(device_id)
+        if buffer is None:
+            buffer = self.buffers[device_id] = RingBuffer(self.capacity, self.width, np.int64)
+            self.complete_from[device_id] = self.started_ms
+        return buffer
+
+    # 把设备完整范围的起点后移到time_ms
+    def _advance(self, device_id, time_ms):
+        if time_ms > self.complete_from[device_id]:
+            self.complete_from[device_id] = time_ms
+
+    # 用数据库中 [start_ms, end_ms) 范围的数据补充设备device_id较早的数据，timestamps为按时间排序的毫秒时间戳数组
+    # end_ms须不早于查询时的 covered_from，查询期间完整范围的起点已经后移(数据被覆盖)时不补充，返回False
+    def backfill(self, device_id, start_ms, end_ms, timestamps, values):
+        with self.lock:
+            buffer = self._buffer(device_id)
+            since = self.complete_from[device_id]
+            if start_ms >= since:
+                return True
+            if end_ms < since:
+                return False
+            count = int(np.searchsorted(timestamps, since, side='left'))
+            live_timestamps, live_values = buffer.arrays()
+            merged_timestamps = np.concatenate((np.asarray(timestamps[:count], dtype=np.int64), live_timestamps))
+            merged_values = np.concatenate((np.asarray(values[:count], dtype=np.float64).reshape(-1, self.width),
+                                            live_values))
+            buffer.clear()
+            self.complete_from[device_id] = int(start_ms)
+            if len(merged_timestamps):
+                self._append(device_id, merged_timestamps, merged_values)
+            return True
+
+    # 前面的数据有缺失(如界面读取共享内存落后)，所有设备从time_ms起才是完整的
+    def mark_gap(self, time_ms):
+        with self.lock:
+            self.started_ms = max(self.started_ms, int(time_ms))
+            for device_id in self.complete_from:
+                self._advance(device_id, int(time_ms))
+
+    # 从该时间(ms)起内存中的数据是完整的，更早的数据需要查询数据库
+    # device_id为空时为所有设备都完整的起点
+    def covered_from(self, device_id=None):
+        with self.lock:
+            if device_id is None:
+                return max([self.started_ms] + list(self.complete_from.values()))
+            return self.complete_from.get(device_id, self.started_ms)
+
+    # 查询 [start_ms, end_ms) 范围内的数据，end_ms为空时到最新的数据，device_id为空时查询所有设备并按时间合并
+    # 返回 (毫秒时间戳数组, (样本数, 通道数) 的数值数组, 设备ID数组) 的拷贝，早于 covered_from 的部分可能不完整
+    def query(self, start_ms, end_ms=None, device_id=None):
+        parts = []
+        with self.lock:
+            devices = list(self.buffers) if device_id is None else [device_id]
+            for device in devices:
+                buffer = self.buffers.get(device)
+                if buffer is None:
+                    continue
+                timestamps, values = buffer.arrays()
+                lo = int(np.searchsorted(timestamps, start_ms, side='left'))
+                hi = len(timestamps) if end_ms is None else int(np.searchsorted(timestamps, end_ms, side='left'))
+                if hi > lo:
+                    parts.append((timestamps[lo:hi].copy(), values[lo:hi].copy(), device))
+        if not parts:
+            return (np.empty(0, dtype=np.int64), np.empty((0, self.width), dtype=np.float64),
+                    np.empty(0, dtype=np.int64))
+        if len(parts) == 1:
+            timestamps, values, device = parts[0]
+            return timestamps, values, np.full(len(timestamps), device, dtype=np.int64)
+        
+        timestamps = np.concatenate([timestamps for timestamps, _, _ in parts])
+        values = np.concatenate([values for _, values, _ in parts])
+        device_ids = np.concatenate([np.full(len(timestamps), device, dtype=np.int64)
+                                     for timestamps, _, device in parts])
+        order = np.argsort(timestamps, kind="stable")
+        return timestamps[order], values[order], device_ids[order]
+
+    # 查询最近seconds秒的数据，返回值同 query
+    def recent(self, seconds, device_id=None):
+        return self.query(int((time.time() - seconds) * 1000), None, device_id)
+
+    # 设备在 [start_ms, end_ms] 范围内的数据，两侧各多带一个样本(用于绘图时把折线延伸到边界)
+    # 返回 (毫秒时间戳数组, 数值数组) 的拷贝: 缓冲区写满后合并线程会覆盖最早的数据，不能在锁外使用内部数组的视图
+    def window(self, device_id, start_ms, end_ms):
+        with self.lock:
+            buffer = self.buffers.get(device_id)
+            if buffer is None:
+                return np.empty(0, dtype=np.int64), np.empty((0, self.width), dtype=np.float64)
+            timestamps, values = buffer.arrays()
+            lo = max(0, int(np.searchsorted(timestamps, start_ms, side='left')) - 1)
+            hi = int(np.searchsorted(timestamps, end_ms, side='right')) + 1
+            return timestamps[lo:hi].copy(), values[lo:hi].copy()
+
+    # 设备的最新一个样本 (毫秒时间戳, 数值数组)，没有数据时返回None
+    def latest(self, device_id):
+        with self.lock:
+            buffer = self.buffers.get(device_id)
+            if buffer is None or not len(buffer):
+                return None
+            timestamps, values = buffer.arrays()
+            return int(timestamps[-1]), values[-1].copy()
+
+    # 设备在内存中的样本数
+    def count(self, device_id):
+        buffer = self.buffers.get(device_id)
+        return len(buffer) if buffer is not None else 0
+
+    # 获取统计信息
+    def get_stats(self):
+        with self.lock:
+            return {
+                "devices": len(self.buffers),
+                "samples": sum(len(buffer) for buffer in self.buffers.values()),
+                "bytes": sum(buffer.nbytes for buffer in self.buffers.values()),
+                "window_s": self.window_ms / 1000,
+                "capacity": self.capacity,
+                "samples_appended": self.samples_appended,
+                "samples_evicted": self.samples_evicted,
+            }
+
+# 一组通道的累计统计: 样本数、均值、平方偏差和(Welford的M2)、最小/最大值、高电平样本数和跳变次数，各项按通道排列
+# 两组统计可以直接合并(Chan的并行公式)，也可以从总和中扣除之前合并进去的一组，用于滑动窗口
+class StatsAccumulator:
+
+    # 初始化空的统计，width为通道数
+    def __init__(self, width):
+        self.count = 0
+        self.mean = np.zeros(width)
+        self.m2 = np.zeros(width)
+        self.minimum = np.full(width, np.inf)
+        self.maximum = np.full(width, -np.inf)
+        self.high = np.zeros(width, dtype=np.int64)
+        self.transitions = np.zeros(width, dtype=np.int64)
+
+    # 各通道高电平的阈值: 0/1通道取最大值(如热敏的1)时为高电平，模拟量通道不统计
+    @staticmethod
+    def high_thresholds(channels):
+        return np.array([channel.maximum if channel.is_binary else np.inf for channel in channels],
+                        dtype=np.float64)
+
+    # 一批数据中每个样本是否为高电平、是否与上一个样本不同，previous为这批数据之前的最后一个样本，为空时不计第一个样本
+    # 返回 (high, changed) 两个与values同形状的布尔数组
+    @staticmethod
+    def flags(values, previous, thresholds):
+        if previous is None:
+            previous = values[0]
+        return values >= thresholds, values != np.vstack((previous, values[:-1]))
+
+    # 按分组计算一批数据的统计，返回每组一个 StatsAccumulator
+    # values为 (样本数, 通道数) 的数组，high和changed为同形状的布尔数组(是否为高电平、是否与上一个样本不同)，
+    # starts为各组第一个样本的位置；每个样本只参与向量化计算，Python循环的次数只与组数有关
+    @classmethod
+    def from_groups(cls, values, high, changed, starts):
+        counts = np.diff(np.append(starts, len(values)))
+        means = np.add.reduceat(values, starts) / counts[:, None]
+        deviations = values - np.repeat(means, counts, axis=0)
+        m2 = np.add.reduceat(deviations * deviations, starts)
+        minimum = np.minimum.reduceat(values, starts)
+        maximum = np.maximum.reduceat(values, starts)
+        highs = np.add.reduceat(high, starts, dtype=np.int64)
+        transitions = np.add.reduceat(changed, starts, dtype=np.int64)
+        groups = []
+        for i, count in enumerate(counts.tolist()):
+            stats = cls.__new__(cls)
+            stats.count = count
+            stats.mean = means[i]
+            stats.m2 = m2[i]
+            stats.minimum = minimum[i]
+            stats.maximum = maximum[i]
+            stats.high = highs[i]
+            stats.transitions = transitions[i]
+            groups.append(stats)
+        return groups
+
+    # 合并另一组统计
+    def merge(self, other):
+        if not other.count:
+            return
+        total = self.count + other.count
+        delta = other.mean - self.mean
+        self.mean = self.mean + delta * (other.count / total)
+        self.m2 = self.m2 + other.m2 + delta * delta * (self.count * other.count / total)
+        self.count = total
+        self.minimum = np.minimum(self.minimum, other.minimum)
+        self.maximum = np.maximum(self.maximum, other.maximum)
+        self.high = self.high + other.high
+        self.transitions = self.transitions + other.transitions
+
+    # 扣除之前合并进来的一组统计(逆向更新)；最小/最大值无法扣除，由调用方另行维护
+    def remove(self, other):
+        if not other.count:
+            return
+        total = self.count - other.count
+        if total <= 0:
+            self.__init__(len(self.mean))
+            return
+        mean = (self.mean * self.count - other.mean * other.count) / total
+        delta = other.mean - mean
+        self.m2 = np.maximum(self.m2 - other.m2 - delta * delta * (total * other.count / self.count), 0.0)
+        self.mean = mean
+        self.count = total
+        self.high = self.high - other.high
+        self.transitions = self.transitions - other.transitions
+
+    # 统计结果: {"count", "mean", "std", "min", "max", "duty", "transitions"}，除样本数外各项为按通道排列的数组
+    # std为总体标准差，duty为高电平样本的占比；没有数据时各项为NaN
+    def result(self):
+        count = self.count
+        if not count:
+            nan = np.full(len(self.mean), np.nan)
+            return {"count": 0, "mean": nan, "std": nan, "min": nan, "max": nan, "duty": nan,
+                    "transitions": self.transitions.copy()}
+        return {
+            "count": count,
+            "mean": self.mean.copy(),
+            "std": np.sqrt(self.m2 / count),
+            "min": self.minimum.copy(),
+            "max": self.maximum.copy(),
+            "duty": self.high / count,
+            "transitions": self.transitions.copy(),
+        }
+
+# 一个滑动窗口内各通道的滚动统计，窗口按时间分成 BUCKETS 个时间桶，新数据合并进当前的桶
+# 桶移出窗口时从窗口总和中扣除，每个样本的开销为O(1)且按批向量化计算，不需要保留窗口内的原始数据；
+# 最小/最大值用每个通道一个单调队列维护，窗口边界精确到一个桶的宽度(窗口的1%)
+class RollingWindow:
+
+    BUCKETS = 100
+
+    # 初始化滑动窗口，width为通道数，window为窗口长度(s)
+    def __init__(self, width, window):
+        self.width = width
+        self.window = window
+        self.bucket_width = window / self.BUCKETS
+        self.buckets = collections.deque()  # 已结束的桶: (桶序号, StatsAccumulator)
+        self.total = StatsAccumulator(width)  # 已结束的桶的总和
+        self.current = None  # 正在累计的桶: (桶序号, StatsAccumulator)
+        self.min_queues = [collections.deque() for _ in range(width)]  # 每个通道: (桶序号, 最小值)，值递增
+        self.max_queues = [collections.deque() for _ in range(width)]  # 每个通道: (桶序号, 最大值)，值递减
+        self._removed = 0  # 自上次重新求和以来扣除的桶数
+
+    # 添加一批按时间排序的数据，timestamps为时间戳(s)数组，high和changed见 StatsAccumulator.from_groups
+    def add(self, timestamps, values, high, changed):
+        index = (timestamps // self.bucket_width).astype(np.int64)
+        starts = np.concatenate(([0], np.flatnonzero(np.diff(index)) + 1))
+        groups = StatsAccumulator.from_groups(values, high, changed, starts)
+        for bucket, stats in zip(index[starts].tolist(), groups):
+            if self.current is not None and bucket <= self.current[0]:
+                self.current[1].merge(stats)  # 迟到的样本计入当前的桶
+            else:
+                self._close()
+                self.current = (bucket, stats)
+        self.expire(float(timestamps[-1]))
+
+    # 结束当前的桶，计入窗口总和和单调队列
+    def _close(self):
+        if self.current is None:
+            return
+        bucket, stats = self.current
+        self.current = None
+        self.buckets.append((bucket, stats))
+        self.total.merge(stats)
+        for queue, value in zip(self.min_queues, stats.minimum.tolist()):
+            while queue and queue[-1][1] >= value:
+                queue.pop()
+            queue.append((bucket, value))
+        for queue, value in zip(self.max_queues, stats.maximum.tolist()):
+            while queue and queue[-1][1] <= value:
+                queue.pop()
+            queue.append((bucket, value))
+
+    # 移除窗口之外的桶，now为当前时间(s)
+    def expire(self, now):
+        first = int(now // self.bucket_width) - self.BUCKETS + 1  # 窗口内最早的桶序号
+        if self.current is not None and self.current[0] < first:
+            self._close()
+        while self.buckets and self.buckets[0][0] < first:
+            _, stats = self.buckets.popleft()
+            self.total.remove(stats)
+            self._removed += 1
+        for queue in self.min_queues + self.max_queues:
+            while queue and queue[0][0] < first:
+                queue.popleft()
+        
+        # 逆向更新有舍入误差，每扣除一个窗口的桶后由各桶重新求和，均摊到每个桶仍为O(1)
+        if self._removed >= self.BUCKETS:
+            self._removed = 0
+            self.total = StatsAccumulator(self.width)
+            for _, stats in self.buckets:
+                self.total.merge(stats)
+
+    # 窗口内的统计结果，格式见 StatsAccumulator.result
+    def result(self):
+        stats = StatsAccumulator(self.width)
+        stats.merge(self.total)
+        minimum = [queue[0][1] if queue else np.inf for queue in self.min_queues]
+        maximum = [queue[0][1] if queue else -np.inf for queue in self.max_queues]
+        if self.current is not None:
+            stats.merge(self.current[1])
+            minimum = np.minimum(minimum, self.current[1].minimum)
+            maximum = np.maximum(maximum, self.current[1].maximum)
+        result = stats.result()
+        if result["count"]:
+            result["min"] = np.asarray(minimum, dtype=np.float64)
+            result["max"] = np.asarray(maximum, dtype=np.float64)
+        return result
+
+# 每个设备各通道在多个滑动窗口(默认10秒、1分钟、10分钟)内的滚动统计: 均值、标准差、最小/最大值，
+# 0/1通道(如热敏)还有处于高电平(高温)的样本占比和跳变次数
+# 在合并线程中随每批合并后的数据增量更新，可以在任意线程中读取
+class RollingStats:
+
+    # 默认的窗口长度(s)
+    WINDOWS = (10, 60, 600)
+
+    # 初始化滚动统计，channels为通道注册表，windows为各窗口的长度(s)
+    def __init__(self, channels, windows=WINDOWS):
+        self.channels = channels
+        self.windows = tuple(windows)
+        self.thresholds = StatsAccumulator.high_thresholds(channels)
+        self.devices = {}  # 设备ID -> [RollingWindow, ...]
+        self.last_values = {}  # 设备ID -> 上一个样本的数值，用于计算跨批次的跳变
+        self.lock = threading.Lock()
+        self.update_histogram = LatencyHistogram()  # 每批更新的耗时
+
+    # 窗口长度的显示文本，如 10s、1min、10min
+    @staticmethod
+    def window_label(seconds):
+        if seconds >= 60 and seconds % 60 == 0:
+            return f"{seconds // 60:g}min"
+        return f"{seconds:g}s"
+
+    # 更新合并后的一批数据: timestamps为接收时间戳(s)数组，values为 (样本数, 通道数) 的数组，
+    # device_ids为每个样本的设备ID数组
+    def update(self, timestamps, values, device_ids):
+        if not len(timestamps):
+            return
+        start = time.perf_counter()
+        timestamps = np.asarray(timestamps, dtype=np.float64)
+        values = np.asarray(values, dtype=np.float64).reshape(-1, len(self.channels))
+        device_ids = np.asarray(device_ids)
+        with self.lock:
+            first = int(device_ids[0])
+            if (device_ids == first).all():
+                self._update(first, timestamps, values)
+            else:
+                for device_id in np.unique(device_ids).tolist():
+                    mask = device_ids == device_id
+                    self._update(device_id, timestamps[mask], values[mask])
+        self.update_histogram.record(time.perf_counter() - start, len(timestamps))
+
+    # 更新一个设备的数据
+    def _update(self, device_id, timestamps, values):
+        windows = self.devices.get(device_id)
+        if windows is None:
+            windows = self.devices[device_id] = [RollingWindow(len(self.channels), window)
+                                                 for window in self.windows]
+        high, changed = StatsAccumulator.flags(values, self.last_values.get(device_id), self.thresholds)
+        for window in windows:
+            window.add(timestamps, values, high, changed)
+        self.last_values[device_id] = values[-1].copy()
+
+    # 设备各窗口的统计结果: [(窗口长度(s), 结果), ...]，结果格式见 StatsAccumulator.result
+    # now为当前时间(s)，为空时使用当前时间，窗口按当前时间滑动，设备停止发送数据后统计逐渐清空
+    def snapshot(self, device_id, now=None):
+        now = time.time() if now is None else now
+        with self.lock:
+            windows = self.devices.get(device_id)
+            if windows is None:
+                return []
+            results = []
+            for window in windows:
+                window.expire(now)
+                results.append((window.window, window.result()))
+            return results
+
+    # 有统计数据的设备ID列表
+    def device_ids(self):
+        with self.lock:
+            return list(self.devices)
+
+    # 格式化一个通道在各窗口的统计，snapshot为 snapshot 的返回值
+    # 模拟量显示 均值±标准差 [最小值, 最大值]，0/1通道显示高电平占比和跳变次数
+    def format_channel(self, index, snapshot):
+        channel = self.channels[index]
+        parts = []
+        for window, result in snapshot:
+            label = self.window_label(window)
+            if not result["count"]:
+                parts.append(f"{label}: --")
+            elif channel.is_binary:
+                state = channel.states.get(int(channel.maximum), "高电平")
+                parts.append(f"{label}: {state} {result['duty'][index] * 100:.0f}%, "
+                             f"跳变 {result['transitions'][index]}")
+            else:
+                parts.append(f"{label}: {result['mean'][index]:.1f}±{result['std'][index]:.1f} "
+                             f"[{result['min'][index]:g}, {result['max'][index]:g}]")
+        return "  ".join(parts)
+
+    # 生成Prometheus文本格式的指标，device_names为 {设备ID: 名称}
+    def prometheus_lines(self, device_names=None):
+        device_names = device_names or {}
+        metrics = (
+            ("sensor_channel_mean", "mean", "Rolling mean of each channel."),
+            ("sensor_channel_stddev", "std", "Rolling standard deviation of each channel."),
+            ("sensor_channel_min", "min", "Rolling minimum of each channel."),
+            ("sensor_channel_max", "max", "Rolling maximum of each channel."),
+            ("sensor_channel_duty_cycle", "duty", "Fraction of samples in the high state (binary channels)."),
+            ("sensor_channel_transitions", "transitions", "State transitions in the window (binary channels)."),
+        )
+        snapshots = [(device_id, self.snapshot(device_id)) for device_id in self.device_ids()]
+        lines = []
+        for metric, key, help_text in metrics:
+            lines += [f"# HELP {metric} {help_text}", f"# TYPE {metric} gauge"]
+            binary_only = key in ("duty", "transitions")
+            for device_id, snapshot in snapshots:
+                device = device_names.get(device_id, str(device_id))
+                for window, result in snapshot:
+                    if not result["count"]:
+                        continue
+                    for i, channel in enumerate(self.channels):
+                        if binary_only and not channel.is_binary:
+                            continue
+                        lines.append(f'{metric}{{device="{device}",channel="{channel.name}",'
+                                     f'window="{self.window_label(window)}"}} {float(result[key][i]):.9g}')
+        return lines
+
+# 单个通道的写入时压缩，逐个时刻输入该时刻的取值范围 [lo, hi]，输出需要保存的点 [(毫秒时间戳, 数值), ...]
+# 查询时在相邻的两个保存点之间线性插值还原，每个时刻的还原值都在该时刻的取值范围内
+# deadband(死区): 保存每段保持值的首尾两点，段内还原为水平线，允许误差为0时即为游程编码
+# swinging_door(旋转门): 保存折线的转折点，段内还原为两点间的直线
+# 转折点取在所有样本都满足误差要求的斜率范围内，而不是原样本值，因此误差有保证
+class ChannelCompressor:
+
+    # 初始化通道压缩器，method为"deadband"或"swinging_door"，max_interval_ms为两个保存点的最大间隔
+    def __init__(self, method, max_interval_ms):
+        self.method = method
+        self.max_interval_ms = max_interval_ms
+        self.anchor_ts = None  # 最近保存点的时间戳，为空表示新的一段还没有开始
+        self.anchor_value = 0.0
+        self.prev_ts = None  # 上一个时刻
+        self.prev_center = 0.0  # 上一个时刻取值范围的中点
+        self.low = -math.inf  # 旋转门: 从保存点出发、满足所有样本的斜率范围
+        self.high = math.inf
+
+    # 输入一个时刻，返回这个时刻之前已经确定的保存点，以及新的一段开始时该时刻本身的点
+    def feed(self, ts, lo, hi):
+        points = []
+        if self.prev_ts is not None and ts - self.prev_ts > self.max_interval_ms:
+            points = self.finish()  # 数据中断，两端都保存
+        if self.prev_ts is None:
+            self.anchor_ts = self.prev_ts = ts
+            self.anchor_value = self.prev_center = (lo + hi) / 2
+            self.low, self.high = -math.inf, math.inf
+            points.append((ts, self.anchor_value))
+            return points
+        
+        if self.method == "deadband":
+            if not lo <= self.anchor_value <= hi:
+                # 超出死区: 保存上一段的结束点和新一段的起点
+                if self.prev_ts != self.anchor_ts:
+                    points.append((self.prev_ts, self.anchor_value))
+                self.anchor_ts = ts
+                self.anchor_value = (lo + hi) / 2
+                points.append((ts, self.anchor_value))
+            elif ts - self.anchor_ts > self.max_interval_ms:
+                points.append((self.prev_ts, self.anchor_value))
+                self.anchor_ts = self.prev_ts
+        else:
+            elapsed = ts - self.anchor_ts
+            low = max(self.low, (lo - self.anchor_value) / elapsed)
+            high = min(self.high, (hi - self.anchor_value) / elapsed)
+            if low > high or elapsed > self.max_interval_ms:
+                # 门已关闭: 在上一个时刻保存转折点，从转折点重新开门
+                points.append(self._close())
+                elapsed = ts - self.anchor_ts
+                low = (lo - self.anchor_value) / elapsed
+                high = (hi - self.anchor_value) / elapsed
+            self.low, self.high = low, high
+        self.prev_ts = ts
+        self.prev_center = (lo + hi) / 2
+        return points
+
+    # 旋转门在上一个时刻保存转折点: 斜率取满足范围内最接近上一个时刻中点的值，转折点成为新的保存点
+    def _close(self):
+        elapsed = self.prev_ts - self.anchor_ts
+        slope = min(max((self.prev_center - self.anchor_value) / elapsed, self.low), self.high)
+        self.anchor_value += slope * elapsed
+        self.anchor_ts = self.prev_ts
+        return self.anchor_ts, self.anchor_value
+
+    # 结束当前段，返回最后一个时刻的保存点(如果需要)
+    def finish(self):
+        points = []
+        if self.prev_ts is not None and self.prev_ts != self.anchor_ts:
+            if self.method == "deadband":
+                points.append((self.prev_ts, self.anchor_value))
+            else:
+                points.append(self._close())
+        self.anchor_ts = self.prev_ts = None
+        return points
+
+# 写入时压缩原始数据，各设备各通道分别压缩，只有保存点写入原始数据表，每个时刻一行，没有保存点的通道为NULL
+# 同一毫秒时间戳的样本视为同一时刻，每批最新一毫秒的样本留到下一批再处理，同一时刻不会分在两批中；
+# 同一时刻所有样本都在允许误差内(0/1通道取值相同)时按一个时刻压缩，否则该时刻的样本逐个原样保存为完整的行，
+# 各通道在此结束当前段、从该时刻最后一个样本重新开始，不丢失同一毫秒内的状态变化和尖峰；
+# 早于已处理时刻的迟到样本同样原样保存
+# 同一通道相邻两个保存点最多相隔 MAX_INTERVAL_MS，查询时在该范围内查找相邻的保存点即可还原
+class PointCompressor:
+
+    MAX_INTERVAL_MS = 60 * 1000
+
+    # 初始化压缩器，max_error不为空时代替所有模拟量通道配置的允许误差
+    def __init__(self, channels, max_error=None):
+        self.channels = channels
+        self.binary = np.array([channel.is_binary for channel in channels])
+        self.errors = np.array([0.0 if channel.is_binary else
+                                channel.max_error if max_error is None else max_error for channel in channels])
+        self.methods = ["deadband" if channel.is_binary else channel.compression for channel in channels]
+        self.devices = {}  # 设备ID -> [ChannelCompressor, ...]
+        self.last_ts = {}  # 设备ID -> 已处理的最新时刻
+        self.pending = {}  # 设备ID -> 最新时刻的行，其他通道还可能在该时刻保存点，下一批再写入
+        self.held = {}  # 设备ID -> (时间戳数组, 数值数组)，最新一毫秒的样本，下一批再处理
+        self.samples_in = 0
+        self.rows_out = 0
+        self.late_samples = 0
+
+    # 各通道压缩设置的说明
+    def describe(self):
+        return ", ".join(
+            f"{channel.name} 游程编码" if channel.is_binary else
+            f"{channel.name} {'旋转门' if method == 'swinging_door' else '死区'} 允许误差 {error:g}"
+            for channel, method, error in zip(self.channels, self.methods, self.errors.tolist()))
+
+    # 压缩一批样本，返回可以写入的行: [(设备ID, 毫秒时间戳, 通道1数值或None, ...), ...]
+    def compress(self, ts_ms, values, device_ids):
+        self.samples_in += len(ts_ms)
+        order = np.lexsort((ts_ms, device_ids))
+        ts_ms, values, device_ids = ts_ms[order], values[order], device_ids[order]
+        rows = []
+        starts = np.flatnonzero(np.r_[True, device_ids[1:] != device_ids[:-1]])
+        for start, end in zip(starts.tolist(), np.r_[starts[1:], len(ts_ms)].tolist()):
+            device_id = int(device_ids[start])
+            rows += self._compress_device(device_id, ts_ms[start:end], values[start:end])
+        self.rows_out += len(rows)
+        return rows
+
+    # 压缩一个设备的样本，ts_ms已排序，hold为真时最新一毫秒的样本留到下一批
+    def _compress_device(self, device_id, ts_ms, values, hold=True):
+        held = self.held.pop(device_id, None)
+        if held is not None:
+            ts_ms = np.concatenate((held[0], ts_ms))
+            values = np.concatenate((held[1], values))
+            order = np.argsort(ts_ms, kind="stable")
+            ts_ms, values = ts_ms[order], values[order]
+        raw = []  # 原样保存的行
+        last = self.last_ts.get(device_id)
+        if last is not None:
+            late = ts_ms <= last
+            if late.any():
+                self.late_samples += int(np.count_nonzero(late))
+                raw += self._raw_rows(device_id, ts_ms[late], values[late])
+                ts_ms, values = ts_ms[~late], values[~late]
+        if hold and len(ts_ms):
+            cut = int(np.searchsorted(ts_ms, ts_ms[-1]))
+            self.held[device_id] = (ts_ms[cut:], values[cut:])
+            ts_ms, values = ts_ms[:cut], values[:cut]
+        if not len(ts_ms):
+            return raw
+        
+        # 每个时刻各通道的取值范围，波动超过两倍允许误差(0/1通道取值不同)的时刻原样保存
+        starts = np.flatnonzero(np.r_[True, ts_ms[1:] != ts_ms[:-1]])
+        ends = np.r_[starts[1:], len(ts_ms)]
+        highest = np.maximum.reduceat(values, starts)
+        lowest = np.minimum.reduceat(values, starts)
+        lows = highest - self.errors
+        highs = lowest + self.errors
+        mixed = (lows > highs).any(axis=1).tolist()
+        
+        compressors = self.devices.get(device_id)
+        if compressors is None:
+            compressors = [ChannelCompressor(method, self.MAX_INTERVAL_MS) for method in self.methods]
+            self.devices[device_id] = compressors
+        points = self.pending.pop(device_id, {})
+        times = ts_ms[starts].tolist()
+        for k, ts in enumerate(times):
+            if mixed[k]:
+                start, end = int(starts[k]), int(ends[k])
+                last_values = values[end - 1].tolist()
+                for i, compressor in enumerate(compressors):
+                    for point_ts, value in compressor.finish():
+                        points.setdefault(point_ts, [None] * len(compressors))[i] = value
+                    compressor.feed(ts, last_values[i], last_values[i])  # 新一段的起点即最后一个原样保存的样本
+                raw += self._raw_rows(device_id, ts_ms[start:end], values[start:end])
+                continue
+            for i, compressor in enumerate(compressors):
+                for point_ts, value in compressor.feed(ts, float(lows[k, i]), float(highs[k, i])):
+                    points.setdefault(point_ts, [None] * len(compressors))[i] = value
+        
+        latest = times[-1]
+        self.last_ts[device_id] = latest
+        if latest in points:
+            self.pending[device_id] = {latest: points.pop(latest)}
+        rows = [(device_id, ts) + tuple(row) for ts, row in points.items()] + raw
+        rows.sort(key=lambda row: row[1])  # 稳定排序，同一毫秒原样保存的行保持样本顺序
+        return rows
+
+    # 原样保存的行，每个样本一行
+    @staticmethod
+    def _raw_rows(device_id, ts_ms, values):
+        return [(device_id, ts) + tuple(row) for ts, row in zip(ts_ms.tolist(), values.tolist())]
+
+    # 结束所有设备的当前段，返回剩余的行，停止写入前调用
+    def flush(self):
+        rows = []
+        empty = np.empty((0, len(self.channels)), dtype=np.float64)
+        for device_id in list(self.held):
+            rows += self._compress_device(device_id, np.empty(0, dtype=np.int64), empty, hold=False)
+        for device_id, compressors in self.devices.items():
+            points = self.pending.pop(device_id, {})
+            for i, compressor in enumerate(compressors):
+                for point_ts, value in compressor.finish():
+                    points.setdefault(point_ts, [None] * len(compressors))[i] = value
+            rows += [(device_id, ts) + tuple(row) for ts, row in sorted(points.items())]
+        self.last_ts.clear()
+        self.rows_out += len(rows)
+        return rows
+
+# 后台批量写入线程，缓冲样本并按数量或时间阈值批量提交，避免在GUI线程中逐条提交
+class DatabaseWriter(threading.Thread):
+
+    # 停止标记，放入队列后写入线程会提交剩余数据并退出
+    _STOP = object()
+
+    # 初始化写入线程
+    # channels: 通道注册表，决定原始数据表和汇总表的列
+    # rollup_levels: [(汇总表名, 时间桶宽度(ms)), ...]，按桶宽从小到大排列
+    # queue_policy / queue_capacity: 待写入队列的策略和容量(样本数)，默认队列满时阻塞放入方
+    # compressor: PointCompressor，指定时原始数据表只写入压缩后的保存点，汇总表仍由全部样本计算
+    def __init__(self, db_name, channels, batch_size=500, flush_interval=0.5, rollup_levels=(),
+                 queue_policy="block", queue_capacity=200000, compressor=None):
+        super().__init__(name="DatabaseWriter", daemon=True)
+        self.db_name = db_name
+        self.channels = channels
+        self.rollup_levels = list(rollup_levels)
+        self.compressor = compressor
+        self.batch_size = batch_size  # 每批最多提交的样本数
+        self.flush_interval = flush_interval  # 缓冲数据的最长等待时间(s)
+        self.queue = BoundedQueue(queue_policy, queue_capacity, "storage")
+        
+        # 插入语句只依赖通道配置，预先生成
+        columns = self.channels.columns
+        self.insert_sql = (f"INSERT INTO sensor_data (device_id, ts_ms, {', '.join(columns)}) "
+                           f"VALUES ({', '.join('?' * (len(columns) + 2))})")
+        rollup_columns = ["sample_count"]
+        updates = ["sample_count = sample_count + excluded.sample_count"]
+        for name in self.channels.names:
+            rollup_columns += [f"{name}_min", f"{name}_max", f"{name}_sum"]
+            # 新增通道的列在已有的桶中为NULL，用COALESCE避免MIN/MAX/加法的结果变成NULL
+            updates += [f"{name}_min = MIN(COALESCE({name}_min, excluded.{name}_min), excluded.{name}_min)",
+                        f"{name}_max = MAX(COALESCE({name}_max, excluded.{name}_max), excluded.{name}_max)",
+                        f"{name}_sum = COALESCE({name}_sum, 0) + excluded.{name}_sum"]
+        self.rollup_sql = (f"INSERT INTO {{table}} (device_id, ts_ms, {', '.join(rollup_columns)}) "
+                           f"VALUES ({', '.join('?' * (len(rollup_columns) + 2))}) "
+                           f"ON CONFLICT (device_id, ts_ms) DO UPDATE SET {', '.join(updates)}")
+        
+        # 统计计数
+        self.rows_written = 0  # 写入的样本数
+        self.rows_stored = 0  # 原始数据表中写入的行数，压缩存储时少于样本数
+        self.flush_count = 0
+        self.error_count = 0
+        self.last_flush_latency = 0.0  # 最近一次提交耗时(s)
+        self.max_flush_latency = 0.0
+        self.total_flush_latency = 0.0
+        
+        # 每次提交成功后在写入线程中调用 commit_callback(接收时间戳数组(s), 提交完成时间(s))，用于测量端到端延迟
+        self.commit_callback = None
+        self.flush_histogram = LatencyHistogram()  # 每次提交的耗时
+        self.latency_histogram = LatencyHistogram()  # 每个样本从接收到提交的延迟
+
+    # 添加一批样本: timestamps为接收时间戳(s)数组，values为 (样本数, 通道数) 的数组，
+    # device_ids为每个样本的设备ID数组；队列满时按队列策略处理，默认等待写入线程取走数据
+    def put(self, timestamps, values, device_ids):
+        return self.queue.put((timestamps, values, device_ids))
+
+    # 写入线程主循环
+    def run(self):
+        try:
+            conn = sqlite3.connect(self.db_name)
+            conn.execute("PRAGMA synchronous = NORMAL")  # WAL模式下每次提交无需fsync
+        except sqlite3.Error as e:
+            db_log.error("写入线程数据库连接错误: %s", e)
+            return
+        
+        buffer = []  # 缓冲的批次: [(时间戳数组, 数值数组, 设备ID数组), ...]
+        buffered = 0  # 缓冲的样本数
+        deadline = None
+        running = True
+        while running:
+            # 缓冲为空时一直等待；否则最多等到提交期限
+            timeout = None if deadline is None else max(0.0, deadline - time.monotonic())
+            try:
+                item = self.queue.get(timeout=timeout)
+                # 一次取出队列中已有的全部样本，直到凑满一批
+                while True:
+                    if item is self._STOP:
+                        running = False
+                        break
+                    buffer.append(item)
+                    buffered += len(item[0])
+                    if deadline is None:
+                        deadline = time.monotonic() + self.flush_interval
+                    if buffered >= self.batch_size:
+                        break
+                    item = self.queue.get_nowait()
+            except queue.Empty:
+                pass
+            
+            if buffer and (not running or buffered >= self.batch_size
+                           or time.monotonic() >= deadline):
+                self._flush(conn, buffer)
+                buffer = []
+                buffered = 0
+                deadline = None
+        
+        # 压缩存储时写入各通道最后一段的结束点
+        if self.compressor is not None:
+            rows = self.compressor.flush()
+            try:
+                with conn:
+                    conn.executemany(self.insert_sql, rows)
+                self.rows_stored += len(rows)
+            except sqlite3.Error as e:
+                self.error_count += 1
+                db_log.error("写入压缩数据的结束点错误: %s", e)
+        conn.close()
+
+    # 在一个事务中批量提交缓冲的样本
+    def _flush(self, conn, buffer):
+        start = time.perf_counter()
+        timestamps = np.concatenate([timestamps for timestamps, _, _ in buffer])
+        ts_ms = (timestamps * 1000).astype(np.int64)
+        values = np.concatenate([values for _, values, _ in buffer])
+        device_ids = np.concatenate([device_ids for _, _, device_ids in buffer]).astype(np.int64)
+        if self.compressor is None:
+            # 按列转换为Python对象后再组合成行，每个样本只有一次元组构造，与通道数无关
+            rows = list(zip(device_ids.tolist(), ts_ms.tolist(), *values.T.tolist()))
+        else:
+            rows = self.compressor.compress(ts_ms, values, device_ids)
+        try:
+            with conn:
+                conn.executemany(self.insert_sql, rows)
+                self._update_rollups(conn, ts_ms, values, device_ids)
+        except sqlite3.Error as e:
+            self.error_count += 1
+            db_log.error("批量写入数据错误: %s, 丢弃 %d 条数据", e, len(timestamps))
+            return
+        
+        latency = time.perf_counter() - start
+        self.rows_written += len(timestamps)
+        self.rows_stored += len(rows)
+        self.flush_count += 1
+        self.last_flush_latency = latency
+        self.total_flush_latency += latency
+        if latency > self.max_flush_latency:
+            self.max_flush_latency = latency
+        committed = time.time()
+        self.flush_histogram.record(latency, len(timestamps))
+        self.latency_histogram.record_many(committed - timestamps)
+        if self.commit_callback is not None:
+            self.commit_callback(timestamps, committed)
+
+    # 在同一事务中增量更新各级汇总表，每个设备分别汇总
+    # 先由原始数据汇总出最细一级，再由上一级的桶合并出下一级，每级都按列整体计算
+    def _update_rollups(self, conn, ts_ms, values, device_ids):
+        if not self.rollup_levels:
+            return
+        order = np.lexsort((ts_ms, device_ids))  # 按设备、时间排序
+        devices = device_ids[order]
+        keys = ts_ms[order]
+        counts = np.ones(len(keys), dtype=np.int64)
+        mins = maxs = sums = values[order]
+        for table, bucket_ms in self.rollup_levels:
+            keys = keys - keys % bucket_ms
+            changed = (np.diff(keys) != 0) | (np.diff(devices) != 0)
+            starts = np.concatenate(([0], np.flatnonzero(changed) + 1))
+            keys = keys[starts]
+            devices = devices[starts]
+            counts = np.add.reduceat(counts, starts)
+            mins = np.minimum.reduceat(mins, starts, axis=0)
+            maxs = np.maximum.reduceat(maxs, starts, axis=0)
+            sums = np.add.reduceat(sums, starts, axis=0)
+            
+            # 每个通道依次为最小值、最大值、总和
+            aggregates = np.stack((mins, maxs, sums), axis=2).reshape(len(keys), -1)
+            conn.executemany(self.rollup_sql.format(table=table),
+                             list(zip(devices.tolist(), keys.tolist(), counts.tolist(),
+                                      *aggregates.T.tolist())))
+
+    # 停止写入线程，最多等待timeout秒提交剩余数据
+    def stop(self, timeout=3.0):
+        self.queue.put(self._STOP)
+        self.join(timeout)
+        if self.is_alive():
+            db_log.error("写入线程未能在 %s 秒内完成提交，剩余 %d 批数据未写入", timeout, self.queue.qsize())
+            return False
+        return True
+
+    # 获取写入统计信息
+    def get_stats(self):
+        return {
+            "queue_depth": self.queue.qsize(),  # 队列中等待写入的批次数
+            "max_queue_depth": self.queue.max_batches,
+            "rows_written": self.rows_written,
+            "rows_stored": self.rows_stored,
+            "flush_count": self.flush_count,
+            "error_count": self.error_count,
+            "last_flush_latency_ms": self.last_flush_latency * 1000,
+            "max_flush_latency_ms": self.max_flush_latency * 1000,
+            "avg_flush_latency_ms": (self.total_flush_latency / self.flush_count * 1000
+                                     if self.flush_count else 0.0),
+        }
+
+# 归档段文件，按列保存一个设备一天(UTC)内的一段原始数据，可以用 numpy.memmap 直接映射读取
+# 文件头(HEADER_SIZE字节)为16个int64字段和各通道名称的JSON，之后依次是容量为capacity的int64毫秒时间戳列
+# 和各通道的float64数值列(NULL为NaN)，每列在创建时预先分配；追加时先写入各列的末尾，再更新文件头中的行数，
+# 读取方只使用文件头中的行数，追加过程中可以同时读取，已写入的数据不再修改
+# 文件头同时记录最近一次追加的行数和这些行的CRC32，打开时校验，断电时只写入了文件头的追加被忽略
+class ArchiveSegment:
+
+    MAGIC = 0x3147455343524153  # "SARCSEG1"
+    HEADER_SIZE = 4096
+    NAMES_OFFSET = 16 * 8  # 通道名称JSON的位置
+
+    # 文件头中各字段的位置，行数、第一个和最后一个时间戳、最近一次追加的行数和校验值相邻，追加后一次写入
+    (_MAGIC, _CAPACITY, _WIDTH, _DAY_MS, _NAMES_LEN,
+     _COUNT, _FIRST_MS, _LAST_MS, _TAIL_COUNT, _TAIL_CRC) = range(10)
+
+    _torn_reported = set()  # 已报告过最近一次追加不完整的段文件，每个文件只报告一次
+
+    # 打开已有的段文件，读取文件头，不是本格式时抛出ValueError
+    def __init__(self, path):
+        self.path = path
+        with open(path, "rb") as f:
+            head = f.read(self.HEADER_SIZE)
+        header = np.frombuffer(head[:self.NAMES_OFFSET], dtype=np.int64) if len(head) == self.HEADER_SIZE else None
+        if header is None or header[self._MAGIC] != self.MAGIC:
+            raise ValueError(f"{path} 不是归档段文件")
+        self.capacity = int(header[self._CAPACITY])
+        self.width = int(header[self._WIDTH])
+        self.count = int(header[self._COUNT])
+        self.first_ms = int(header[self._FIRST_MS])
+        self.last_ms = int(header[self._LAST_MS])
+        self.day_ms = int(header[self._DAY_MS])  # 所在日期(UTC)0点的毫秒时间戳
+        end = self.NAMES_OFFSET + int(header[self._NAMES_LEN])
+        self.names = json.loads(head[self.NAMES_OFFSET:end].decode("utf-8"))
+        
+        # 每次追加只同步一次磁盘，断电时文件头可能先于数据写入: 最近一次追加的数据与校验值不符时退回到追加之前，
+        # 之前的追加已经完整写入磁盘，这些行在数据库中也还没有删除，会重新归档
+        tail_count = int(header[self._TAIL_COUNT])
+        if tail_count:
+            with open(path, "rb") as f:
+                if self._crc(f, self.count - tail_count, self.count) != int(header[self._TAIL_CRC]):
+                    if path not in self._torn_reported:
+                        self._torn_reported.add(path)
+                        db_log.warning("归档段 %s 最近追加的 %d 行不完整，已忽略", path, tail_count)
+                    self._rollback(f, self.count - tail_count)
+
+    # 创建空的段文件，names为各列的通道名称，capacity为容量(行数)
+    @classmethod
+    def create(cls, path, names, capacity, day_ms):
+        names_json = json.dumps(names).encode("utf-8")
+        if cls.NAMES_OFFSET + len(names_json) > cls.HEADER_SIZE:
+            raise ValueError("通道名称过长，无法写入归档段的文件头")
+        header = np.zeros(16, dtype=np.int64)
+        header[cls._CAPACITY] = capacity
+        header[cls._WIDTH] = len(names)
+        header[cls._FIRST_MS] = header[cls._LAST_MS] = -1
+        header[cls._DAY_MS] = day_ms
+        header[cls._NAMES_LEN] = len(names_json)
+        header[cls._MAGIC] = cls.MAGIC
+        with open(path, "xb") as f:
+            f.write(header.tobytes() + names_json)
+            # 预先分配各列，多数文件系统上未写入的部分不占用磁盘空间
+            f.truncate(cls.HEADER_SIZE + capacity * 8 * (len(names) + 1))
+        return cls(path)
+
+    # 剩余容量(行数)
+    @property
+    def free(self):
+        return self.capacity - self.count
+
+    # 第start到end行各列数据(依次为时间戳列和各数值列)的CRC32
+    def _crc(self, f, start, end):
+        crc = 0
+        for column in range(self.width + 1):
+            f.seek(self.HEADER_SIZE + (column * self.capacity + start) * 8)
+            crc = binascii.crc32(f.read((end - start) * 8), crc)
+        return crc
+
+    # 退回到只有前count行的状态(只修改内存中的行数，下一次追加时覆盖之后的行并改写文件头)
+    def _rollback(self, f, count):
+        self.count = count
+        if count:
+            f.seek(self.HEADER_SIZE + (count - 1) * 8)
+            self.last_ms = int(np.frombuffer(f.read(8), dtype=np.int64)[0])
+        else:
+            self.first_ms = self.last_ms = -1
+
+    # 追加数据到各列末尾，ts_ms为已排序的毫秒时间戳，values为 (行数, 通道数) 的数组，行数不能超过剩余容量
+    # 先写入数据再更新文件头中的行数，最后同步一次磁盘；返回后数据已完整写入磁盘
+    def append(self, ts_ms, values):
+        count = len(ts_ms)
+        with open(self.path, "r+b") as f:
+            crc = 0
+            columns = [np.ascontiguousarray(ts_ms, dtype=np.int64)] + [
+                np.ascontiguousarray(values[:, i], dtype=np.float64) for i in range(self.width)]
+            for column, array in enumerate(columns):
+                data = array.tobytes()
+                f.seek(self.HEADER_SIZE + (column * self.capacity + self.count) * 8)
+                f.write(data)
+                crc = binascii.crc32(data, crc)
+            if self.count == 0:
+                self.first_ms = int(ts_ms[0])
+            self.count += count
+            self.last_ms = int(ts_ms[-1])
+            f.seek(self._COUNT * 8)
+            f.write(np.array([self.count, self.first_ms, self.last_ms, count, crc], dtype=np.int64).tobytes())
+            f.flush()
+            os.fsync(f.fileno())
+
+    # 映射为只读数组: (毫秒时间戳数组, (行数, 通道数) 的数值数组)，都是文件的视图，只有访问到的页才会读取
+    def arrays(self):
+        if self.count == 0:
+            return np.empty(0, dtype=np.int64), np.empty((0, self.width), dtype=np.float64)
+        data = np.memmap(self.path, dtype=np.float64, mode="r", offset=self.HEADER_SIZE,
+                         shape=(self.width + 1, self.capacity))
+        return data[0, :self.count].view(np.int64), data[1:, :self.count].T
+
+# 过期原始数据的列式归档，数据保留线程把 sensor_data 中过期的行移入归档，数据库不再随保存时长增长
+# 每个设备一个子目录，每天(UTC)一个或多个段文件 <设备ID>/<YYYYMMDD>-<序号>.seg (见 ArchiveSegment)，
+# 段内按时间排序，当天的数据超过段的容量时开始新的一段，容量依次加倍
+# 查询时按文件名中的日期选出相关的段，在映射的时间戳列上二分查找，只读取范围内的页
+class ColumnArchive:
+
+    FIRST_CAPACITY = 1 << 16  # 每天第一段的容量(行数)
+    MAX_CAPACITY = 1 << 22  # 段的最大容量(行数)
+    DAY_MS = 24 * 60 * 60 * 1000
+    REFRESH_INTERVAL = 1.0  # 归档由其他进程写入时，重新读取已归档范围的最短间隔(s)
+
+    # 初始化归档，path为归档目录(不存在时创建)，channels为通道注册表，retention_days为保留天数，None表示永久保留
+    def __init__(self, path, channels, retention_days=None):
+        self.path = path
+        self.channels = channels
+        self.retention_days = retention_days
+        os.makedirs(path, exist_ok=True)
+        self._segments = {}  # 设备ID -> 正在追加的段，只在数据保留线程中使用
+        self._invalid = set()  # 已报告过的无法读取的段文件
+        
+        # 缓存的已归档范围终点，本进程写入归档时在追加和删除后直接更新，否则每隔 REFRESH_INTERVAL 从段文件重新读取
+        self._covered_lock = threading.Lock()
+        self._covered_until = None
+        self._covered_time = None  # 上次从段文件读取的时间(monotonic)，None表示还没有读取
+        self._writer = False  # 本进程是否写入归档
+        
+        # 统计计数
+        self.rows_archived = 0
+        self.segments_created = 0
+        self.segments_removed = 0
+
+    # 归档中的设备ID
+    def device_ids(self):
+        return sorted(int(name) for name in os.listdir(self.path) if name.isdigit())
+
+    # 段文件名中日期(UTC)0点的毫秒时间戳
+    @staticmethod
+    def day_of(name):
+        day = datetime.strptime(name[:8], "%Y%m%d").replace(tzinfo=timezone.utc)
+        return int(day.timestamp()) * 1000
+
+    # 设备在 [start_ms, end_ms) 范围内可能有数据的段文件路径，按时间排序，范围的两端为None时不限制
+    def segment_paths(self, device_id, start_ms=None, end_ms=None):
+        directory = os.path.join(self.path, str(device_id))
+        try:
+            names = sorted(name for name in os.listdir(directory) if name.endswith(".seg"))
+        except FileNotFoundError:
+            return []
+        paths = []
+        for name in names:
+            day_ms = self.day_of(name)
+            if (start_ms is None or day_ms + self.DAY_MS > start_ms) and (end_ms is None or day_ms < end_ms):
+                paths.append(os.path.join(directory, name))
+        return paths
+
+    # 打开段文件，无法读取的文件记录一次错误后跳过
+    def _open(self, path):
+        try:
+            return ArchiveSegment(path)
+        except (OSError, ValueError) as e:
+            if path not in self._invalid:
+                self._invalid.add(path)
+                db_log.error("无法读取归档段 %s: %s", path, e)
+            return None
+
+    # 追加一批数据(在数据保留线程中调用)，ts_ms为已排序的毫秒时间戳，values为 (行数, 通道数) 的数组，
+    # device_ids为每行的设备ID；不晚于该设备已归档的最新时间戳的行跳过，重复追加同一批数据不会产生重复的行
+    def append(self, ts_ms, values, device_ids):
+        self._writer = True
+        self.covered_until()  # 第一次追加前从段文件读取已归档范围，之后随追加更新
+        for device_id in np.unique(device_ids).tolist():
+            rows = device_ids == device_id
+            self._append_device(device_id, ts_ms[rows], values[rows])
+            segment = self._segments.get(device_id)
+            if segment is not None and segment.count:
+                with self._covered_lock:
+                    if self._covered_until is None or segment.last_ms + 1 > self._covered_until:
+                        self._covered_until = segment.last_ms + 1
+
+    # 追加一个设备的数据，按日期分段
+    def _append_device(self, device_id, ts_ms, values):
+        segment = self._segments.get(device_id)
+        if segment is None:
+            for path in reversed(self.segment_paths(device_id)):
+                segment = self._open(path)
+                if segment is not None:
+                    break
+        if segment is not None and segment.count:
+            keep = ts_ms > segment.last_ms
+            ts_ms, values = ts_ms[keep], values[keep]
+        
+        days = ts_ms // self.DAY_MS * self.DAY_MS
+        while len(ts_ms):
+            day_ms = int(days[0])
+            if (segment is None or segment.day_ms != day_ms or not segment.free
+                    or segment.names != self.channels.names):
+                segment = self._create_segment(device_id, day_ms, segment)
+            count = min(segment.free, int(np.searchsorted(days, day_ms, side="right")))
+            segment.append(ts_ms[:count], values[:count])
+            ts_ms, values, days = ts_ms[count:], values[count:], days[count:]
+            self.rows_archived += count
+        if segment is not None:
+            self._segments[device_id] = segment
+
+    # 创建设备在某一天的下一个段，同一天的段容量依次加倍
+    def _create_segment(self, device_id, day_ms, previous):
+        capacity = self.FIRST_CAPACITY
+        if previous is not None and previous.day_ms == day_ms:
+            capacity = min(previous.capacity * 2, self.MAX_CAPACITY)
+        directory = os.path.join(self.path, str(device_id))
+        os.makedirs(directory, exist_ok=True)
+        day = datetime.fromtimestamp(day_ms / 1000, timezone.utc).strftime("%Y%m%d")
+        sequence = sum(1 for name in os.listdir(directory) if name.startswith(day))
+        self.segments_created += 1
+        return ArchiveSegment.create(os.path.join(directory, f"{day}-{sequence:03d}.seg"),
+                                     self.channels.names, capacity, day_ms)
+
+    # 已归档范围的终点: 所有设备已归档的最新时间戳 + 1，没有归档数据时返回None
+    # 数据保留线程按时间顺序归档所有设备，早于该时间的数据都在归档中，数据库中只需查询不早于该时间的部分
+    # 每次查询都会调用，返回缓存的值，不读取段文件
+    def covered_until(self):
+        with self._covered_lock:
+            now = time.monotonic()
+            if self._covered_time is None or (not self._writer and
+                                              now - self._covered_time >= self.REFRESH_INTERVAL):
+                self._covered_until = self._read_covered_until()
+                self._covered_time = now
+            return self._covered_until
+
+    # 从各设备最新的段文件中读取已归档范围的终点
+    def _read_covered_until(self):
+        latest = None
+        for device_id in self.device_ids():
+            for path in reversed(self.segment_paths(device_id)):
+                segment = self._open(path)
+                if segment is not None and segment.count:
+                    latest = segment.last_ms if latest is None else max(latest, segment.last_ms)
+                    break
+        return None if latest is None else latest + 1
+
+    # 逐段映射某个设备 [start_ms, end_ms) 范围内的数据，返回 (毫秒时间戳数组, (行数, 通道数) 的数值数组) 的迭代器
+    # 数值按当前的通道配置排列；通道配置相同的段返回的是文件的只读视图，不复制数据，适合对很长的时间范围做分析
+    def scan(self, start_ms, end_ms, device_id):
+        for path in self.segment_paths(device_id, start_ms, end_ms):
+            segment = self._open(path)
+            if segment is None or not segment.count or segment.last_ms < start_ms or segment.first_ms >= end_ms:
+                continue
+            ts_ms, values = segment.arrays()
+            lo, hi = np.searchsorted(ts_ms, [start_ms, end_ms]).tolist()
+            if lo < hi:
+                yield ts_ms[lo:hi], self._map_columns(segment.names, values[lo:hi])
+
+    # 把段中的数值列按当前的通道配置排列，段中没有的通道为NaN
+    def _map_columns(self, names, values):
+        if names == self.channels.names:
+            return values
+        result = np.full((len(values), len(self.channels)), np.nan)
+        for i, name in enumerate(self.channels.names):
+            if name in names:
+                result[:, i] = values[:, names.index(name)]
+        return result
+
+    # 查询 [start_ms, end_ms) 范围内的数据，device_id为空时查询所有设备
+    # 返回 (毫秒时间戳数组, (行数, 通道数) 的数值数组, 设备ID数组)，按时间排序，是归档数据的副本
+    def query(self, start_ms, end_ms, device_id=None):
+        parts = []
+        for device in (self.device_ids() if device_id is None else [device_id]):
+            for ts_ms, values in self.scan(start_ms, end_ms, device):
+                parts.append((ts_ms, values, np.full(len(ts_ms), device, dtype=np.int64)))
+        if not parts:
+            return (np.empty(0, dtype=np.int64), np.empty((0, len(self.channels)), dtype=np.float64),
+                    np.empty(0, dtype=np.int64))
+        ts_ms = np.concatenate([part[0] for part in parts])
+        values = np.concatenate([part[1] for part in parts])
+        device_ids = np.concatenate([part[2] for part in parts])
+        if device_id is None and len(parts) > 1:
+            order = np.argsort(ts_ms, kind="stable")
+            ts_ms, values, device_ids = ts_ms[order], values[order], device_ids[order]
+        return ts_ms, values, device_ids
+
+    # 不早于start_ms的第一个归档时间戳，device_id为空时在所有设备中查找，没有时返回None
+    def next_timestamp(self, start_ms, device_id=None):
+        found = None
+        for device in (self.device_ids() if device_id is None else [device_id]):
+            for path in self.segment_paths(device, start_ms):
+                segment = self._open(path)
+                if segment is None or not segment.count or segment.last_ms < start_ms:
+                    continue
+                ts_ms, _ = segment.arrays()
+                first = int(ts_ms[np.searchsorted(ts_ms, start_ms)])
+                found = first if found is None else min(found, first)
+                break
+        return found
+
+    # [start_ms, end_ms) 范围内的行数，只读取时间戳列中二分查找经过的页
+    def count(self, start_ms, end_ms, device_id=None):
+        return sum(len(ts_ms) for device in (self.device_ids() if device_id is None else [device_id])
+                   for ts_ms, _ in self.scan(start_ms, end_ms, device))
+
+    # 某个设备第index个通道在edge_ms之前(direction < 0)或之后(direction > 0) window_ms 内最近的非NaN值，
+    # 返回 (毫秒时间戳, 数值)，没有时返回None，用于还原压缩保存的数据
+    def neighbour(self, device_id, index, edge_ms, direction, window_ms):
+        if direction < 0:
+            start_ms, end_ms = edge_ms - window_ms, edge_ms
+        else:
+            start_ms, end_ms = edge_ms + 1, edge_ms + window_ms + 1
+        found = None
+        for ts_ms, values in self.scan(start_ms, end_ms, device_id):
+            valid = np.flatnonzero(~np.isnan(values[:, index]))
+            if len(valid):
+                i = valid[-1] if direction < 0 else valid[0]
+                found = (int(ts_ms[i]), float(values[i, index]))
+                if direction > 0:
+                    break
+        return found
+
+    # 删除超过保留天数的段文件，返回删除的文件数；无法删除的文件(如Windows上正在被映射读取)留到下次
+    def expire(self, now=None):
+        if self.retention_days is None:
+            return 0
+        cutoff_ms = int(((time.time() if now is None else now) - self.retention_days * 24 * 60 * 60) * 1000)
+        removed = 0
+        for device_id in self.device_ids():
+            # 整天都早于保留期限的段
+            for path in self.segment_paths(device_id, None, cutoff_ms - self.DAY_MS + 1):
+                try:
+                    os.remove(path)
+                except OSError as e:
+                    db_log.warning("删除归档段 %s 失败: %s", path, e)
+                    continue
+                removed += 1
+                segment = self._segments.get(device_id)
+                if segment is not None and segment.path == path:
+                    del self._segments[device_id]
+        if removed:
+            # 删除了某个设备全部的段时终点可能前移，重新读取
+            with self._covered_lock:
+                self._covered_until = self._read_covered_until()
+                self._covered_time = time.monotonic()
+        self.segments_removed += removed
+        return removed
+
+    # 获取归档统计信息
+    def get_stats(self):
+        return {
+            "rows_archived": self.rows_archived,
+            "segments_created": self.segments_created,
+            "segments_removed": self.segments_removed,
+        }
+
+# 数据保留线程，分小批删除过期数据并增量回收空间，避免长时间锁住数据库
+class RetentionEngine(threading.Thread):
+
+    # 初始化数据保留线程
+    # retention: {表名: 保留时长(s)}，保留时长为None的表不清理，各表均以 ts_ms 列作为时间
+    # archive为 ColumnArchive 时原始数据表中过期的行先移入归档再删除，并按归档的保留天数删除旧的段文件
+    def __init__(self, db_name, retention, interval=60.0, chunk_size=2000,
+                 chunk_pause=0.01, vacuum_pages=256, archive=None):
+        super().__init__(name="RetentionEngine", daemon=True)
+        self.db_name = db_name
+        self.retention = dict(retention)
+        self.archive = archive
+        self.interval = interval  # 清理周期(s)
+        self.chunk_size = chunk_size  # 每个事务最多删除的行数
+        self.chunk_pause = chunk_pause  # 两个删除事务之间的间隔(s)，让出写锁给写入线程
+        self.vacuum_pages = vacuum_pages  # 每次增量回收的页数
+        self._stop_event = threading.Event()
+        
+        # 统计信息
+        self.cycle_count = 0
+        self.total_rows_deleted = 0
+        self.last_cycle = {"rows_deleted": {}, "elapsed_ms": 0.0, "pages_vacuumed": 0}
+
+    # 设置某个表的保留时长(s)，None表示不清理
+    def set_retention(self, table, seconds):
+        retention = dict(self.retention)
+        retention[table] = seconds
+        self.retention = retention
+
+    # 清理线程主循环
+    def run(self):
+        try:
+            conn = sqlite3.connect(self.db_name)
+        except sqlite3.Error as e:
+            db_log.error("清理线程数据库连接错误: %s", e)
+            return
+        
+        while not self._stop_event.wait(self.interval):
+            try:
+                self.run_cycle(conn)
+            except (sqlite3.Error, OSError) as e:
+                # 归档写入失败时对应的行还没有删除，下一个周期重试
+                db_log.error("清理数据错误: %s", e)
+        
+        conn.close()
+
+    # 执行一次清理: 逐表分批删除过期数据，然后增量回收空闲页
+    def run_cycle(self, conn):
+        start = time.perf_counter()
+        rows_deleted = {}
+        for table, seconds in self.retention.items():
+            if seconds is None:
+                continue
+            cutoff_ms = int((time.time() - seconds) * 1000)
+            archiving = table == "sensor_data" and self.archive is not None
+            deleted = 0
+            while not self._stop_event.is_set():
+                if archiving:
+                    count = self._archive_chunk(conn, cutoff_ms)
+                else:
+                    cursor = conn.execute(f'''
+                        DELETE FROM {table}
+                        WHERE rowid IN (
+                            SELECT rowid FROM {table}
+                            WHERE ts_ms < ?
+                            ORDER BY ts_ms
+                            LIMIT ?
+                        )
+                    ''', (cutoff_ms, self.chunk_size))
+                    conn.commit()
+                    count = cursor.rowcount
+                deleted += count
+                if count < self.chunk_size:
+                    break
+                self._stop_event.wait(self.chunk_pause)
+            if deleted:
+                rows_deleted[table] = deleted
+        
+        segments_removed = self.archive.expire() if self.archive is not None else 0
+        pages_vacuumed = 0
+        if rows_deleted:
+            pages_vacuumed = self._incremental_vacuum(conn)
+        
+        elapsed_ms = (time.perf_counter() - start) * 1000
+        self.cycle_count += 1
+        self.total_rows_deleted += sum(rows_deleted.values())
+        self.last_cycle = {"rows_deleted": rows_deleted, "elapsed_ms": elapsed_ms,
+                           "pages_vacuumed": pages_vacuumed}
+        if rows_deleted:
+            detail = ", ".join(f"{table} {count} 条{'(已归档)' if table == 'sensor_data' and self.archive else ''}"
+                               for table, count in rows_deleted.items())
+            db_log.info("已清理旧数据: %s, 回收 %d 页, 耗时 %.1f ms", detail, pages_vacuumed, elapsed_ms)
+        if segments_removed:
+            db_log.info("已删除超过 %s 天的归档段 %d 个", self.archive.retention_days, segments_removed)
+        return self.last_cycle
+
+    # 把原始数据表中最早的一批过期数据移入归档，返回删除的行数
+    # 先追加到归档段文件再从数据库中删除；同一毫秒的行总在同一批中，归档时跳过已归档的时间戳，
+    # 追加后、删除前中断时下一次不会重复归档
+    def _archive_chunk(self, conn, cutoff_ms):
+        row = conn.execute("SELECT ts_ms FROM sensor_data WHERE ts_ms < ? ORDER BY ts_ms LIMIT 1 OFFSET ?",
+                           (cutoff_ms, self.chunk_size - 1)).fetchone()
+        last_ms = row[0] if row is not None else cutoff_ms - 1
+        rows = conn.execute(f'''
+            SELECT ts_ms, device_id, {', '.join(self.archive.channels.columns)}
+            FROM sensor_data
+            WHERE ts_ms <= ?
+            ORDER BY ts_ms, id
+        ''', (last_ms,)).fetchall()
+        if not rows:
+            return 0
+        # 新增通道在旧数据中为NULL，压缩保存的行中没有保存点的通道为NULL，在归档中都为NaN
+        data = np.array(rows, dtype=np.float64)
+        self.archive.append(data[:, 0].astype(np.int64), data[:, 2:], data[:, 1].astype(np.int64))
+        cursor = conn.execute("DELETE FROM sensor_data WHERE ts_ms <= ?", (last_ms,))
+        conn.commit()
+        return cursor.rowcount
+
+    # 分批回收空闲页，使数据库文件真正缩小
+    # 未启用增量回收的数据库(见 DatabaseManager.configure_database)不回收
+    def _incremental_vacuum(self, conn):
+        pages_vacuumed = 0
+        if conn.execute("PRAGMA auto_vacuum").fetchone()[0] != 2:
+            return pages_vacuumed
+        while not self._stop_event.is_set():
+            freelist = conn.execute("PRAGMA freelist_count").fetchone()[0]
+            if freelist == 0:
+                break
+            # incremental_vacuum每执行一步只回收一页，用executescript一次执行完整条语句
+            conn.executescript(f"PRAGMA incremental_vacuum({self.vacuum_pages});")
+            pages_vacuumed += min(freelist, self.vacuum_pages)
+            self._stop_event.wait(self.chunk_pause)
+        return pages_vacuumed
+
+    # 停止清理线程
+    def stop(self, timeout=3.0):
+        self._stop_event.set()
+        self.join(timeout)
+
+    # 获取清理统计信息
+    def get_stats(self):
+        return {
+            "cycle_count": self.cycle_count,
+            "total_rows_deleted": self.total_rows_deleted,
+            "last_rows_deleted": sum(self.last_cycle["rows_deleted"].values()),
+            "last_elapsed_ms": self.last_cycle["elapsed_ms"],
+            "last_pages_vacuumed": self.last_cycle["pages_vacuumed"],
+            "rows_archived": self.archive.rows_archived if self.archive is not None else 0,
+        }
+
+# 数据库管理类，负责数据的存储和查询
+class DatabaseManager:
+
+    # 数据库结构版本，保存在 PRAGMA user_version 中
+    # 1: timestamp 为本地时间文本，无索引
+    # 2: ts_ms 为整数毫秒时间戳(UTC epoch)，并建立索引
+    # 3: 增加 1s / 1min / 1h 三级汇总表
+    # 4: 数据列由通道配置生成，汇总表按通道保存最小值/最大值/总和
+    # 5: 增加设备ID和设备表，汇总表以 (设备ID, 时间桶) 为主键
+    SCHEMA_VERSION = 5
+
+    # 汇总表及其时间桶宽度(ms)，按从细到粗排列
+    ROLLUP_LEVELS = [
+        ("sensor_rollup_1s", 1000),
+        ("sensor_rollup_1m", 60 * 1000),
+        ("sensor_rollup_1h", 60 * 60 * 1000),
+    ]
+
+    # 各表默认的数据保留时长(s)，None表示永久保留
+    DEFAULT_RETENTION = {
+        "sensor_data": 60 * 60,  # 原始数据保留60分钟
+        "sensor_rollup_1s": 24 * 60 * 60,  # 秒级汇总保留1天
+        "sensor_rollup_1m": 30 * 24 * 60 * 60,  # 分钟级汇总保留30天
+        "sensor_rollup_1h": None,  # 小时级汇总永久保留
+    }
+
+    # 原始数据的存储方式: raw保存每个样本，compressed只保存压缩后的保存点(见 PointCompressor)
+    STORAGE_MODES = ("raw", "compressed")
+
+    def __init__(self, db_name="sensor_data.db", channels=None, batch_size=500, flush_interval=0.5,
+                 retention=None, retention_interval=60.0, queue_policy="block", queue_capacity=200000,
+                 hot_store=None, storage="raw", max_error=None, archive=None, archive_days=None):
+        
+        # 初始化数据库连接并创建表，channels为通道注册表，为空时使用默认的热敏/光敏两通道
+        # hot_store为 HotStore 时写入的数据同时保存在内存中，最近的数据直接从内存中查询
+        # storage为原始数据的存储方式，max_error不为空时代替各模拟量通道配置的允许误差
+        # 查询时总是还原压缩保存的数据，两种方式写入的数据可以在同一个数据库中混合
+        # archive为归档目录，指定时原始数据过期后移入 ColumnArchive 而不是直接删除，归档保留archive_days天
+        if storage not in self.STORAGE_MODES:
+            raise ValueError(f"未知的存储方式: {storage}")
+        self.db_name = db_name
+        self.channels = channels or ChannelRegistry.default()
+        self.hot_store = hot_store
+        self.archive = ColumnArchive(archive, self.channels, archive_days) if archive else None
+        self.conn = None
+        self.cursor = None
+        self.closed_devices = None  # 关闭时保存的设备列表
+        self.connect()
+        self.create_tables()
+        
+        # 启动后台批量写入线程
+        compressor = None
+        if storage == "compressed":
+            compressor = PointCompressor(self.channels, max_error)
+            db_log.info("原始数据压缩存储: %s", compressor.describe())
+        self.writer = DatabaseWriter(db_name, self.channels, batch_size, flush_interval,
+                                     self.ROLLUP_LEVELS, queue_policy, queue_capacity, compressor)
+        self.writer.start()
+        
+        # 启动后台数据保留线程
+        policy = dict(self.DEFAULT_RETENTION)
+        policy.update(retention or {})
+        # 不清理原始数据时(如独立采集进程的界面进程)只从归档中读取，由清理原始数据的进程写入和删除段文件
+        archiving = self.archive is not None and policy.get("sensor_data") is not None
+        self.retention = RetentionEngine(db_name, policy, retention_interval,
+                                         archive=self.archive if archiving else None)
+        self.retention.start()
+        if archiving:
+            db_log.info("过期的原始数据移入归档 %s, 保留 %s", archive,
+                        "永久" if archive_days is None else f"{archive_days:g} 天")
+
+    def connect(self):
+        
+        # 连接到数据库
+        try:
+            self.conn = sqlite3.connect(self.db_name)
+            self.cursor = self.conn.cursor()
+            self.configure_database()
+            db_log.info("成功连接到数据库: %s", self.db_name)
+        except sqlite3.Error as e:
+            db_log.error("数据库连接错误: %s", e)
+
+    # 启用增量自动回收和WAL日志模式，两者都会保存在数据库文件中
+    def configure_database(self):
+        # 新数据库建表前设置即可生效；已有的数据库需要执行一次VACUUM才能切换auto_vacuum模式，
+        # 大数据库上耗时很长，不在启动时执行，由 --vacuum 在停止采集后单独完成
+        if self.cursor.execute("PRAGMA auto_vacuum").fetchone()[0] != 2:
+            self.cursor.execute("PRAGMA auto_vacuum = INCREMENTAL")
+            if self.cursor.execute("PRAGMA auto_vacuum").fetchone()[0] != 2:
+                db_log.warning("数据库 %s 未启用增量回收，清理的空间可以重用但文件不会缩小，"
+                               "停止采集后运行一次 --vacuum 启用", self.db_name)
+        self.cursor.execute("PRAGMA journal_mode = WAL")
+
+    # 创建传感器数据表，旧版本的数据库会先迁移到当前结构
+    # 每个通道在原始数据表中占一列；配置中新增的通道会在已有的表上补充列，旧数据的新列为NULL
+    # 每条数据带有设备ID，版本5之前的数据属于设备0
+    def create_tables(self):
+        try:
+            version = self.migrate_schema()
+            self.cursor.execute('''
+                CREATE TABLE IF NOT EXISTS sensor_data (
+                    id INTEGER PRIMARY KEY,
+                    device_id INTEGER NOT NULL DEFAULT 0,
+                    ts_ms INTEGER NOT NULL
+                )
+            ''')
+            self.cursor.execute('''
+                CREATE INDEX IF NOT EXISTS idx_sensor_data_ts ON sensor_data (ts_ms)
+            ''')
+            self.add_columns("sensor_data", [("device_id", "INTEGER NOT NULL DEFAULT 0")]
+                             + [(channel.column, self.column_type(channel)) for channel in self.channels])
+            
+            # 设备表，记录设备ID与串口名称等设备名称的对应关系
+            self.cursor.execute('''
+                CREATE TABLE IF NOT EXISTS devices (
+                    device_id INTEGER PRIMARY KEY,
+                    name TEXT NOT NULL UNIQUE
+                )
+            ''')
+            self.cursor.execute("INSERT OR IGNORE INTO devices (device_id, name) VALUES (0, '默认设备')")
+            
+            # 汇总表以 (设备ID, 时间桶起点) 作为主键，每个通道保存最小值、最大值和总和
+            # ts_ms 上另建索引，供数据保留线程按时间删除
+            for table, bucket_ms in self.ROLLUP_LEVELS:
+                if version < 5:
+                    self.migrate_rollup_table(table)
+                self.cursor.execute(f'''
+                    CREATE TABLE IF NOT EXISTS {table} (
+                        device_id INTEGER NOT NULL,
+                        ts_ms INTEGER NOT NULL,
+                        sample_count INTEGER NOT NULL,
+                        PRIMARY KEY (device_id, ts_ms)
+                    )
+                ''')
+                self.cursor.execute(f"CREATE INDEX IF NOT EXISTS idx_{table}_ts ON {table} (ts_ms)")
+                existing = self.add_columns(table, [
+                    (f"{channel.name}_{suffix}", self.column_type(channel))
+                    for channel in self.channels for suffix in ("min", "max", "sum")])
+                
+                # 版本3的汇总表中0/1通道只有总和，由总和与样本数推算出最小值和最大值
+                if version == 3:
+                    for channel in self.channels:
+                        if channel.is_binary and f"{channel.name}_sum" in existing \
+                                and f"{channel.name}_min" not in existing:
+                            self.cursor.execute(f'''
+                                UPDATE {table} SET
+                                    {channel.name}_min = CASE WHEN {channel.name}_sum >= sample_count THEN 1 ELSE 0 END,
+                                    {channel.name}_max = CASE WHEN {channel.name}_sum > 0 THEN 1 ELSE 0 END
+                                WHERE {channel.name}_sum IS NOT NULL
+                            ''')
+            
+            # 版本3之前的数据库由现有原始数据补齐汇总表
+            if version < 3:
+                self.backfill_rollups()
+            
+            self.cursor.execute(f"PRAGMA user_version = {self.SCHEMA_VERSION}")
+            self.conn.commit()
+            db_log.info("数据表创建成功")
+        except sqlite3.Error as e:
+            db_log.error("创建表错误: %s", e)
+
+    # 通道在数据库中的列类型，0/1通道为整数，模拟量为浮点数
+    @staticmethod
+    def column_type(channel):
+        return "INTEGER" if channel.is_binary else "REAL"
+
+    # 为表补充缺少的列: [(列名, 类型), ...]，返回补充之前已有的列名集合
+    def add_columns(self, table, columns):
+        existing = {row[1] for row in self.cursor.execute(f"PRAGMA table_info({table})")}
+        for name, column_type in columns:
+            if name not in existing:
+                self.cursor.execute(f"ALTER TABLE {table} ADD COLUMN {name} {column_type}")
+        return existing
+
+    # 版本5之前的汇总表以时间桶为主键，重建为以 (设备ID, 时间桶) 为主键，原有数据归入设备0
+    def migrate_rollup_table(self, table):
+        columns = [(row[1], row[2]) for row in self.cursor.execute(f"PRAGMA table_info({table})")]
+        names = [name for name, _ in columns]
+        if not columns or "device_id" in names:
+            return
+        
+        self.run_migration([f'''
+            ALTER TABLE {table} RENAME TO {table}_v4
+        ''', f'''
+            CREATE TABLE {table} (
+                device_id INTEGER NOT NULL,
+                ts_ms INTEGER NOT NULL,
+                sample_count INTEGER NOT NULL,
+                PRIMARY KEY (device_id, ts_ms)
+            )
+        '''] + [f"ALTER TABLE {table} ADD COLUMN {name} {column_type}"
+                for name, column_type in columns if name not in ("ts_ms", "sample_count")] + [f'''
+            INSERT INTO {table} (device_id, {', '.join(names)})
+                SELECT 0, {', '.join(names)} FROM {table}_v4
+        ''', f"DROP TABLE {table}_v4"])
+        db_log.info("汇总表 %s 已迁移为按设备保存", table)
+
+    # 在一个事务中依次执行迁移语句，任何一条失败时回滚并重新抛出异常，数据库保持迁移前的状态
+    def run_migration(self, statements):
+        self.conn.commit()
+        try:
+            self.cursor.execute("BEGIN")
+            for statement in statements:
+                self.cursor.execute(statement)
+            self.conn.commit()
+        except sqlite3.Error:
+            self.conn.rollback()
+            raise
+
+    # 将旧版本的数据表原地迁移到当前结构，返回迁移前的版本号
+    def migrate_schema(self):
+        version = self.cursor.execute("PRAGMA user_version").fetchone()[0]
+        if version >= 2:
+            return version
+        
+        columns = [row[1] for row in self.cursor.execute("PRAGMA table_info(sensor_data)")]
+        if "timestamp" not in columns:
+            return version  # 新数据库，无需迁移
+        
+        # 版本1 -> 版本2: 本地时间文本转换为UTC毫秒时间戳，整个迁移在一个事务中完成
+        start = time.perf_counter()
+        self.run_migration([
+            "ALTER TABLE sensor_data RENAME TO sensor_data_v1",
+            '''
+            CREATE TABLE sensor_data (
+                id INTEGER PRIMARY KEY,
+                ts_ms INTEGER NOT NULL,
+                thermal_value INTEGER,
+                light_value INTEGER
+            )
+            ''', '''
+            INSERT INTO sensor_data (ts_ms, thermal_value, light_value)
+                SELECT CAST(strftime('%s', timestamp, 'utc') AS INTEGER) * 1000, thermal_value, light_value
+                FROM sensor_data_v1
+                WHERE timestamp IS NOT NULL
+                ORDER BY id
+            ''',
+            "DROP TABLE sensor_data_v1",
+            "CREATE INDEX idx_sensor_data_ts ON sensor_data (ts_ms)",
+            "PRAGMA user_version = 2",
+        ])
+        count = self.cursor.execute("SELECT COUNT(*) FROM sensor_data").fetchone()[0]
+        db_log.info("数据库已从版本 %d 迁移到版本 2, 共 %d 条数据, 耗时 %.2f 秒",
+                    version, count, time.perf_counter() - start)
+        return version
+
+    # 由原始数据表重新生成各级汇总表
+    def backfill_rollups(self):
+        columns = ", ".join(f"{channel.name}_min, {channel.name}_max, {channel.name}_sum"
+                            for channel in self.channels)
+        aggregates = ", ".join(f"MIN({channel.column}), MAX({channel.column}), SUM({channel.column})"
+                               for channel in self.channels)
+        for table, bucket_ms in self.ROLLUP_LEVELS:
+            self.cursor.execute(f'''
+                INSERT OR REPLACE INTO {table} (device_id, ts_ms, sample_count, {columns})
+                SELECT device_id, ts_ms - ts_ms % {bucket_ms}, COUNT(*), {aggregates}
+                FROM sensor_data
+                GROUP BY device_id, ts_ms - ts_ms % {bucket_ms}
+            ''')
+
+    # 插入传感器数据，数据先进入写入队列，由后台线程批量提交
+    # values为按通道顺序排列的一组数值，timestamp为接收数据时的时间戳(s)，为空时使用当前时间
+    def insert_data(self, values, timestamp=None, device_id=0):
+        if timestamp is None:
+            timestamp = time.time()
+        self.writer.put(np.array([timestamp], dtype=np.float64),
+                        np.array([values], dtype=np.float64).reshape(1, len(self.channels)),
+                        np.array([device_id], dtype=np.int64))
+        return True
+
+    # 批量插入传感器数据: timestamps为接收时间戳(s)数组，values为 (样本数, 通道数) 的数组
+    # device_ids为每个样本的设备ID数组，也可以是所有样本共用的一个设备ID
+    def insert_batch(self, timestamps, values, device_ids=0):
+        if len(timestamps):
+            if np.isscalar(device_ids):
+                device_ids = np.full(len(timestamps), device_ids, dtype=np.int64)
+            if self.hot_store is not None:
+                self.hot_store.append(timestamps, values, device_ids)
+            self.writer.put(timestamps, values, device_ids)
+        return True
+
+    # 获取设备名称(如串口名称)对应的设备ID，新设备会分配一个新的ID
+    def get_device_id(self, name):
+        try:
+            row = self.cursor.execute("SELECT device_id FROM devices WHERE name = ?", (name,)).fetchone()
+            if row is None:
+                self.cursor.execute("INSERT INTO devices (name) VALUES (?)", (name,))
+                self.conn.commit()
+                return self.cursor.lastrowid
+            return row[0]
+        except sqlite3.Error as e:
+            db_log.error("查询设备错误: %s", e)
+            return 0
+
+    # 获取所有设备: [(设备ID, 名称), ...]，数据库关闭后返回关闭前的设备列表(如关闭后输出的最后一次统计)
+    def get_devices(self):
+        if self.closed_devices is not None:
+            return list(self.closed_devices)
+        try:
+            return self.cursor.execute("SELECT device_id, name FROM devices ORDER BY device_id").fetchall()
+        except sqlite3.Error as e:
+            db_log.error("查询设备错误: %s", e)
+            return []
+
+    # 获取最近一次写入数据的设备ID，没有数据时返回0
+    def get_latest_device_id(self):
+        try:
+            row = self.cursor.execute(
+                "SELECT device_id FROM sensor_data ORDER BY ts_ms DESC LIMIT 1").fetchone()
+            return row[0] if row else 0
+        except sqlite3.Error as e:
+            db_log.error("查询设备错误: %s", e)
+            return 0
+
+    # 获取写入队列深度和提交耗时等统计信息
+    def get_writer_stats(self):
+        return self.writer.get_stats()
+
+    # 待写入队列的统计信息: {队列名称: {...}}
+    def get_queue_stats(self):
+        return {"storage": self.writer.queue.get_stats()}
+
+    # 性能监测的处理阶段: [(阶段名称, 说明, 直方图), ...]
+    def get_histograms(self):
+        return [("db_flush", "数据库批量提交(每批)", self.writer.flush_histogram),
+                ("db_latency", "接收到提交(每个样本)", self.writer.latency_histogram)]
+
+    # 获取最近指定分钟的数据，返回 (毫秒时间戳, 通道1数值, 通道2数值, ...) 列表
+    # device_id为空时返回所有设备的数据
+    def get_recent_data(self, minutes=60, device_id=None):
+        start_ms = int((time.time() - minutes * 60) * 1000)
+        return self.get_data_range(start_ms, device_id=device_id)
+
+    # 获取最近指定分钟的数据，返回 (毫秒时间戳数组, (样本数, 通道数) 的数值数组)
+    # device_id为空时返回所有设备的数据
+    def get_recent_arrays(self, minutes=60, chunk_size=50000, device_id=None):
+        start_ms = int((time.time() - minutes * 60) * 1000)
+        return self.get_range_arrays(start_ms, None, chunk_size, device_id)
+
+    # 获取 [start_ms, end_ms) 范围内的数据，end_ms为空时到最新的数据，返回值同 get_recent_arrays
+    # 内存存储中完整的部分直接从内存中读取，已移入归档的部分从归档段文件中映射读取，只有中间的部分查询数据库
+    # 查询数据库时使用独立的连接，可以在后台线程中调用；按块读取并整体转换为NumPy数组
+    def get_range_arrays(self, start_ms, end_ms=None, chunk_size=50000, device_id=None):
+        db_end_ms = end_ms
+        if self.hot_store is not None:
+            since = self.hot_store.covered_from(device_id)
+            db_end_ms = since if end_ms is None else min(end_ms, since)
+        db_start_ms = self.archive_split(start_ms, db_end_ms)
+        chunks = []
+        if db_start_ms > start_ms:
+            chunks.append(self._archive_arrays(start_ms, db_start_ms, device_id))
+        if db_end_ms is None or db_end_ms > db_start_ms:
+            chunks += self._query_arrays(db_start_ms, db_end_ms, chunk_size, device_id)
+        if self.hot_store is not None and (end_ms is None or end_ms > db_end_ms):
+            timestamps, values, _ = self.hot_store.query(max(start_ms, db_end_ms), end_ms, device_id)
+            if len(timestamps):
+                chunks.append(np.column_stack((timestamps.astype(np.float64), values)))
+        
+        if not chunks:
+            return np.empty(0, dtype=np.float64), np.empty((0, len(self.channels)), dtype=np.float64)
+        data = np.concatenate(chunks)
+        return data[:, 0], data[:, 1:]
+
+    # 查询 [start_ms, end_ms) 时归档和数据库的分界: 早于返回值的部分从归档中读取，其余部分查询数据库
+    # 没有归档或范围内没有已归档的数据时返回start_ms，end_ms为None表示到最新的数据
+    def archive_split(self, start_ms, end_ms=None):
+        if self.archive is None:
+            return start_ms
+        archived = self.archive.covered_until()
+        if archived is None or archived <= start_ms:
+            return start_ms
+        return archived if end_ms is None else min(archived, end_ms)
+
+    # 从归档中读取 [start_ms, end_ms) 范围内的数据，返回 (时间戳, 通道数值...) 数组，压缩保存的数据同样还原
+    def _archive_arrays(self, start_ms, end_ms, device_id):
+        ts_ms, values, device_ids = self.archive.query(start_ms, end_ms, device_id)
+        data = np.column_stack((ts_ms.astype(np.float64), values))
+        if np.isnan(values).any():
+            try:
+                conn = sqlite3.connect(self.db_name)
+                try:
+                    data = self.restore_points(conn, data, device_ids)
+                finally:
+                    conn.close()
+            except sqlite3.Error as e:
+                db_log.error("查询数据错误: %s", e)
+        return data
+
+    # 按块查询数据库中 [start_ms, end_ms) 范围内的数据，返回 (时间戳, 通道数值...) 数组的列表
+    def _query_arrays(self, start_ms, end_ms, chunk_size, device_id):
+        device_filter, params = self._device_filter(device_id)
+        if end_ms is not None:
+            device_filter = " AND ts_ms < ?" + device_filter
+            params = (int(end_ms),) + params
+        chunks = []
+        try:
+            conn = sqlite3.connect(self.db_name)
+            try:
+                cursor = conn.execute(f'''
+                    SELECT ts_ms, device_id, {', '.join(self.channels.columns)}
+                    FROM sensor_data
+                    WHERE ts_ms >= ?{device_filter}
+                    ORDER BY ts_ms, id
+                ''', (int(start_ms),) + params)
+                while True:
+                    rows = cursor.fetchmany(chunk_size)
+                    if not rows:
+                        break
+                    # 新增通道在旧数据中为NULL，转换为NaN；压缩保存的数据按块还原
+                    data = np.array(rows, dtype=np.float64)
+                    chunks.append(self.restore_points(conn, np.delete(data, 1, axis=1), data[:, 1]))
+            finally:
+                conn.close()
+        except sqlite3.Error as e:
+            db_log.error("查询数据错误: %s", e)
+        return chunks
+
+    # 按设备筛选的查询条件和参数，device_id为空时不筛选
+    @staticmethod
+    def _device_filter(device_id):
+        if device_id is None:
+            return "", ()
+        return " AND device_id = ?", (int(device_id),)
+
+    # 获取指定时间范围 [start_ms, end_ms) 内的数据，通过 ts_ms 索引查找
+    # device_id为空时返回所有设备的数据
+    def get_data_range(self, start_ms, end_ms=None, device_id=None):
+        columns = ", ".join(self.channels.columns)
+        device_filter, params = self._device_filter(device_id)
+        try:
+            if end_ms is None:
+                self.cursor.execute(f'''
+                    SELECT ts_ms, device_id, {columns}
+                    FROM sensor_data
+                    WHERE ts_ms >= ?{device_filter}
+                    ORDER BY ts_ms, id
+                ''', (start_ms,) + params)
+            else:
+                self.cursor.execute(f'''
+                    SELECT ts_ms, device_id, {columns}
+                    FROM sensor_data
+                    WHERE ts_ms >= ? AND ts_ms < ?{device_filter}
+                    ORDER BY ts_ms, id
+                ''', (start_ms, end_ms) + params)
+            rows = self.cursor.fetchall()
+            if not any(None in row for row in rows):
+                return [row[:1] + row[2:] for row in rows]
+            
+            # 压缩保存的行中有NULL，还原后按原来的格式返回
+            data = np.array(rows, dtype=np.float64)
+            data = self.restore_points(self.conn, np.delete(data, 1, axis=1), data[:, 1])
+            return [(ts,) + tuple(None if v != v else v for v in values)
+                    for ts, values in zip(data[:, 0].astype(np.int64).tolist(), data[:, 1:].tolist())]
+        except sqlite3.Error as e:
+            db_log.error("查询数据错误: %s", e)
+            return []
+
+    # 还原压缩保存的数据: data为 (行数, 1 + 通道数) 的数组(毫秒时间戳, 各通道数值)，按时间排序，
+    # device_ids为每行的设备ID。压缩保存的行中没有保存点的通道为NaN，在该设备该通道相邻的两个保存点之间
+    # 线性插值(死区和游程编码的保存点成对出现，插值结果即为保持值)；首尾缺少的保存点在范围之前/之后
+    # PointCompressor.MAX_INTERVAL_MS 内查找，仍在压缩中的最新数据和旧数据中新增通道的NULL保持为NaN
+    # 没有NaN(全部为原始样本)时原样返回，conn为当前线程的数据库连接
+    def restore_points(self, conn, data, device_ids):
+        if not len(data) or not np.isnan(data[:, 1:]).any():
+            return data
+        interval = PointCompressor.MAX_INTERVAL_MS
+        for device_id in np.unique(device_ids).astype(np.int64).tolist():
+            rows = np.flatnonzero(device_ids == device_id)
+            ts = data[rows, 0]
+            for i, channel in enumerate(self.channels):
+                column = data[rows, i + 1]
+                missing = np.isnan(column)
+                if not missing.any():
+                    continue
+                xp = [ts[~missing]]
+                fp = [column[~missing]]
+                neighbours = []
+                if missing[0]:
+                    neighbours.append((-1, "<", ">=", " DESC", ts[0]))
+                if missing[-1]:
+                    neighbours.append((1, ">", "<=", "", ts[-1]))
+                for direction, op, bound_op, order, edge in neighbours:
+                    row = conn.execute(f'''
+                        SELECT ts_ms, {channel.column} FROM sensor_data
+                        WHERE ts_ms {op} ? AND ts_ms {bound_op} ? AND device_id = ?
+                            AND {channel.column} IS NOT NULL
+                        ORDER BY ts_ms{order}, id{order} LIMIT 1
+                    ''', (int(edge), int(edge) + direction * interval, device_id)).fetchone()
+                    # 范围两端的保存点可能已经移入归档，取两者中较近的一个
+                    if self.archive is not None:
+                        archived = self.archive.neighbour(device_id, i, int(edge), direction, interval)
+                        if archived is not None and (row is None or (archived[0] - row[0]) * direction < 0):
+                            row = archived
+                    if row is not None:
+                        xp.append(np.array([row[0]], dtype=np.float64))
+                        fp.append(np.array([row[1]], dtype=np.float64))
+                xp = np.concatenate(xp)
+                if len(xp):
+                    order = np.argsort(xp, kind="stable")
+                    column[missing] = np.interp(ts[missing], xp[order], np.concatenate(fp)[order],
+                                                left=np.nan, right=np.nan)
+                    data[rows, i + 1] = column
+        return data
+
+    # 获取 [start_ms, end_ms) 范围内的历史数据，自动选择分辨率
+    # 在能覆盖该时间范围且每个点不超过 (end_ms - start_ms) / max_points 的分辨率中选择最粗的一级，
+    # 原始数据已过保留期时退到能覆盖起点的更粗一级
+    # 返回 (桶宽度ms, 时间戳数组, 样本数数组, 最小值数组, 最大值数组, 均值数组)，原始数据的桶宽度为0
+    # 后三个数组的形状为 (点数, 通道数)，0/1通道的均值即为该时间桶内取值为1的占比
+    # device_id为要查询的设备，汇总表按设备分别保存
+    def get_history(self, start_ms, end_ms, max_points=1000, device_id=0):
+        table, bucket_ms = self.choose_history_level(start_ms, end_ms, max_points)
+        try:
+            data = self.query_history(self.cursor, table, bucket_ms, start_ms, end_ms, device_id)
+        except sqlite3.Error as e:
+            db_log.error("查询历史数据错误: %s", e)
+            data = np.empty((0, 2 + 3 * len(self.channels)), dtype=np.float64)
+        return self.split_history(bucket_ms, data)
+
+    # 选择查询 [start_ms, end_ms) 范围时使用的表和桶宽度(ms)，原始数据表的桶宽度为0，规则见 get_history
+    # 只依据保留时长配置，不访问数据库，可以在任意线程中调用
+    def choose_history_level(self, start_ms, end_ms, max_points=1000):
+        now_ms = time.time() * 1000
+        target_ms = (end_ms - start_ms) / max(1, max_points)
+        
+        levels = [("sensor_data", 0)] + self.ROLLUP_LEVELS
+        covering = []
+        for table, bucket_ms in levels:
+            seconds = self.retention.retention.get(table)
+            if table == "sensor_data" and self.archive is not None:
+                # 过期的原始数据在归档中，按归档的保留天数计算
+                days = self.archive.retention_days
+                seconds = None if days is None else days * 24 * 60 * 60
+            if seconds is None or start_ms >= now_ms - seconds * 1000:
+                covering.append((table, bucket_ms))
+        if not covering:
+            covering = levels[-1:]
+        
+        table, bucket_ms = covering[0]
+        for candidate in covering[1:]:
+            if candidate[1] <= target_ms:
+                table, bucket_ms = candidate
+        return table, bucket_ms
+
+    # 用指定的游标查询一个表中 [start_ms, end_ms) 范围的历史数据，返回 (行数, 2 + 3 * 通道数) 的数组，
+    # 每行为 时间戳, 样本数, 各通道最小值, 各通道最大值, 各通道均值；原始数据的三组数值相同
+    # 后台线程使用自己的连接调用，出错时抛出 sqlite3.Error
+    def query_history(self, cursor, table, bucket_ms, start_ms, end_ms, device_id=0):
+        count = len(self.channels)
+        if bucket_ms == 0:
+            # 已移入归档的部分从归档中读取
+            db_start_ms = self.archive_split(start_ms, end_ms)
+            parts = []
+            if db_start_ms > start_ms:
+                ts_ms, values, _ = self.archive.query(start_ms, db_start_ms, device_id)
+                parts.append(np.column_stack((ts_ms.astype(np.float64), values)))
+            cursor.execute(f'''
+                SELECT ts_ms, {', '.join(self.channels.columns)}
+                FROM sensor_data
+                WHERE ts_ms >= ? AND ts_ms < ? AND device_id = ?
+                ORDER BY ts_ms, id
+            ''', (db_start_ms, end_ms, device_id))
+            parts.append(np.array(cursor.fetchall(), dtype=np.float64).reshape(-1, 1 + count))
+            data = np.concatenate(parts)
+            data = self.restore_points(cursor.connection, data, np.full(len(data), device_id))
+            values = data[:, 1:]
+            return np.column_stack((data[:, :1], np.ones(len(data)), values, values, values))
+        
+        columns = ", ".join([f"{name}_min" for name in self.channels.names]
+                            + [f"{name}_max" for name in self.channels.names]
+                            + [f"CAST({name}_sum AS REAL) / sample_count"
+                               for name in self.channels.names])
+        cursor.execute(f'''
+            SELECT ts_ms, sample_count, {columns}
+            FROM {table}
+            WHERE device_id = ? AND ts_ms >= ? AND ts_ms < ?
+            ORDER BY ts_ms
+        ''', (device_id, start_ms - start_ms % bucket_ms, end_ms))
+        return np.array(cursor.fetchall(), dtype=np.float64).reshape(-1, 2 + 3 * count)
+
+    # 把 query_history 的结果拆分为 (桶宽度ms, 时间戳数组, 样本数数组, 最小值数组, 最大值数组, 均值数组)
+    def split_history(self, bucket_ms, data):
+        count = len(self.channels)
+        return (bucket_ms, data[:, 0].astype(np.int64), data[:, 1].astype(np.int64),
+                data[:, 2:2 + count], data[:, 2 + count:2 + 2 * count], data[:, 2 + 2 * count:])
+
+    # 设置某个表的数据保留时长(s)，由后台清理线程分批执行
+    def set_retention(self, table, seconds):
+        self.retention.set_retention(table, seconds)
+
+    # 获取数据清理统计信息
+    def get_retention_stats(self):
+        return self.retention.get_stats()
+
+    # 关闭数据库连接，最多等待timeout秒提交写入队列中的剩余数据
+    def close(self, timeout=3.0):
+        self.retention.stop(timeout)
+        if self.writer.is_alive():
+            self.writer.stop(timeout)
+            stats = self.writer.get_stats()
+            db_log.info("写入统计: 共写入 %d 条, 提交 %d 次, 平均耗时 %.2f ms, 最大耗时 %.2f ms, 最大队列深度 %d",
+                        stats["rows_written"], stats["flush_count"], stats["avg_flush_latency_ms"],
+                        stats["max_flush_latency_ms"], stats["max_queue_depth"])
+        if self.conn:
+            self.closed_devices = self.get_devices()
+            self.conn.close()
+            db_log.info("数据库连接已关闭")
+
+# 只读打开的数据库，用于命令行导出等只读取数据的场合: 使用只读连接，不建表、不迁移、不修改数据库，
+# 也不启动写入线程和数据保留线程，只能使用查询方法
+class ReadOnlyDatabase(DatabaseManager):
+
+    # 打开数据库，archive为归档目录(只读取)；数据库文件不存在时抛出sqlite3.Error，
+    # 数据库结构版本低于 SCHEMA_VERSION 或缺少通道的列(需要迁移或添加列)时抛出ValueError
+    def __init__(self, db_name, channels=None, archive=None):
+        self.db_name = db_name
+        self.channels = channels or ChannelRegistry.default()
+        self.hot_store = None
+        self.archive = ColumnArchive(archive, self.channels) if archive else None
+        self.closed_devices = None
+        self.conn = self.connect_readonly(db_name)
+        self.cursor = self.conn.cursor()
+        try:
+            version = self.cursor.execute("PRAGMA user_version").fetchone()[0]
+            if version < self.SCHEMA_VERSION:
+                raise ValueError(f"数据库结构版本 {version} 低于当前版本 {self.SCHEMA_VERSION}，"
+                                 "先用采集程序打开一次完成升级")
+            columns = {row[1] for row in self.cursor.execute("PRAGMA table_info(sensor_data)")}
+            missing = [channel.name for channel in self.channels if channel.column not in columns]
+            if missing:
+                raise ValueError(f"数据库中没有通道 {', '.join(missing)} 的列，先用采集程序按当前通道配置打开一次")
+        except (sqlite3.Error, ValueError):
+            self.conn.close()
+            raise
+
+    # 以只读方式连接数据库(mode=ro)，文件不存在时不会新建，可以在任意线程中调用
+    @staticmethod
+    def connect_readonly(db_name):
+        return sqlite3.connect(f"file:{urllib.request.pathname2url(os.path.abspath(db_name))}?mode=ro", uri=True)
+
+    # 关闭数据库连接
+    def close(self, timeout=None):
+        if self.conn:
+            self.closed_devices = self.get_devices()
+            self.conn.close()
+            self.conn = self.cursor = None
+
+# 以流的方式写入.npy文件: 先写入固定长度的文件头，数据分块追加，关闭时按实际长度改写文件头中的形状
+# 生成的文件是标准的NumPy .npy格式(1.0版)，可以用 np.load(..., mmap_mode="r") 直接映射读取
+class NpyStreamWriter:
+
+    # 文件头总长度(字节)，足够容纳任意长度的一维形状，并保持数据按64字节对齐
+    HEADER_SIZE = 128
+
+    # 创建文件，dtype为数据类型，数据按一维数组追加
+    def __init__(self, path, dtype):
+        self.path = path
+        self.dtype = np.dtype(dtype)
+        self.count = 0
+        self.file = open(path, "wb")
+        self._write_header()
+
+    # 写入文件头: 魔数、版本号、头部长度和描述数组的字典，不足部分用空格补齐
+    def _write_header(self):
+        header = repr({"descr": np.lib.format.dtype_to_descr(self.dtype), "fortran_order": False,
+                       "shape": (self.count,)})
+        header_len = self.HEADER_SIZE - 10
+        self.file.seek(0)
+        self.file.write(b"\x93NUMPY\x01\x00" + struct.pack("<H", header_len)
+                        + header.ljust(header_len - 1).encode("latin1") + b"\n")
+
+    # 追加一块数据
+    def append(self, values):
+        values = np.ascontiguousarray(values, dtype=self.dtype)
+        self.file.write(values.tobytes())
+        self.count += len(values)
+
+    # 按实际长度改写文件头并关闭文件
+    def close(self):
+        if self.file.closed:
+            return
+        self._write_header()
+        self.file.close()
+
+# 数据导出，把 [start_ms, end_ms) 范围内的原始数据按块流式写入文件，内存占用与时间范围无关
+# 支持两种格式:
+#   csv: 一个CSV文件，每行为 ts_ms, 时间, 设备, 各通道数值
+#   npy: 一个目录，每列一个.npy文件(ts_ms.npy、device_id.npy 和各通道的 <通道名>.npy)，以及说明文件 meta.json
+# run 可以在任意线程中调用，使用独立的数据库连接，在一个读事务中统计总数并读取，导出结果与开始时的数据一致
+class DataExporter:
+
+    FORMATS = ("csv", "npy")
+    ARCHIVE_WINDOW_MS = 10 * 60 * 1000  # 从归档中导出时每次读取的时间范围
+
+    # 初始化导出任务，device_id为空时导出所有设备，fmt为空时按文件扩展名选择(.csv为CSV，否则为npy目录)
+    def __init__(self, db_manager, path, start_ms, end_ms, device_id=None, fmt=None, chunk_size=10000):
+        if fmt is None:
+            fmt = "csv" if path.lower().endswith(".csv") else "npy"
+        if fmt not in self.FORMATS:
+            raise ValueError(f"未知的导出格式: {fmt}")
+        self.db_name = db_manager.db_name
+        self.channels = db_manager.channels
+        self.hot_store = db_manager.hot_store
+        self.restore_points = db_manager.restore_points
+        self.archive = db_manager.archive
+        self.archive_split = db_manager.archive_split
+        self.device_names = dict(db_manager.get_devices())  # 在调用方线程中读取，run中不使用主连接
+        self.path = path
+        self.start_ms = int(start_ms)
+        self.end_ms = int(end_ms)
+        self.device_id = device_id
+        self.format = fmt
+        self.chunk_size = chunk_size
+        self.rows_exported = 0
+        self.total_rows = 0
+        self.error = ""
+        self._cancel_event = threading.Event()
+        
+        # 导出数据的统计: {设备ID: StatsAccumulator}，随导出按块累计
+        self.statistics = {}
+        self._thresholds = StatsAccumulator.high_thresholds(self.channels)
+        self._last_values = {}  # 设备ID -> 上一个样本的数值
+
+    # 请求取消导出，可以在任意线程中调用，已写入的部分文件会被删除
+    def cancel(self):
+        self._cancel_event.set()
+
+    # 是否已请求取消
+    @property
+    def cancelled(self):
+        return self._cancel_event.is_set()
+
+    # 执行导出，每写完一块调用一次 progress(已导出行数, 总行数)，成功返回True，出错或取消时返回False
+    # 内存存储中完整的最近部分直接从内存中导出，包括还没有提交到数据库的数据，已移入归档的最早部分从归档中导出，
+    # 只有中间的部分查询数据库
+    def run(self, progress=None):
+        db_end_ms = self.end_ms
+        hot = None
+        if self.hot_store is not None:
+            db_end_ms = min(self.end_ms, max(self.start_ms, self.hot_store.covered_from(self.device_id)))
+            if db_end_ms < self.end_ms:
+                hot = self.hot_store.query(db_end_ms, self.end_ms, self.device_id)
+        db_start_ms = self.archive_split(self.start_ms, db_end_ms)
+        device_filter, params = DatabaseManager._device_filter(self.device_id)
+        where = f"WHERE ts_ms >= ? AND ts_ms < ?{device_filter}"
+        params = (db_start_ms, db_end_ms) + params
+        created = []  # 已创建的文件，取消或出错时删除
+        try:
+            conn = ReadOnlyDatabase.connect_readonly(self.db_name)
+            try:
+                conn.execute("BEGIN")  # 读事务，总数和读取的数据来自同一个快照
+                self.total_rows = conn.execute(f"SELECT COUNT(*) FROM sensor_data {where}", params).fetchone()[0]
+                if hot is not None:
+                    self.total_rows += len(hot[0])
+                if db_start_ms > self.start_ms:
+                    self.total_rows += self.archive.count(self.start_ms, db_start_ms, self.device_id)
+                cursor = conn.execute(f'''
+                    SELECT ts_ms, device_id, {', '.join(self.channels.columns)}
+                    FROM sensor_data
+                    {where}
+                    ORDER BY ts_ms, id
+                ''', params)
+                chunks = self._chunks(cursor, db_start_ms, hot, progress)
+                if self.format == "csv":
+                    self._export_csv(chunks, created)
+                else:
+                    self._export_npy(chunks, created)
+            finally:
+                conn.close()
+        except (sqlite3.Error, OSError) as e:
+            self.error = str(e)
+            db_log.error("导出数据错误: %s", e)
+            self._remove(created)
+            return False
+        
+        if self.cancelled:
+            self._remove(created)
+            db_log.info("导出已取消，已删除部分导出的文件")
+            return False
+        db_log.info("已导出 %d 条数据到 %s", self.rows_exported, self.path)
+        for device, channels in self.get_statistics().items():
+            for name, stats in channels.items():
+                db_log.info("导出数据统计 %s %s: %s", device, name, ", ".join(
+                    f"{key} {value:g}" for key, value in stats.items()))
+        return True
+
+    # 累计一块数据的统计，每个设备分别计算
+    def _accumulate(self, device_ids, values):
+        for device_id in np.unique(device_ids).tolist():
+            rows = values[device_ids == device_id]
+            high, changed = StatsAccumulator.flags(rows, self._last_values.get(device_id), self._thresholds)
+            stats = StatsAccumulator.from_groups(rows, high, changed, np.array([0]))[0]
+            self.statistics.setdefault(device_id, StatsAccumulator(len(self.channels))).merge(stats)
+            self._last_values[device_id] = rows[-1]
+
+    # 导出数据的统计: {设备名称: {通道名称: {"count", "mean", "std", "min", "max"[, "duty", "transitions"]}}}
+    # 0/1通道包括高电平样本的占比和跳变次数
+    def get_statistics(self):
+        statistics = {}
+        for device_id, accumulator in sorted(self.statistics.items()):
+            result = accumulator.result()
+            channels = {}
+            for i, channel in enumerate(self.channels):
+                keys = ("mean", "std", "min", "max") + (("duty", "transitions") if channel.is_binary else ())
+                channels[channel.name] = dict([("count", result["count"])] +
+                                              [(key, result[key][i].item()) for key in keys])
+            statistics[self.device_names.get(device_id, str(device_id))] = channels
+        return statistics
+
+    # 先按时间窗口读取归档中早于db_start_ms的部分，再按块读取查询结果，最后按块取出内存中的数据hot
+    # (毫秒时间戳数组, 数值数组, 设备ID数组)，返回 (毫秒时间戳数组, 设备ID数组, (行数, 通道数) 的数值数组) 的迭代器
+    # 归档中的时间窗口从有数据的时间开始，跳过没有数据的时段(如默认从最早的时间导出时)
+    def _chunks(self, cursor, db_start_ms, hot, progress):
+        window_ms = self.archive.next_timestamp(self.start_ms, self.device_id) if db_start_ms > self.start_ms else None
+        while window_ms is not None and window_ms < db_start_ms:
+            if self.cancelled:
+                return
+            window_end = min(window_ms + self.ARCHIVE_WINDOW_MS, db_start_ms)
+            ts_ms, values, device_ids = self.archive.query(window_ms, window_end, self.device_id)
+            for start in range(0, len(ts_ms), self.chunk_size):
+                end = start + self.chunk_size
+                data = np.column_stack((ts_ms[start:end].astype(np.float64), values[start:end]))
+                data = self.restore_points(cursor.connection, data, device_ids[start:end])
+                self._accumulate(device_ids[start:end], data[:, 1:])
+                yield ts_ms[start:end], device_ids[start:end], data[:, 1:]
+                self.rows_exported += len(data)
+                if progress is not None:
+                    progress(self.rows_exported, max(self.total_rows, self.rows_exported))
+            window_ms = self.archive.next_timestamp(window_end, self.device_id)
+        while not self.cancelled:
+            rows = cursor.fetchmany(self.chunk_size)
+            if not rows:
+                break
+            # 新增通道在旧数据中为NULL，转换为NaN；压缩保存的数据按块还原
+            data = np.array(rows, dtype=np.float64)
+            device_ids = data[:, 1].astype(np.int64)
+            data = self.restore_points(cursor.connection, np.delete(data, 1, axis=1), device_ids)
+            self._accumulate(device_ids, data[:, 1:])
+            yield data[:, 0].astype(np.int64), device_ids, data[:, 1:]
+            self.rows_exported += len(rows)
+            if progress is not None:
+                progress(self.rows_exported, max(self.total_rows, self.rows_exported))
+        if hot is None:
+            return
+        ts_ms, values, device_ids = hot
+        for start in range(0, len(ts_ms), self.chunk_size):
+            if self.cancelled:
+                break
+            end = start + self.chunk_size
+            self._accumulate(device_ids[start:end], values[start:end])
+            yield ts_ms[start:end], device_ids[start:end], values[start:end]
+            self.rows_exported += len(ts_ms[start:end])
+            if progress is not None:
+                progress(self.rows_exported, max(self.total_rows, self.rows_exported))
+
+    # 导出为CSV文件
+    def _export_csv(self, chunks, created):
+        with open(self.path, "w", encoding="utf-8", newline="") as f:
+            created.append(self.path)
+            writer = csv.writer(f)
+            writer.writerow(["ts_ms", "time", "device"] + self.channels.names)
+            for ts_ms, device_ids, values in chunks:
+                # 同一秒内的样本共用日期时间部分，每秒只格式化一次
+                seconds, millis = np.divmod(ts_ms, 1000)
+                prefixes = {second: datetime.fromtimestamp(second).strftime("%Y-%m-%d %H:%M:%S")
+                            for second in np.unique(seconds).tolist()}
+                times = [f"{prefixes[second]}.{milli:03d}" for second, milli in zip(seconds.tolist(), millis.tolist())]
+                devices = [self.device_names.get(d, str(d)) for d in device_ids.tolist()]
+                # NaN写为空字段，整数值不带小数部分
+                columns = [["" if v != v else (int(v) if v.is_integer() else v) for v in column]
+                           for column in values.T.tolist()]
+                writer.writerows(zip(ts_ms.tolist(), times, devices, *columns))
+
+    # 导出为每列一个.npy文件的目录
+    def _export_npy(self, chunks, created):
+        os.makedirs(self.path, exist_ok=True)
+        names = ["ts_ms", "device_id"] + self.channels.names
+        dtypes = [np.int64, np.int64] + [np.float64] * len(self.channels)
+        writers = []
+        try:
+            for name, dtype in zip(names, dtypes):
+                writers.append(NpyStreamWriter(os.path.join(self.path, f"{name}.npy"), dtype))
+                created.append(writers[-1].path)
+            for ts_ms, device_ids, values in chunks:
+                writers[0].append(ts_ms)
+                writers[1].append(device_ids)
+                for writer, column in zip(writers[2:], values.T):
+                    writer.append(column)
+        finally:
+            for writer in writers:
+                writer.close()
+        
+        meta = {
+            "rows": self.rows_exported,
+            "start_ms": self.start_ms,
+            "end_ms": self.end_ms,
+            "device_id": self.device_id,
+            "devices": {str(device_id): name for device_id, name in self.device_names.items()},
+            "columns": names,
+            "channels": [{"name": channel.name, "label": channel.label, "kind": channel.kind,
+                          "unit": channel.unit} for channel in self.channels],
+            "statistics": self.get_statistics(),
+        }
+        meta_path = os.path.join(self.path, "meta.json")
+        created.append(meta_path)
+        with open(meta_path, "w", encoding="utf-8") as f:
+            json.dump(meta, f, ensure_ascii=False, indent=2)
+
+    # 删除部分导出的文件，npy目录为空时一并删除
+    def _remove(self, created):
+        for path in created:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+        if self.format == "npy":
+            try:
+                os.rmdir(self.path)
+            except OSError:
+                pass
+
+# 历史数据块的LRU缓存，按占用的字节数限制总大小，超过上限时淘汰最久未使用的数据块
+# 可以在多个线程中同时使用
+class TileCache:
+
+    # 初始化缓存，max_bytes为缓存占用内存的上限
+    def __init__(self, max_bytes=64 * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self.entries = collections.OrderedDict()  # 键 -> (值, 字节数)，最近使用的在末尾
+        self.bytes = 0
+        self.lock = threading.Lock()
+        
+        # 统计计数
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    # 查找一个数据块，不存在时返回None；record为False时不计入命中统计
+    def get(self, key, record=True):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                if record:
+                    self.misses += 1
+                return None
+            self.entries.move_to_end(key)
+            if record:
+                self.hits += 1
+            return entry[0]
+
+    # 放入一个数据块，nbytes为其占用的字节数，已存在时替换
+    def put(self, key, value, nbytes):
+        with self.lock:
+            old = self.entries.pop(key, None)
+            if old is not None:
+                self.bytes -= old[1]
+            self.entries[key] = (value, nbytes)
+            self.bytes += nbytes
+            # 至少保留刚放入的数据块
+            while self.bytes > self.max_bytes and len(self.entries) > 1:
+                _, (_, size) = self.entries.popitem(last=False)
+                self.bytes -= size
+                self.evictions += 1
+
+    # 获取缓存统计信息
+    def get_stats(self):
+        with self.lock:
+            lookups = self.hits + self.misses
+            return {
+                "tiles": len(self.entries),
+                "bytes": self.bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "evictions": self.evictions,
+            }
+
+# 历史数据块加载器，把时间轴按分辨率切分为固定点数的数据块，由后台线程用各自的只读连接查询，
+# 界面线程只从缓存中取数据，从不等待SQLite
+# 数据表由 DatabaseManager.choose_history_level 选择，桶宽度为该表的桶宽度(原始数据为 RAW_BUCKET_MS)乘以2的整数次幂，
+# 取不超过每像素时长的最大值，每个数据块包含 TILE_POINTS 个时间桶，查询出的行数更多时在后台线程中汇总，
+# 因此无论可见范围多大，每次显示只需要两三个数据块
+# 数据块的内容与 DatabaseManager.get_history 的返回值相同，键为 (设备ID, 桶宽度ms, 起始时间ms)
+class HistoryTileLoader(QObject):
+
+    # 定义信号
+    tile_loaded = pyqtSignal(object)  # 数据块的键
+    extent_loaded = pyqtSignal(int, object, object)  # 设备ID, 最早时间ms, 最晚时间ms，没有数据时为None
+
+    # 每个数据块的时间桶数
+    TILE_POINTS = 1024
+    # 原始数据最细的时间桶宽度(ms)，行数不超过 TILE_POINTS 的数据块保留原始样本
+    RAW_BUCKET_MS = 10
+    # 数据块还没有加载时，最多向上查找几级更粗的已缓存数据块代替显示
+    FALLBACK_LEVELS = 8
+    # 结束时间距现在不足该时长(ms)的数据块可能还有数据没有写入，不放入缓存，每次显示时重新加载
+    COMPLETE_DELAY_MS = 5000
+    # 未完成的数据块重新加载的最短间隔(s)
+    RELOAD_INTERVAL = 1.0
+    # 原始数据块在数据库中超过该行数时改用覆盖它的最细的汇总表，避免在读取线程中逐行转换大量数据而长时间占用GIL
+    RAW_TILE_ROWS = 16 * TILE_POINTS
+
+    # 初始化加载器，db_manager提供数据库路径、通道和分辨率选择，workers为后台读取线程数
+    # cache_bytes为缓存占用内存的上限
+    def __init__(self, db_manager, workers=2, cache_bytes=64 * 1024 * 1024):
+        super().__init__()
+        self.db_manager = db_manager
+        self.cache = TileCache(cache_bytes)
+        self.load_histogram = LatencyHistogram()
+        
+        # 以下状态由界面线程和后台读取线程共用，都在 _cond 的锁内访问
+        self.recent = {}  # 未完成的数据块: 键 -> (数据块, 加载时间)，只保留最近一次请求范围内的
+        self.tiles_loaded = 0
+        self.load_errors = 0
+        # 待加载的任务按请求顺序排列，新的请求替换尚未开始的旧任务
+        self._pending = collections.OrderedDict()
+        self._in_flight = set()
+        self._cond = threading.Condition()
+        self._running = True
+        self._threads = [threading.Thread(target=self._run, name=f"history-tiles-{i}", daemon=True)
+                         for i in range(max(1, workers))]
+        for thread in self._threads:
+            thread.start()
+
+    # 数据块的桶宽度: 表的桶宽度base_ms乘以2的整数次幂，不超过target_ms的最大值
+    @classmethod
+    def tile_bucket(cls, base_ms, target_ms):
+        bucket_ms = base_ms or cls.RAW_BUCKET_MS
+        while bucket_ms * 2 <= target_ms:
+            bucket_ms *= 2
+        return bucket_ms
+
+    # 请求 [start_ms, end_ms) 范围的数据，max_points为显示宽度(像素)
+    # 返回 (桶宽度ms, 已有的数据块列表, 尚在加载的数据块数)，缺少的数据块在后台加载，加载完成后发出 tile_loaded
+    # 数据块按时间排序且互不重叠；没有加载的数据块先用已缓存的更粗的数据块代替，未完成的数据块先返回上一次加载的内容
+    def request(self, device_id, start_ms, end_ms, max_points):
+        table, base_ms = self.db_manager.choose_history_level(start_ms, end_ms, max_points)
+        bucket_ms = self.tile_bucket(base_ms, (end_ms - start_ms) / max(1, max_points))
+        span = bucket_ms * self.TILE_POINTS
+        first = int(start_ms) // span * span
+        now = time.monotonic()
+        tiles = []
+        missing = []
+        keys = set()
+        with self._cond:
+            recent = dict(self.recent)
+        for tile_start in range(first, int(end_ms), span):
+            key = (device_id, bucket_ms, tile_start)
+            tile = self.cache.get(key)
+            if tile is None:
+                keys.add(key)
+                entry = recent.get(key)
+                if entry is None or now - entry[1] >= self.RELOAD_INTERVAL:
+                    missing.append((key, (table, base_ms)))
+                if entry is not None:
+                    tile = entry[0]
+                else:
+                    tile = self._fallback(device_id, bucket_ms, tile_start)
+            if tile is not None:
+                tiles.append(self.clip(tile, tile_start, tile_start + span))
+        # 原地删除不在本次请求范围内的数据块，期间后台线程刚加载完成的数据块不会丢失
+        with self._cond:
+            for key in [key for key in self.recent if key not in keys]:
+                del self.recent[key]
+        self._submit(missing)
+        return bucket_ms, tiles, len(missing)
+
+    # 查找覆盖tile_start的更粗的已缓存数据块，没有时返回None
+    def _fallback(self, device_id, bucket_ms, tile_start):
+        for level in range(1, self.FALLBACK_LEVELS + 1):
+            coarse_ms = bucket_ms << level
+            span = coarse_ms * self.TILE_POINTS
+            tile = self.cache.get((device_id, coarse_ms, tile_start // span * span), record=False)
+            if tile is not None:
+                return tile
+        return None
+
+    # 截取数据块中 [start_ms, end_ms) 范围内的时间桶
+    @staticmethod
+    def clip(tile, start_ms, end_ms):
+        timestamps = tile[1]
+        if not len(timestamps) or (timestamps[0] >= start_ms and timestamps[-1] < end_ms):
+            return tile
+        lo, hi = np.searchsorted(timestamps, (start_ms, end_ms), side='left').tolist()
+        return (tile[0],) + tuple(array[lo:hi] for array in tile[1:])
+
+    # 请求某个设备数据的时间范围，结果通过 extent_loaded 发出
+    def request_extent(self, device_id):
+        with self._cond:
+            self._pending[("extent", device_id)] = None
+            self._cond.notify()
+
+    # 替换待加载的任务，正在加载的数据块不会重复提交
+    def _submit(self, missing):
+        with self._cond:
+            extents = [key for key in self._pending if key[0] == "extent"]
+            self._pending = collections.OrderedDict((key, None) for key in extents)
+            for key, table in missing:
+                if key not in self._in_flight:
+                    self._pending[key] = table
+            if self._pending:
+                self._cond.notify_all()
+
+    # 后台读取线程主循环，每个线程使用自己的只读连接
+    def _run(self):
+        conn = None
+        try:
+            conn = sqlite3.connect(self.db_manager.db_name)
+            conn.execute("PRAGMA query_only = ON")
+            while True:
+                with self._cond:
+                    while self._running and not self._pending:
+                        self._cond.wait()
+                    if not self._running:
+                        break
+                    key, table = self._pending.popitem(last=False)
+                    self._in_flight.add(key)
+                try:
+                    if key[0] == "extent":
+                        self._load_extent(conn, key[1])
+                    else:
+                        self._load_tile(conn, key, table)
+                except sqlite3.Error as e:
+                    with self._cond:
+                        self.load_errors += 1
+                    db_log.error("加载历史数据块错误: %s", e)
+                finally:
+                    with self._cond:
+                        self._in_flight.discard(key)
+        except sqlite3.Error as e:
+            db_log.error("历史数据读取连接错误: %s", e)
+        finally:
+            if conn is not None:
+                conn.close()
+
+    # 加载一个数据块，source为 (数据表, 表的桶宽度ms)，完成的数据块放入缓存
+    def _load_tile(self, conn, key, source):
+        device_id, bucket_ms, tile_start = key
+        table, base_ms = source
+        tile_end = tile_start + bucket_ms * self.TILE_POINTS
+        start = time.perf_counter()
+        now_ms = time.time() * 1000
+        if base_ms == 0 and self._raw_rows(conn, device_id, tile_start, tile_end) > self.RAW_TILE_ROWS:
+            # 目标桶宽度取秒级汇总的桶宽度，选出覆盖该数据块的最细的汇总表，没有时仍读取原始数据
+            rollup_ms = self.db_manager.ROLLUP_LEVELS[0][1]
+            table, base_ms = self.db_manager.choose_history_level(
+                tile_start, tile_end, (tile_end - tile_start) // rollup_ms)
+        data = self.db_manager.query_history(conn.cursor(), table, base_ms, tile_start, tile_end, device_id)
+        if len(data) > self.TILE_POINTS:
+            data = self.aggregate(data, tile_start, bucket_ms)
+            base_ms = bucket_ms
+        tile = self.db_manager.split_history(base_ms, data)
+        
+        if tile_end <= now_ms - self.COMPLETE_DELAY_MS:
+            # 最小值/最大值/均值是data的视图，另外两个数组是转换类型后的副本
+            self.cache.put(key, tile, data.nbytes + tile[1].nbytes + tile[2].nbytes)
+            with self._cond:
+                self.tiles_loaded += 1
+        else:
+            with self._cond:
+                self.recent[key] = (tile, time.monotonic())
+                self.tiles_loaded += 1
+        self.load_histogram.record(time.perf_counter() - start)
+        self.tile_loaded.emit(key)
+
+    # 数据库中某个设备 [start_ms, end_ms) 范围内的原始数据行数，最多数到 RAW_TILE_ROWS + 1 行
+    # (已移入归档的部分直接映射读取，不计入)
+    def _raw_rows(self, conn, device_id, start_ms, end_ms):
+        return conn.execute('''
+            SELECT COUNT(*) FROM (
+                SELECT 1 FROM sensor_data
+                WHERE ts_ms >= ? AND ts_ms < ? AND device_id = ?
+                LIMIT ?
+            )
+        ''', (start_ms, end_ms, device_id, self.RAW_TILE_ROWS + 1)).fetchone()[0]
+
+    # 把 query_history 的结果汇总为宽度为bucket_ms的时间桶，返回相同格式的数组，均值按样本数加权
+    @staticmethod
+    def aggregate(data, start_ms, bucket_ms):
+        count = (data.shape[1] - 2) // 3
+        index = (data[:, 0].astype(np.int64) - start_ms) // bucket_ms
+        starts = np.flatnonzero(np.r_[True, index[1:] != index[:-1]])
+        samples = data[:, 1]
+        counts = np.add.reduceat(samples, starts)
+        result = np.empty((len(starts), data.shape[1]), dtype=np.float64)
+        result[:, 0] = start_ms + index[starts] * bucket_ms
+        result[:, 1] = counts
+        result[:, 2:2 + count] = np.minimum.reduceat(data[:, 2:2 + count], starts)
+        result[:, 2 + count:2 + 2 * count] = np.maximum.reduceat(data[:, 2 + count:2 + 2 * count], starts)
+        result[:, 2 + 2 * count:] = (np.add.reduceat(data[:, 2 + 2 * count:] * samples[:, None], starts)
+                                     / counts[:, None])
+        return result
+
+    # 查询某个设备数据的最早和最晚时间戳(精确到秒)
+    # 每个原始样本都计入了各级汇总表，只需查询汇总表，沿 (设备ID, 时间) 主键查找
+    def _load_extent(self, conn, device_id):
+        first = []
+        last = []
+        for table, _ in self.db_manager.ROLLUP_LEVELS:
+            # 分别按时间正序和倒序取第一行，MIN和MAX写在同一个查询中会扫描全部索引
+            for order, found in (("", first), (" DESC", last)):
+                row = conn.execute(f"SELECT ts_ms FROM {table} WHERE device_id = ? ORDER BY ts_ms{order} LIMIT 1",
+                                   (device_id,)).fetchone()
+                if row is not None:
+                    found.append(row[0])
+        self.extent_loaded.emit(device_id, min(first) if first else None, max(last) if last else None)
+
+    # 获取加载统计信息
+    def get_stats(self):
+        stats = self.cache.get_stats()
+        with self._cond:
+            stats["pending"] = len(self._pending) + len(self._in_flight)
+            stats["tiles_loaded"] = self.tiles_loaded
+            stats["load_errors"] = self.load_errors
+        return stats
+
+    # 获取加载耗时的延迟直方图
+    def get_histograms(self):
+        return [("history_tile", "历史数据块加载(每块)", self.load_histogram)]
+
+    # 停止后台读取线程，正在执行的查询完成后退出
+    def stop(self, timeout=3.0):
+        with self._cond:
+            self._running = False
+            self._pending.clear()
+            self._cond.notify_all()
+        for thread in self._threads:
+            thread.join(timeout)
+
+# 二进制帧解码器，在接收缓冲区上一次解码多个帧，遇到损坏的帧时重新查找同步头
+# 帧格式(小端序):
+#   偏移0 2字节 同步头 0xAA 0x55
+#   偏移2 1字节 负载长度
+#   偏移3 起   按通道顺序排列的数值，0/1通道为 uint8，模拟量通道为 uint16
+#   末尾  2字节 CRC16-CCITT(初值0xFFFF)，校验范围为负载长度字节和全部数值
+# 默认的热敏/光敏两通道配置下负载长度为3，整帧8字节
+class BinaryFrameDecoder:
+
+    SYNC = b'\xaa\x55'
+
+    # 初始化解码器，channels为通道注册表，决定每帧的字段
+    def __init__(self, channels):
+        self.width = len(channels)
+        self.fields = self.field_format(channels)
+        self.frame = struct.Struct('<2sB' + self.fields + 'H')
+        self.payload_length = struct.calcsize('<' + self.fields)
+        self.buffer = bytearray()
+        
+        # 统计计数
+        self.frames_decoded = 0
+        self.crc_errors = 0
+        self.resync_bytes = 0  # 查找同步头时丢弃的字节数
+
+    # 各通道数值的struct格式
+    @staticmethod
+    def field_format(channels):
+        return "".join("B" if channel.is_binary else "H" for channel in channels)
+
+    # 编码一个数据帧，供固件参考和模拟测试使用
+    @classmethod
+    def encode_frame(cls, channels, values):
+        fields = cls.field_format(channels)
+        body = struct.pack('<B' + fields, struct.calcsize('<' + fields), *(int(v) for v in values))
+        return cls.SYNC + body + struct.pack('<H', binascii.crc_hqx(body, 0xFFFF))
+
+    # 添加接收到的字节并解码其中的完整帧，返回 (帧数, 通道数) 的数值数组
+    def feed(self, data):
+        buffer = self.buffer
+        buffer += data
+        size = self.frame.size
+        crc_end = size - 2
+        length = len(buffer)
+        frames = []
+        pos = 0
+        
+        view = memoryview(buffer)
+        try:
+            while True:
+                start = buffer.find(self.SYNC, pos)
+                if start < 0:
+                    # 保留末尾可能是同步头第一个字节的数据
+                    keep = 1 if length and buffer[-1] == self.SYNC[0] else 0
+                    self.resync_bytes += length - keep - pos
+                    pos = length - keep
+                    break
+                self.resync_bytes += start - pos
+                
+                # 从同步头开始按连续的完整帧批量解包
+                count = (length - start) // size
+                good = 0
+                for frame in self.frame.iter_unpack(view[start:start + count * size]):
+                    if frame[0] != self.SYNC or frame[1] != self.payload_length:
+                        break
+                    offset = start + good * size
+                    if binascii.crc_hqx(view[offset + 2:offset + crc_end], 0xFFFF) != frame[-1]:
+                        self.crc_errors += 1
+                        break
+                    frames.append(frame[2:-1])
+                    good += 1
+                pos = start + good * size
+                
+                if good < count:
+                    # 帧损坏，跳过该同步头继续查找
+                    pos += 1
+                    self.resync_bytes += 1
+                    continue
+                break
+        finally:
+            view.release()
+        
+        del buffer[:pos]
+        self.frames_decoded += len(frames)
+        if not frames:
+            return np.empty((0, self.width), dtype=np.float64)
+        return np.array(frames, dtype=np.float64)
+
+# 串口读取线程，每个设备一个，每次唤醒读取缓冲区中的全部字节，拆分出完整的行后批量交给合并线程
+# 串口出错时关闭端口并按退避间隔重新打开，不影响其他设备
+class SerialReader(QThread):
+
+    # 定义信号
+    status_changed = pyqtSignal(bool, str)  # 是否已连接, 消息
+
+    # 未找到换行符时允许缓存的最大字节数，超过说明数据异常，直接丢弃
+    MAX_PENDING_BYTES = 4096
+
+    # 重连等待时间(s)，每次失败后加倍，直到最大值
+    RECONNECT_MIN_DELAY = 0.5
+    RECONNECT_MAX_DELAY = 5.0
+
+    # 初始化串口读取线程
+    # channels为通道注册表，protocol为"ascii"(文本行)或"binary"(二进制帧)
+    # 解析出的样本标记为device_id后放入merger；serial_port为已经打开的串口，为空时由线程打开
+    # parse_histogram为记录每次解析耗时的直方图，多个读取线程可以共用一个
+    def __init__(self, port_name, baud_rate, channels, protocol, device_id, merger, serial_port=None,
+                 parse_histogram=None):
+        super().__init__()
+        self.port_name = port_name
+        self.baud_rate = baud_rate
+        self.channels = channels
+        self.width = len(channels)
+        self.protocol = protocol
+        self.device_id = device_id
+        self.merger = merger
+        self.serial_port = serial_port
+        self.buffer = bytearray()  # 保存尚未收到换行符的不完整行
+        self.decoder = BinaryFrameDecoder(channels) if protocol == "binary" else None
+        self._running = False
+        self._stop_event = threading.Event()
+        self._last_timestamp = None  # 上一次读到数据的时间
+        
+        # 统计计数
+        self.bytes_read = 0
+        self.lines_parsed = 0
+        self.parse_errors = 0
+        self.read_errors = 0
+        self.reconnect_count = 0
+        self.last_error = ""
+        self.parse_histogram = parse_histogram if parse_histogram is not None else LatencyHistogram()
+
+    # 打开串口
+    @staticmethod
+    def open_port(port_name, baud_rate):
+        return serial.Serial(
+            port=port_name,
+            baudrate=baud_rate,
+            bytesize=serial.EIGHTBITS,
+            parity=serial.PARITY_NONE,
+            stopbits=serial.STOPBITS_ONE,
+            timeout=0.1
+        )
+
+    # 读取线程主循环
+    def run(self):
+        self._running = True
+        delay = self.RECONNECT_MIN_DELAY
+        while self._running:
+            if self.serial_port is None:
+                # 串口断开后按退避间隔重连
+                try:
+                    self.serial_port = self.open_port(self.port_name, self.baud_rate)
+                except (serial.SerialException, OSError) as e:
+                    self.last_error = str(e)
+                    self._stop_event.wait(delay)
+                    delay = min(delay * 2, self.RECONNECT_MAX_DELAY)
+                    continue
+                delay = self.RECONNECT_MIN_DELAY
+                self.reconnect_count += 1
+                self.buffer.clear()
+                self._last_timestamp = None
+                if self.decoder is not None:
+                    self.decoder = BinaryFrameDecoder(self.channels)
+                self.status_changed.emit(True, f"{self.port_name} 已重新连接")
+            
+            port = self.serial_port
+            try:
+                # 有数据时一次读完缓冲区，没有数据时阻塞等待，最长为串口超时时间
+                data = port.read(port.in_waiting or 1)
+            except (serial.SerialException, OSError) as e:
+                if not self._running:
+                    break
+                self.read_errors += 1
+                self.last_error = str(e)
+                self.status_changed.emit(False, f"{self.port_name} 读取错误: {e}，正在重连")
+                self._close_port()
+                continue
+            if not data:
+                continue
+            
+            timestamp = time.time()
+            previous, self._last_timestamp = self._last_timestamp, timestamp
+            parse_start = time.perf_counter()
+            self.bytes_read += len(data)
+            
+            if self.decoder is not None:
+                values = self.decoder.feed(data)
+            else:
+                self.buffer += data
+                
+                end = self.buffer.rfind(b'\n')
+                if end < 0:
+                    if len(self.buffer) > self.MAX_PENDING_BYTES:
+                        serial_log.warning("%s 串口数据过长且无换行符，丢弃 %d 字节", self.port_name, len(self.buffer))
+                        self.buffer.clear()
+                    continue
+                lines = self.buffer[:end].split(b'\n')
+                del self.buffer[:end + 1]
+                values = self.parse_lines(lines)
+            
+            self.parse_histogram.record(time.perf_counter() - parse_start, len(values))
+            if serial_log.isEnabledFor(logging.DEBUG):
+                serial_log.debug("%s 读取 %d 字节, 解析出 %d 条样本", self.port_name, len(data), len(values))
+            if len(values):
+                # 一次读到的样本在这段数据的传输时间内(8N1每字节10位)先后到达，时间戳按顺序均匀分布在其中，
+                # 不早于上一次读取，同一次读取的样本不会因为时间戳相同在压缩时合并为一个时刻
+                span = len(data) * 10 / self.baud_rate
+                if previous is not None:
+                    span = min(span, timestamp - previous)
+                count = len(values)
+                self.merger.put(self.device_id, timestamp - span * np.arange(count - 1, -1, -1) / count, values)
+        
+        self._close_port()
+
+    # 关闭串口，忽略关闭时的错误
+    def _close_port(self):
+        if self.serial_port is not None:
+            try:
+                self.serial_port.close()
+            except (serial.SerialException, OSError):
+                pass
+            self.serial_port = None
+
+    # 解析传感器数据，数据格式: 通道1数值,通道2数值,...(按通道配置的顺序)
+    # 字段多于通道数时忽略多余的字段，少于通道数的行丢弃
+    # 所有行的字段拼接后一次转换为数组，解析开销与通道数基本无关
+    def parse_lines(self, lines):
+        width = self.width
+        fields = []
+        for line in lines:
+            line = line.strip()
+            if not line:
+                continue
+            parts = line.split(b',')
+            if len(parts) < width:
+                self.parse_errors += 1
+                serial_log.warning("%s 数据解析错误: 字段数 %d 少于通道数 %d, 原始数据: %r",
+                                   self.port_name, len(parts), width, line)
+                continue
+            fields.extend(parts[:width])
+        if not fields:
+            return np.empty((0, width), dtype=np.float64)
+        
+        try:
+            values = np.array(fields).astype(np.float64).reshape(-1, width)
+        except ValueError:
+            # 存在无法转换的字段，逐行解析找出错误的行
+            rows = []
+            for i in range(0, len(fields), width):
+                try:
+                    rows.append([float(field) for field in fields[i:i + width]])
+                except ValueError as e:
+                    self.parse_errors += 1
+                    serial_log.warning("%s 数据解析错误: %s, 原始数据: %r",
+                                       self.port_name, e, b','.join(fields[i:i + width]))
+            values = np.array(rows, dtype=np.float64).reshape(-1, width)
+        self.lines_parsed += len(values)
+        return values
+
+    # 获取读取统计信息
+    def get_stats(self):
+        decoder = self.decoder
+        return {
+            "connected": self.serial_port is not None,
+            "bytes_read": self.bytes_read,
+            "samples": self.lines_parsed + (decoder.frames_decoded if decoder else 0),
+            "parse_errors": self.parse_errors + (decoder.crc_errors if decoder else 0),
+            "read_errors": self.read_errors,
+            "reconnect_count": self.reconnect_count,
+            "last_error": self.last_error,
+        }
+
+    # 停止读取线程，线程退出前关闭串口
+    def stop(self):
+        self._running = False
+        self._stop_event.set()
+        port = self.serial_port
+        if port is not None and hasattr(port, "cancel_read"):
+            port.cancel_read()  # 中断阻塞中的读取
+        self.wait(2000)
+
+# 多设备数据合并线程，把各设备读取线程送来的样本按时间排序后合并成一个数据流
+# 每隔interval秒发出一批，只发出早于 当前时间 - max_delay 的样本，较晚到达的样本等下一批，
+# 以墙上时间为准而不是等待所有设备，某个设备变慢或断开不会拖住其他设备
+# 合并后的数据先在合并线程中交给sink(存储)，再放入output队列供界面线程取用，界面变慢不会影响存储
+class StreamMerger(QThread):
+
+    # 定义信号
+    ready = pyqtSignal()  # output队列由空变为有数据
+
+    # 停止标记
+    _STOP = object()
+
+    # 初始化合并线程，width为通道数
+    # input_queue为各设备送来样本的队列，output_queue为发往界面的队列，为空时使用默认的队列
+    def __init__(self, width, interval=0.02, max_delay=0.05, input_queue=None, output_queue=None):
+        super().__init__()
+        self.width = width
+        self.interval = interval  # 发出间隔(s)
+        self.max_delay = max_delay  # 等待较慢设备的最长时间(s)
+        self.queue = input_queue or BoundedQueue(*QUEUE_DEFAULTS["ingest"], name="ingest")
+        self.output = output_queue or BoundedQueue(*QUEUE_DEFAULTS["ui"], name="ui")
+        self.output.on_ready = self.ready.emit
+        self.sink = None  # sink(时间戳数组, 数值数组, 设备ID数组)，在合并线程中调用，可以阻塞
+        
+        # 统计计数
+        self.samples_merged = 0
+        self.batches_emitted = 0
+        self.late_samples = 0  # 到达时已晚于上一批的样本数，仍会发出，但与上一批之间不保证顺序
+        self.delay_histogram = LatencyHistogram()  # 每个样本从接收到合并发出的延迟
+        self.sink_histogram = LatencyHistogram()  # 每批交给sink的耗时，包括存储队列满时的等待
+
+    # 添加一个设备的一批样本，可以在任意线程中调用，队列满时按队列策略处理
+    def put(self, device_id, timestamps, values):
+        return self.queue.put((device_id, timestamps, values))
+
+    # 合并线程主循环
+    def run(self):
+        pending = []  # [(设备ID或设备ID数组, 时间戳数组, 数值数组), ...]
+        last_emitted = -math.inf  # 已发出的最新时间戳
+        running = True
+        next_emit = time.monotonic() + self.interval
+        while running:
+            try:
+                item = self.queue.get(timeout=max(0.0, next_emit - time.monotonic()))
+                while True:
+                    if item is self._STOP:
+                        running = False
+                        break
+                    pending.append(item)
+                    item = self.queue.get_nowait()
+            except queue.Empty:
+                pass
+            
+            if running and time.monotonic() < next_emit:
+                continue
+            next_emit = time.monotonic() + self.interval
+            if not pending:
+                continue
+            
+            timestamps = np.concatenate([timestamps for _, timestamps, _ in pending])
+            values = np.concatenate([values for _, _, values in pending])
+            # 上一批保留下来的样本的设备ID已经是数组，np.full 按长度广播
+            device_ids = np.concatenate([np.full(len(timestamps), device_id, dtype=np.int64)
+                                         for device_id, timestamps, _ in pending])
+            
+            # 停止时全部发出，否则保留尚未到达等待期限的样本
+            if running:
+                ready = timestamps <= time.time() - self.max_delay
+                if not ready.all():
+                    keep = ~ready
+                    pending = [(device_ids[keep], timestamps[keep], values[keep])]
+                    timestamps, values, device_ids = timestamps[ready], values[ready], device_ids[ready]
+                else:
+                    pending = []
+            else:
+                pending = []
+            
+            if len(timestamps):
+                order = np.argsort(timestamps, kind="stable")
+                timestamps, values, device_ids = timestamps[order], values[order], device_ids[order]
+                self.late_samples += int(np.count_nonzero(timestamps < last_emitted))
+                last_emitted = max(last_emitted, float(timestamps[-1]))
+                self.samples_merged += len(timestamps)
+                self.batches_emitted += 1
+                self.delay_histogram.record_many(time.time() - timestamps)
+                if self.sink is not None:
+                    sink_start = time.perf_counter()
+                    self.sink(timestamps, values, device_ids)
+                    self.sink_histogram.record(time.perf_counter() - sink_start, len(timestamps))
+                self.output.put((timestamps, values, device_ids))
+
+    # 停止合并线程，发出剩余的样本
+    def stop(self):
+        self.queue.put(self._STOP)
+        self.wait(2000)
+
+    # 获取合并统计信息
+    def get_stats(self):
+        return {
+            "queue_depth": self.queue.qsize(),
+            "max_queue_depth": self.queue.max_batches,
+            "samples_merged": self.samples_merged,
+            "batches_emitted": self.batches_emitted,
+            "late_samples": self.late_samples,
+        }
+
+# 串口管理类，负责多个串口设备的连接，每个设备一个读取线程，数据经合并线程按时间排序后统一发出
+# 数据流: 读取线程 -> ingest队列 -> 合并线程 -> storage(存储，不丢数据) 和 ui队列 -> samples_received信号
+class SerialManager(QObject):
+
+    # 定义信号
+    samples_received = pyqtSignal(object, object, object)  # 接收时间戳(s)数组, (样本数, 通道数) 的数值数组, 设备ID数组
+    connection_status = pyqtSignal(bool, str)  # 是否有设备连接, 消息
+
+    # 初始化串口管理器，channels为通道注册表
+    # storage为合并后数据的存储函数 storage(时间戳数组, 数值数组, 设备ID数组)，在合并线程中调用，
+    # 如 DatabaseManager.insert_batch；queues为 {队列名称: (策略, 容量)}，未指定的队列使用 QUEUE_DEFAULTS
+    def __init__(self, channels, storage=None, queues=None):
+        super().__init__()
+        self.channels = channels
+        self.readers = {}  # 串口名称 -> 读取线程
+        self.baud_rate = 115200  # 默认波特率
+        self.protocol = "ascii"  # 默认使用文本协议，兼容现有固件
+        
+        # 各设备的数据先进入合并线程，合并后直接存储，界面从ui队列中取数据
+        queues = dict(QUEUE_DEFAULTS, **(queues or {}))
+        self.merger = StreamMerger(len(channels), input_queue=BoundedQueue(*queues["ingest"], name="ingest"),
+                                   output_queue=BoundedQueue(*queues["ui"], name="ui"))
+        self.merger.sink = storage
+        self.merger.ready.connect(self.dispatch_samples)
+        self.merger.start()
+        
+        # 计算吞吐量用的上一次统计
+        self._last_stats = {}
+        self._last_stats_time = time.monotonic()
+        self.parse_histogram = LatencyHistogram()  # 所有读取线程共用
+
+    # 是否有设备处于连接状态
+    @property
+    def is_connected(self):
+        return bool(self.readers)
+
+    # 指定串口是否已连接
+    def is_port_connected(self, port_name):
+        return port_name in self.readers
+
+    # 获取可用的串口列表
+    def get_available_ports(self):
+        ports = []
+        for port in serial.tools.list_ports.comports():
+            ports.append(port.device)
+        return ports
+
+    # 连接到指定串口，protocol为"ascii"(文本行)或"binary"(二进制帧)
+    # device_id为该设备在数据库中的编号，可以同时连接多个串口
+    # retry为True时串口暂时无法打开也启动读取线程并在后台重试，用于无界面模式下设备晚于程序启动的情况
+    def connect_port(self, port_name, baud_rate=115200, protocol="ascii", device_id=0, retry=False):
+        if port_name in self.readers:
+            self.disconnect_port(port_name)
+        
+        try:
+            serial_port = SerialReader.open_port(port_name, baud_rate)
+        except serial.SerialException as e:
+            self.connection_status.emit(self.is_connected, f"{port_name} 连接失败: {str(e)}")
+            serial_log.error("串口连接错误: %s", e)
+            if not retry:
+                return False
+            serial_port = None
+        
+        # 在独立线程中读取串口数据，串口未打开时由读取线程按退避间隔重试
+        reader = SerialReader(port_name, baud_rate, self.channels, protocol, device_id,
+                              self.merger, serial_port, self.parse_histogram)
+        reader.status_changed.connect(self.on_reader_status)
+        self.readers[port_name] = reader
+        reader.start()
+        
+        if serial_port is None:
+            serial_log.warning("串口 %s 暂时无法打开，将在后台重试", port_name)
+            return True
+        self.connection_status.emit(True, f"已连接到 {port_name}")
+        serial_log.info("已连接到串口: %s, 波特率: %d, 协议: %s, 设备ID: %d", port_name, baud_rate, protocol, device_id)
+        return True
+
+    # 断开指定串口，port_name为空时断开所有串口
+    def disconnect_port(self, port_name=None):
+        names = list(self.readers) if port_name is None else [port_name]
+        for name in names:
+            reader = self.readers.pop(name, None)
+            if reader is None:
+                continue
+            reader.stop()
+            self._last_stats.pop(name, None)
+            serial_log.info("串口 %s 连接已断开", name)
+        if names:
+            self.connection_status.emit(self.is_connected, "已断开连接" if not self.is_connected
+                                        else f"已断开 {', '.join(names)}")
+
+    # 把其他数据源(如模拟数据)的样本并入数据流
+    def put_samples(self, device_id, timestamps, values):
+        self.merger.put(device_id, timestamps, values)
+
+    # 取出ui队列中的全部数据，合并成一批发出samples_received信号，在界面线程中调用
+    # 界面处理较慢时多批数据一次发出，没有连接信号时只清空队列
+    def dispatch_samples(self):
+        batches = []
+        while True:
+            try:
+                batches.append(self.merger.output.get_nowait())
+            except queue.Empty:
+                break
+        if not batches or not self.receivers(self.samples_received):
+            return
+        if len(batches) == 1:
+            self.samples_received.emit(*batches[0])
+            return
+        self.samples_received.emit(np.concatenate([timestamps for timestamps, _, _ in batches]),
+                                   np.concatenate([values for _, values, _ in batches]),
+                                   np.concatenate([device_ids for _, _, device_ids in batches]))
+
+    # 各队列的统计信息: {队列名称: {...}}
+    def get_queue_stats(self):
+        return {"ingest": self.merger.queue.get_stats(), "ui": self.merger.output.get_stats()}
+
+    # 处理读取线程报告的串口状态变化，串口出错时读取线程会自动重连
+    def on_reader_status(self, connected, message):
+        if connected:
+            serial_log.info("%s", message)
+        else:
+            serial_log.warning("%s", message)
+        self.connection_status.emit(self.is_connected, message)
+
+    # 获取各设备的统计信息: {串口名称: {...}}，包括自上次调用以来的每秒样本数和字节数
+    def get_device_stats(self):
+        now = time.monotonic()
+        elapsed = max(1e-6, now - self._last_stats_time)
+        self._last_stats_time = now
+        stats = {}
+        for name, reader in self.readers.items():
+            current = reader.get_stats()
+            last = self._last_stats.get(name, {"samples": 0, "bytes_read": 0})
+            current["samples_per_s"] = (current["samples"] - last["samples"]) / elapsed
+            current["bytes_per_s"] = (current["bytes_read"] - last["bytes_read"]) / elapsed
+            current["device_id"] = reader.device_id
+            self._last_stats[name] = current
+            stats[name] = current
+        return stats
+
+    # 性能监测的处理阶段: [(阶段名称, 说明, 直方图), ...]
+    def get_histograms(self):
+        return [("parse", "串口解析(每次读取)", self.parse_histogram),
+                ("merge", "接收到合并发出(每个样本)", self.merger.delay_histogram),
+                ("store", "合并数据送入存储(每批)", self.merger.sink_histogram)]
+
+    # 断开所有串口并停止合并线程，剩余的数据在合并线程退出前送入存储
+    def close(self):
+        self.disconnect_port()
+        self.merger.stop()
+
+
+# 模拟数据生成器类
+# 按设定的速率生成数据，高速率时每次定时器触发生成一批样本，可以设置突发模式和随机数种子，
+# 数据可以直接通过信号发出，也可以编码后写入pty虚拟串口，像真实设备一样经过串口读取线程
+class DataSimulator(QObject):
+
+    # 定义信号
+    samples_generated = pyqtSignal(object, object)  # 时间戳(s)数组, (样本数, 通道数) 的数值数组
+
+    # 模拟量通道可用的波形
+    WAVEFORMS = ("sine", "square", "triangle", "sawtooth", "noise")
+
+    # 写入pty时读取端来不及读取，最多缓存的字节数，超过后丢弃，相当于真实串口的接收溢出
+    MAX_PENDING_BYTES = 1 << 20
+
+    # 初始化模拟数据生成器，channels为通道注册表，按各通道的类型和量程生成数据
+    # rate: 每秒样本数；waveform: 模拟量通道的波形，可以是一个波形名称，也可以是 {通道名称: 波形名称}
+    # period: 波形周期(s)；seed: 随机数种子，种子相同时生成的数值序列相同
+    # burst: 突发模式 (周期s, 持续时间s, 速率倍数)，每个周期开始的一段时间内速率乘以倍数，为空时速率恒定
+    def __init__(self, channels, rate=1.0, waveform="sine", period=60.0, seed=None, burst=None):
+        super().__init__()
+        self.channels = channels
+        self.is_running = False
+        self.timer = QTimer()
+        self.timer.timeout.connect(self.generate_data)
+        self.period = period
+        self.seed = seed
+        self.rng = np.random.default_rng(seed)
+        self.index = 0  # 已生成的样本序号，决定波形的相位
+        self.set_rate(rate, burst)
+        
+        # 各通道的量程和波形，按列整体计算
+        self.binary = np.array([channel.is_binary for channel in channels])
+        self.minimum = np.array([channel.minimum for channel in channels], dtype=np.float64)
+        self.maximum = np.array([channel.maximum for channel in channels], dtype=np.float64)
+        self.phase = np.arange(len(channels)) * (2 * math.pi / max(1, len(channels)))  # 各通道错开相位
+        waveforms = waveform if isinstance(waveform, dict) else {}
+        self.waveforms = [waveforms.get(channel.name, "sine" if isinstance(waveform, dict) else waveform)
+                          for channel in channels]
+        for name in self.waveforms:
+            if name not in self.WAVEFORMS:
+                raise ValueError(f"未知的波形: {name}")
+        
+        # pty输出
+        self.pty_master = None
+        self.pty_slave = None
+        self.pty_path = None
+        self.protocol = "ascii"
+        self.pending_bytes = bytearray()
+        self.overrun_bytes = 0  # 读取端来不及读取而丢弃的字节数
+
+    # 设置生成速率和突发模式，定时器间隔随速率变化，最短10ms，高速率时每次生成一批
+    def set_rate(self, rate, burst=None):
+        if rate <= 0:
+            raise ValueError(f"生成速率必须大于0: {rate}")
+        if burst is not None:
+            burst_period, burst_duration, multiplier = burst
+            if burst_period <= 0 or not 0 <= burst_duration <= burst_period or multiplier <= 0:
+                raise ValueError(f"突发模式参数无效: {burst}")
+        self.rate = rate
+        self.burst = burst
+        peak = rate * (burst[2] if burst else 1)
+        self.interval = max(10, min(1000, int(1000 / peak)))  # 生成间隔(ms)
+        if self.is_running:
+            self.timer.start(self.interval)
+
+    # 从开始生成起经过elapsed秒应生成的样本总数，突发期间按倍数增加
+    def expected_count(self, elapsed):
+        count = self.rate * elapsed
+        if self.burst is not None:
+            burst_period, burst_duration, multiplier = self.burst
+            in_burst = (elapsed // burst_period) * burst_duration + min(elapsed % burst_period, burst_duration)
+            count += (multiplier - 1) * self.rate * in_burst
+        return int(count)
+
+    # 开始生成模拟数据
+    def start(self):
+        self.is_running = True
+        self._start_time = time.monotonic()
+        self._last_timestamp = time.time()
+        self._run_count = 0  # 本次启动后已生成的样本数
+        self.timer.start(self.interval)
+        sim_log.info("模拟数据生成器已启动, 速率 %g 条/s", self.rate)
+
+    # 停止生成模拟数据
+    def stop(self):
+        self.is_running = False
+        self.timer.stop()
+        sim_log.info("模拟数据生成器已停止")
+
+    # 生成从序号 self.index 开始的count个样本，返回 (样本数, 通道数) 的数值数组
+    # 波形按样本序号计算，数值只取决于随机数种子和序号，与生成时间无关
+    def generate_samples(self, count):
+        t = (self.index + np.arange(count))[:, None] / self.rate
+        self.index += count
+        
+        # 模拟量通道: 按波形变化，幅度为量程的40%，再加上量程2.5%的随机波动
+        span = self.maximum - self.minimum
+        center = (self.minimum + self.maximum) / 2
+        x = (t / self.period + self.phase / (2 * math.pi)) % 1.0  # 周期内的位置 0~1
+        waves = np.empty((count, len(self.channels)), dtype=np.float64)
+        for i, name in enumerate(self.waveforms):
+            if name == "sine":
+                waves[:, i] = np.sin(2 * math.pi * x[:, i])
+            elif name == "square":
+                waves[:, i] = np.where(x[:, i] < 0.5, 1.0, -1.0)
+            elif name == "triangle":
+                waves[:, i] = 1 - 4 * np.abs(x[:, i] - 0.5)
+            elif name == "sawtooth":
+                waves[:, i] = 2 * x[:, i] - 1
+            else:
+                waves[:, i] = self.rng.uniform(-1, 1, count)
+        values = center + 0.4 * span * waves
+        values += self.rng.uniform(-0.025, 0.025, values.shape) * span
+        values = np.clip(np.round(values), self.minimum, self.maximum)  # 确保在范围内
+        
+        # 0/1通道: 增加1出现的概率，每5次数据中随机出现1-2次高温(1)
+        binary = np.flatnonzero(self.binary)
+        if len(binary):
+            values[:, binary] = self.rng.random((count, len(binary))) < 0.3
+        return values
+
+    # 生成自上次以来应生成的一批模拟数据，时间戳均匀分布在两次生成之间
+    def generate_data(self):
+        timestamp = time.time()
+        count = self.expected_count(time.monotonic() - self._start_time) - self._run_count
+        if count <= 0:
+            return
+        self._run_count += count
+        timestamps = self._last_timestamp + (timestamp - self._last_timestamp) * np.arange(1, count + 1) / count
+        self._last_timestamp = timestamp
+        values = self.generate_samples(count)
+        
+        if self.pty_master is not None:
+            self.write_pty(values)
+        else:
+            self.samples_generated.emit(timestamps, values)
+        
+        # 逐条数据的调试日志，未启用时只有一次级别判断
+        if sim_log.isEnabledFor(logging.DEBUG):
+            for row in values.tolist():
+                sim_log.debug("生成模拟数据: %s", ", ".join(f"{channel.label}={channel.format_value(value)}"
+                                                           for channel, value in zip(self.channels, row)))
+
+    # 打开pty虚拟串口，之后生成的数据按protocol("ascii"或"binary")编码后写入pty，不再通过信号发出
+    # 返回读取端要连接的串口路径，仅支持Linux/macOS
+    def open_pty(self, protocol="ascii"):
+        import pty  # pty只在类Unix系统上可用，需要时才导入
+        import tty
+        self.close_pty()
+        self.pty_master, self.pty_slave = pty.openpty()
+        tty.setraw(self.pty_slave)
+        os.set_blocking(self.pty_master, False)  # 读取端来不及读取时不阻塞界面
+        self.pty_path = os.ttyname(self.pty_slave)
+        self.protocol = protocol
+        sim_log.info("模拟数据输出到虚拟串口: %s, 协议: %s", self.pty_path, protocol)
+        return self.pty_path
+
+    # 关闭pty虚拟串口，之后恢复通过信号发出数据
+    def close_pty(self):
+        if self.pty_master is None:
+            return
+        os.close(self.pty_master)
+        os.close(self.pty_slave)
+        self.pty_master = None
+        self.pty_slave = None
+        self.pty_path = None
+        self.pending_bytes.clear()
+
+    # 按协议编码一批样本，与真实设备发送的数据格式相同
+    def encode(self, values):
+        rows = values.astype(np.int64).tolist()
+        if self.protocol == "binary":
+            return b"".join([BinaryFrameDecoder.encode_frame(self.channels, row) for row in rows])
+        return "".join([",".join(map(str, row)) + "\n" for row in rows]).encode()
+
+    # 把一批样本写入pty，写不完的部分留到下次，积压过多时丢弃
+    def write_pty(self, values):
+        self.pending_bytes += self.encode(values)
+        try:
+            written = os.write(self.pty_master, self.pending_bytes)
+        except BlockingIOError:
+            written = 0
+        del self.pending_bytes[:written]
+        if len(self.pending_bytes) > self.MAX_PENDING_BYTES:
+            self.overrun_bytes += len(self.pending_bytes)
+            sim_log.warning("虚拟串口积压过多，丢弃 %d 字节", len(self.pending_bytes))
+            self.pending_bytes.clear()
+
+# 共享内存中的样本环形缓冲区，由采集进程写入，界面进程直接映射读取，两个进程之间不经过管道和序列化
+# 布局: 文件头 int64[16] | 时间戳 float64[容量] | 设备ID int64[容量] | 数值 float64[容量, 通道数] | 统计信息(JSON)
+# 只有一个写入方，写入前把 pending_seq 设为写完后的序号，写完后再更新 write_seq(累计写入的样本数)；
+# 读取方记住自己读到的序号，复制数据后再检查 pending_seq，其间可能被覆盖的样本算作丢失，写入方从不等待读取方
+# 统计信息区用 stats_seq 作顺序锁: 写入前后各加1，读取方看到奇数或前后不一致时放弃本次读取
+class SharedSampleRing:
+
+    MAGIC = 0x31474E5253534E53  # "SNSSRNG1"
+    DEFAULT_CAPACITY = 1 << 18  # 默认容量(样本数)
+    STATS_BYTES = 64 * 1024  # 统计信息区的大小
+    HEARTBEAT_TIMEOUT_MS = 5000  # 心跳超过该时长没有更新时认为写入进程已退出
+
+    # 文件头中各字段的位置
+    HEADER_SIZE = 16 * 8
+    _MAGIC, _CAPACITY, _WIDTH, _WRITE_SEQ, _PENDING_SEQ, _WRITER_PID, _HEARTBEAT_MS, _STATS_SEQ, _STATS_LEN = range(9)
+
+    # 映射已经打开的共享内存，owner为True时由本对象在关闭时删除共享内存
+    def __init__(self, shm, owner=False):
+        self.shm = shm
+        self.name = shm.name
+        self.owner = owner
+        self.header = np.ndarray((16,), dtype=np.int64, buffer=shm.buf)
+        self.capacity = int(self.header[self._CAPACITY])
+        self.width = int(self.header[self._WIDTH])
+        offset = self.HEADER_SIZE
+        self.timestamps = np.ndarray((self.capacity,), dtype=np.float64, buffer=shm.buf, offset=offset)
+        offset += self.capacity * 8
+        self.device_ids = np.ndarray((self.capacity,), dtype=np.int64, buffer=shm.buf, offset=offset)
+        offset += self.capacity * 8
+        self.values = np.ndarray((self.capacity, self.width), dtype=np.float64, buffer=shm.buf, offset=offset)
+        offset += self.capacity * self.width * 8
+        self.stats = np.ndarray((self.STATS_BYTES,), dtype=np.uint8, buffer=shm.buf, offset=offset)
+
+    # 由数据库路径生成默认的共享内存名称，同一个数据库的采集进程和界面使用相同的名称
+    @staticmethod
+    def default_name(db_name):
+        return f"sensor_{binascii.crc32(os.path.abspath(db_name).encode()):08x}"
+
+    # 共享内存的总字节数
+    @classmethod
+    def size(cls, capacity, width):
+        return cls.HEADER_SIZE + capacity * (16 + 8 * width) + cls.STATS_BYTES
+
+    # 创建共享内存，width为通道数，capacity为容量(样本数)
+    # 同名的共享内存已存在时，写入进程仍在运行则抛出RuntimeError，否则删除后重新创建
+    @classmethod
+    def create(cls, name, width, capacity=DEFAULT_CAPACITY):
+        size = cls.size(capacity, width)
+        try:
+            shm = shared_memory.SharedMemory(name, create=True, size=size)
+        except FileExistsError:
+            old = cls.attach(name)
+            pid = old.writer_pid
+            alive = old.writer_alive()
+            old.close()
+            if alive:
+                raise RuntimeError(f"共享内存 {name} 正在被采集进程 {pid} 使用")
+            shared_memory.SharedMemory(name).unlink()
+            shm = shared_memory.SharedMemory(name, create=True, size=size)
+        header = np.ndarray((16,), dtype=np.int64, buffer=shm.buf)
+        header[:] = 0
+        header[cls._CAPACITY] = capacity
+        header[cls._WIDTH] = width
+        header[cls._WRITER_PID] = os.getpid()
+        header[cls._HEARTBEAT_MS] = int(time.time() * 1000)
+        header[cls._MAGIC] = cls.MAGIC
+        del header
+        return cls(shm, owner=True)
+
+    # 打开已有的共享内存，不存在时抛出FileNotFoundError，不是本格式时抛出ValueError
+    @classmethod
+    def attach(cls, name):
+        try:
+            shm = shared_memory.SharedMemory(name, track=False)
+        except TypeError:
+            # Python 3.13之前打开的共享内存也会登记到resource_tracker，本进程退出时会被删除，需要取消登记
+            shm = shared_memory.SharedMemory(name)
+            if os.name == "posix":
+                resource_tracker.unregister(shm._name, "shared_memory")
+        header = np.ndarray((16,), dtype=np.int64, buffer=shm.buf)
+        valid = (shm.size >= cls.HEADER_SIZE and header[cls._MAGIC] == cls.MAGIC
+                 and shm.size >= cls.size(int(header[cls._CAPACITY]), int(header[cls._WIDTH])))
+        del header
+        if not valid:
+            shm.close()
+            raise ValueError(f"共享内存 {name} 不是样本环形缓冲区")
+        return cls(shm)
+
+    # 累计写入的样本数
+    @property
+    def write_seq(self):
+        return int(self.header[self._WRITE_SEQ])
+
+    # 写入进程的PID
+    @property
+    def writer_pid(self):
+        return int(self.header[self._WRITER_PID])
+
+    # 写入一批样本，超过容量时只保留最后的部分；只能在一个线程中调用
+    def write(self, timestamps, values, device_ids):
+        count = len(timestamps)
+        if not count:
+            return
+        seq = int(self.header[self._WRITE_SEQ])
+        end = seq + count
+        if count > self.capacity:
+            skip = count - self.capacity
+            timestamps, values, device_ids = timestamps[skip:], values[skip:], device_ids[skip:]
+            seq += skip
+            count = self.capacity
+        self.header[self._PENDING_SEQ] = end
+        pos = seq % self.capacity
+        first = min(count, self.capacity - pos)
+        self.timestamps[pos:pos + first] = timestamps[:first]
+        self.device_ids[pos:pos + first] = device_ids[:first]
+        self.values[pos:pos + first] = values[:first]
+        if first < count:
+            self.timestamps[:count - first] = timestamps[first:]
+            self.device_ids[:count - first] = device_ids[first:]
+            self.values[:count - first] = values[first:]
+        self.header[self._WRITE_SEQ] = end
+
+    # 读取序号since之后的样本，返回 (新的序号, 时间戳数组, 数值数组, 设备ID数组, 丢失的样本数)
+    # 读取方落后超过容量或读取期间被覆盖的样本计为丢失
+    def read(self, since):
+        seq = int(self.header[self._WRITE_SEQ])
+        start = min(max(since, seq - self.capacity), seq)
+        lost = start - since if since < start else 0
+        count = seq - start
+        if count <= 0:
+            return seq, np.empty(0), np.empty((0, self.width)), np.empty(0, dtype=np.int64), lost
+        
+        pos = start % self.capacity
+        first = min(count, self.capacity - pos)
+        parts = [(pos, pos + first)] + ([(0, count - first)] if first < count else [])
+        timestamps = np.concatenate([self.timestamps[a:b] for a, b in parts])
+        values = np.concatenate([self.values[a:b] for a, b in parts])
+        device_ids = np.concatenate([self.device_ids[a:b] for a, b in parts])
+        
+        # 复制期间写入方可能已经覆盖了最早的一部分
+        overwritten = min(count, int(self.header[self._PENDING_SEQ]) - self.capacity - start)
+        if overwritten > 0:
+            timestamps, values, device_ids = timestamps[overwritten:], values[overwritten:], device_ids[overwritten:]
+            lost += overwritten
+        return seq, timestamps, values, device_ids, lost
+
+    # 更新心跳时间
+    def heartbeat(self):
+        self.header[self._HEARTBEAT_MS] = int(time.time() * 1000)
+
+    # 写入进程是否仍在运行(心跳在超时时间内)
+    def writer_alive(self):
+        return time.time() * 1000 - self.header[self._HEARTBEAT_MS] < self.HEARTBEAT_TIMEOUT_MS
+
+    # 写入统计信息，stats为可以转换为JSON的字典
+    def publish_stats(self, stats):
+        data = np.frombuffer(json.dumps(stats, ensure_ascii=False).encode("utf-8"), dtype=np.uint8)
+        if len(data) > self.STATS_BYTES:
+            app_log.warning("统计信息 %d 字节，超过共享内存统计区的大小，未写入", len(data))
+            return
+        self.header[self._STATS_SEQ] += 1
+        self.stats[:len(data)] = data
+        self.header[self._STATS_LEN] = len(data)
+        self.header[self._STATS_SEQ] += 1
+
+    # 读取统计信息，返回 (统计序号, 字典)；序号与last_seq相同或正在写入时返回 (last_seq, None)
+    def read_stats(self, last_seq=-1):
+        seq = int(self.header[self._STATS_SEQ])
+        if seq == last_seq or seq % 2 or seq == 0:
+            return last_seq, None
+        data = self.stats[:int(self.header[self._STATS_LEN])].tobytes()
+        if int(self.header[self._STATS_SEQ]) != seq:
+            return last_seq, None
+        return seq, json.loads(data.decode("utf-8"))
+
+    # 关闭映射，创建方同时删除共享内存
+    def close(self):
+        if self.shm is None:
+            return
+        self.header = self.timestamps = self.device_ids = self.values = self.stats = None
+        self.shm.close()
+        if self.owner:
+            try:
+                self.shm.unlink()
+            except FileNotFoundError:
+                pass
+        self.shm = None
+
+# 独立采集进程的界面端，提供 SerialManager 中界面用到的接口
+# 采集进程(无界面模式，指定 --ring)负责串口读取、合并和写入数据库，并把合并后的样本写入共享内存环形缓冲区；
+# 这里在界面线程中定时读取新样本并发出 samples_received，界面卡顿、弹出对话框或崩溃都不会影响采集和存储
+# command为启动采集进程的命令行，为空时只连接已经在运行的采集进程
+class RemoteAcquisition(QObject):
+
+    # 定义信号
+    samples_received = pyqtSignal(object, object, object)  # 接收时间戳(s)数组, (样本数, 通道数) 的数值数组, 设备ID数组
+    connection_status = pyqtSignal(bool, str)  # 是否有设备连接, 消息
+
+    # 等待采集进程创建共享内存的最长时间(s)
+    START_TIMEOUT = 15.0
+
+    # 初始化，ring_name为共享内存名称，poll_interval为读取间隔(s)
+    def __init__(self, ring_name, command=None, poll_interval=0.02):
+        super().__init__()
+        self.ring_name = ring_name
+        self.command = command
+        self.process = None  # 由本进程启动的采集进程
+        self.ring = None
+        self.read_seq = 0
+        self.stats = {}  # 采集进程最近一次发布的统计信息
+        self._stats_seq = -1
+        self._status_count = 0  # 已转发的采集进程状态消息数
+        self._writer_alive = False
+        self._start_deadline = 0.0
+        
+        # 统计计数
+        self.samples_received_count = 0
+        self.lost_samples = 0
+        self.backlog = 0  # 最近一次读取时尚未读取的样本数
+        self.high_water = 0
+        
+        self.timer = QTimer()
+        self.timer.timeout.connect(self.poll)
+        self.poll_interval = poll_interval
+
+    # 连接正在运行的采集进程，没有时按command启动一个
+    def start(self):
+        if not self._attach():
+            if self.command is None:
+                self.connection_status.emit(False, f"未找到采集进程 (共享内存 {self.ring_name})")
+                return
+            app_log.info("启动采集进程: %s", " ".join(self.command))
+            # 采集进程使用独立的会话，终端中的Ctrl+C只发给界面进程，界面退出时由 close 停止采集进程
+            self.process = subprocess.Popen(self.command, start_new_session=os.name == "posix")
+            self._start_deadline = time.monotonic() + self.START_TIMEOUT
+        self.timer.start(int(self.poll_interval * 1000))
+
+    # 打开共享内存并从当前位置开始读取，写入进程不在运行时返回False
+    def _attach(self):
+        try:
+            ring = SharedSampleRing.attach(self.ring_name)
+        except (FileNotFoundError, ValueError):
+            return False
+        if not ring.writer_alive():
+            ring.close()
+            return False
+        self.ring = ring
+        self.read_seq = ring.write_seq
+        self._writer_alive = True
+        app_log.info("已连接采集进程 %d (共享内存 %s, 容量 %d)", ring.writer_pid, ring.name, ring.capacity)
+        self.connection_status.emit(True, f"已连接采集进程 {ring.writer_pid}")
+        return True
+
+    # 读取新样本和统计信息，并检查采集进程的状态
+    def poll(self):
+        if self.ring is None:
+            if self.process is not None and self.process.poll() is not None:
+                self.timer.stop()
+                self.connection_status.emit(False, f"采集进程已退出 (退出码 {self.process.returncode})")
+            elif not self._attach() and time.monotonic() > self._start_deadline:
+                self.timer.stop()
+                self.connection_status.emit(False, "等待采集进程启动超时")
+            return
+        
+        ring = self.ring
+        self.backlog = ring.write_seq - self.read_seq
+        self.high_water = max(self.high_water, min(self.backlog, ring.capacity))
+        self.read_seq, timestamps, values, device_ids, lost = ring.read(self.read_seq)
+        if lost:
+            self.lost_samples += lost
+            app_log.warning("界面读取落后，共享内存中 %d 条样本被覆盖，未显示", lost)
+        if len(timestamps):
+            self.samples_received_count += len(timestamps)
+            self.samples_received.emit(timestamps, values, device_ids)
+        
+        self._stats_seq, stats = ring.read_stats(self._stats_seq)
+        if stats is not None:
+            self.stats = stats
+            count, connected, message = stats.get("status", (0, False, ""))
+            if count != self._status_count:
+                self._status_count = count
+                self.connection_status.emit(connected, message)
+        
+        alive = ring.writer_alive()
+        if alive != self._writer_alive:
+            self._writer_alive = alive
+            self.connection_status.emit(alive and self.is_connected, "采集进程已恢复" if alive else "采集进程无响应")
+
+    # 采集进程是否有设备处于连接状态
+    @property
+    def is_connected(self):
+        return bool(self.stats.get("connected"))
+
+    # 采集进程中的各设备: {串口名称: 统计信息}
+    @property
+    def readers(self):
+        return self.stats.get("devices", {})
+
+    # 指定串口是否由采集进程连接
+    def is_port_connected(self, port_name):
+        return port_name in self.readers
+
+    # 串口由采集进程管理，这里只列出采集进程连接的串口
+    def get_available_ports(self):
+        return list(self.readers)
+
+    # 各设备的统计信息，由采集进程定期发布
+    def get_device_stats(self):
+        return self.readers
+
+    # 采集进程中各队列的统计，以及共享内存环形缓冲区的统计(名称为ring，读取落后时覆盖最早的样本)
+    def get_queue_stats(self):
+        stats = dict(self.stats.get("queues", {}))
+        stats["ring"] = {
+            "policy": "drop_oldest",
+            "capacity": self.ring.capacity if self.ring is not None else 0,
+            "depth": self.backlog,
+            "batches": 0,
+            "high_water": self.high_water,
+            "max_batches": 0,
+            "put_samples": self.samples_received_count + self.lost_samples,
+            "dropped_samples": self.lost_samples,
+            "decimated_samples": 0,
+            "blocked_count": 0,
+            "blocked_time_s": 0.0,
+        }
+        return stats
+
+    # 各处理阶段的延迟直方图在采集进程中，界面进程没有
+    def get_histograms(self):
+        return []
+
+    # 停止读取；采集进程由本进程启动时停止它(SIGTERM，写完剩余数据后退出)，否则保持运行
+    def close(self):
+        self.timer.stop()
+        if self.process is not None and self.process.poll() is None:
+            self.process.terminate()
+            try:
+                self.process.wait(15)
+            except subprocess.TimeoutExpired:
+                app_log.error("采集进程没有按时退出，强制结束")
+                self.process.kill()
+                self.process.wait()
+        if self.ring is not None:
+            self.ring.close()
+            self.ring = None
+
+# 无界面采集服务，串口/模拟数据 -> 数据库，不创建任何窗口，适合长时间在服务器上记录数据
+# 收到SIGTERM或SIGINT时停止采集，写完队列中的数据后退出，并定期打印吞吐量统计
+class HeadlessDaemon(QObject):
+
+    # 初始化无界面采集服务
+    # ports为要连接的串口列表，simulate为True时同时生成模拟数据，stats_interval为统计输出间隔(s)
+    # simulator_options为 DataSimulator 的参数，sim_pty为True时模拟数据经pty虚拟串口按protocol编码后读取
+    # metrics_file为Prometheus文本格式的性能指标文件，为空时不写文件
+    # queues为 {队列名称: (策略, 容量)}，未指定的队列使用 QUEUE_DEFAULTS
+    # ring为共享内存名称，指定时把合并后的样本和统计信息发布到 SharedSampleRing，供界面进程读取
+    # (共享内存已被其他采集进程使用时抛出RuntimeError)，ring_capacity为其容量(样本数)
+    # storage和max_error为原始数据的存储方式和压缩的允许误差，archive和archive_days为过期原始数据的归档目录和保留天数，
+    # 见 DatabaseManager
+    def __init__(self, channels, db_name="sensor_data.db", ports=(), baud_rate=115200,
+                 protocol="ascii", simulate=False, stats_interval=10.0, simulator_options=None, sim_pty=False,
+                 metrics_file=None, metrics_interval=15.0, queues=None, ring=None,
+                 ring_capacity=SharedSampleRing.DEFAULT_CAPACITY, storage="raw", max_error=None,
+                 archive=None, archive_days=None):
+        super().__init__()
+        self.channels = channels
+        self.ports = list(ports)
+        self.baud_rate = baud_rate
+        self.protocol = protocol
+        self.simulate = simulate
+        self.stats_interval = stats_interval
+        self._last_samples = 0
+        self._last_stats_time = time.monotonic()
+        self._start_time = time.monotonic()
+        
+        # 先创建共享内存，已被其他采集进程使用时不再启动任何线程
+        self.ring = SharedSampleRing.create(ring, len(channels), ring_capacity) if ring else None
+        self._status = (0, False, "")  # 发布给界面的状态: (消息序号, 是否有设备连接, 消息)
+        
+        # 合并后的数据在合并线程中直接更新滚动统计并写入数据库，不经过事件循环
+        queues = dict(QUEUE_DEFAULTS, **(queues or {}))
+        self.db_manager = DatabaseManager(db_name, channels, queue_policy=queues["storage"][0],
+                                          queue_capacity=queues["storage"][1], storage=storage,
+                                          max_error=max_error, archive=archive, archive_days=archive_days)
+        self.rolling_stats = RollingStats(channels)
+        self.serial_manager = SerialManager(channels, self.store_samples, queues)
+        self.data_simulator = DataSimulator(channels, **(simulator_options or {})) if simulate else None
+        if self.data_simulator is not None and sim_pty:
+            # 模拟设备与真实串口一样连接
+            self.ports.append(self.data_simulator.open_pty(protocol))
+        elif self.data_simulator is not None:
+            self.simulator_device_id = self.db_manager.get_device_id("模拟数据")
+            self.data_simulator.samples_generated.connect(self.on_simulated_samples)
+        
+        # 统计输出定时器
+        self.stats_timer = QTimer()
+        self.stats_timer.timeout.connect(self.print_stats)
+        
+        # 各处理阶段的延迟统计和各队列的统计
+        self.event_loop_monitor = EventLoopMonitor()
+        self.performance_monitor = PerformanceMonitor(metrics_file, metrics_interval)
+        for stage in self.serial_manager.get_histograms() + self.db_manager.get_histograms():
+            self.performance_monitor.add_stage(*stage)
+        self.performance_monitor.add_stage("rolling_stats", "滚动统计更新(每批)", self.rolling_stats.update_histogram)
+        self.performance_monitor.add_stage("event_loop_lag", "事件循环延迟", self.event_loop_monitor.histogram)
+        self.performance_monitor.add_queues(self.serial_manager.get_queue_stats)
+        self.performance_monitor.add_queues(self.db_manager.get_queue_stats)
+        self.performance_monitor.add_metrics(
+            lambda: self.rolling_stats.prometheus_lines(dict(self.db_manager.get_devices())))
+        
+        # Qt事件循环运行时Python不会处理信号，定时唤醒解释器以便及时响应SIGTERM
+        self.signal_timer = QTimer()
+        self.signal_timer.timeout.connect(lambda: None)
+        
+        # 合并后的样本写入共享内存，心跳和统计信息定期更新
+        self.publish_timer = QTimer()
+        self.publish_timer.timeout.connect(self.publish_stats)
+        if self.ring is not None:
+            self.serial_manager.samples_received.connect(self.ring.write)
+            self.serial_manager.connection_status.connect(self.on_connection_status)
+
+    # 连接串口并开始采集，串口暂时无法打开时在后台重试
+    def start(self):
+        for port in self.ports:
+            device_id = self.db_manager.get_device_id(port)
+            self.serial_manager.connect_port(port, self.baud_rate, self.protocol, device_id, retry=True)
+        if self.data_simulator is not None:
+            self.data_simulator.start()
+        self.stats_timer.start(int(self.stats_interval * 1000))
+        self.signal_timer.start(200)
+        self.event_loop_monitor.start()
+        if self.ring is not None:
+            self.publish_stats()
+            self.publish_timer.start(500)
+            app_log.info("样本发布到共享内存 %s, 容量 %d", self.ring.name, self.ring.capacity)
+        app_log.info("无界面采集已启动: 串口 %s, 模拟数据 %s, 数据库 %s", ", ".join(self.ports) or "无",
+                     "开启" if self.simulate else "关闭", self.db_manager.db_name)
+
+    # 模拟数据作为一个独立的设备并入数据流
+    def on_simulated_samples(self, timestamps, values):
+        self.serial_manager.put_samples(self.simulator_device_id, timestamps, values)
+
+    # 存储合并后的一批数据，在合并线程中调用: 更新滚动统计并写入数据库
+    def store_samples(self, timestamps, values, device_ids):
+        self.rolling_stats.update(timestamps, values, device_ids)
+        self.db_manager.insert_batch(timestamps, values, device_ids)
+
+    # 记录串口状态变化，随统计信息发布给界面
+    def on_connection_status(self, connected, message):
+        self._status = (self._status[0] + 1, connected, message)
+
+    # 更新共享内存中的心跳和统计信息(各设备、各队列和写入线程)
+    def publish_stats(self):
+        self.ring.heartbeat()
+        self.ring.publish_stats({
+            "connected": self.serial_manager.is_connected or self.data_simulator is not None,
+            "status": self._status,
+            "devices": self.serial_manager.get_device_stats(),
+            "queues": self.performance_monitor.get_queue_stats(),
+            "writer": self.db_manager.get_writer_stats(),
+        })
+
+    # 打印自上次输出以来的吞吐量，以及各设备、合并线程、写入线程和各队列的统计
+    def print_stats(self):
+        now = time.monotonic()
+        writer = self.db_manager.get_writer_stats()
+        merger = self.serial_manager.merger.get_stats()
+        received = merger["samples_merged"]
+        rate = (received - self._last_samples) / max(1e-6, now - self._last_stats_time)
+        self._last_samples = received
+        self._last_stats_time = now
+        
+        app_log.info("[统计] 运行 %.0f s, 接收 %d 条 (%.1f 条/s), 已写入 %d 条 (原始数据表 %d 行), 写入队列 %d, "
+                     "平均提交耗时 %.2f ms, 迟到样本 %d", now - self._start_time, received, rate,
+                     writer["rows_written"], writer["rows_stored"], writer["queue_depth"],
+                     writer["avg_flush_latency_ms"], merger["late_samples"])
+        for name, device in self.serial_manager.get_device_stats().items():
+            state = "已连接" if device["connected"] else "重连中"
+            app_log.info("[统计] %s (%s): %.1f 条/s, %.0f 字节/s, 解析错误 %d, 读取错误 %d, 重连 %d",
+                         name, state, device["samples_per_s"], device["bytes_per_s"], device["parse_errors"],
+                         device["read_errors"], device["reconnect_count"])
+        app_log.info("[统计] 延迟 p50/p99 (ms): %s", ", ".join(
+            f"{stage['stage']} {stage['p50'] * 1000:.2f}/{stage['p99'] * 1000:.2f}"
+            for stage in self.performance_monitor.get_stats() if stage["count"]))
+        app_log.info("[统计] 队列 深度/最高/容量, 丢弃, 抽稀: %s", ", ".join(
+            f"{name}({stats['policy']}) {stats['depth']}/{stats['high_water']}/{stats['capacity']}, "
+            f"{stats['dropped_samples']}, {stats['decimated_samples']}"
+            for name, stats in self.performance_monitor.get_queue_stats().items()))
+        devices = dict(self.db_manager.get_devices())
+        for device_id in self.rolling_stats.device_ids():
+            snapshot = self.rolling_stats.snapshot(device_id)
+            for i, channel in enumerate(self.channels):
+                app_log.info("[统计] %s %s: %s", devices.get(device_id, device_id), channel.label,
+                             self.rolling_stats.format_channel(i, snapshot))
+
+    # 停止采集: 先停止数据源，合并线程发出剩余数据并写入数据库后再关闭数据库
+    def stop(self):
+        self.stats_timer.stop()
+        self.signal_timer.stop()
+        self.publish_timer.stop()
+        self.event_loop_monitor.stop()
+        if self.data_simulator is not None:
+            self.data_simulator.stop()
+        self.serial_manager.close()
+        if self.data_simulator is not None:
+            self.data_simulator.close_pty()
+        QCoreApplication.processEvents()  # 处理合并线程最后发出的数据
+        self.db_manager.close(timeout=10.0)
+        if self.ring is not None:
+            self.ring.close()
+        self.print_stats()
+        self.performance_monitor.stop()
+
+# 解析突发模式参数 "周期,持续时间,倍数"
+def parse_burst(text):
+    try:
+        burst_period, burst_duration, multiplier = (float(part) for part in text.split(","))
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"突发模式格式应为 周期,持续时间,倍数: {text}")
+    return burst_period, burst_duration, multiplier
+
+# 解析队列参数 "名称=策略[,容量]"
+def parse_queue(text):
+    name, _, spec = text.partition("=")
+    policy, _, capacity = spec.partition(",")
+    name = name.strip()
+    policy = policy.strip().replace("-", "_")
+    try:
+        if name not in QUEUE_DEFAULTS or policy not in BoundedQueue.POLICIES:
+            raise ValueError
+        capacity = int(capacity) if capacity.strip() else QUEUE_DEFAULTS[name][1]
+        if capacity <= 0:
+            raise ValueError
+    except ValueError:
+        raise argparse.ArgumentTypeError(
+            f"队列参数格式应为 名称=策略[,容量]，名称为 {'/'.join(QUEUE_DEFAULTS)}，"
+            f"策略为 {'/'.join(BoundedQueue.POLICIES)}: {text}")
+    return name, (policy, capacity)
+
+# 解析时间参数，可以是毫秒时间戳或本地时间，如 "2024-05-01 08:00" 或 "2024-05-01T08:00:30"
+def parse_time_ms(text):
+    if text.strip().isdigit():
+        return int(text)
+    try:
+        return int(datetime.fromisoformat(text.strip()).timestamp() * 1000)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"时间格式应为毫秒时间戳或 YYYY-MM-DD HH:MM[:SS]: {text}")
+
+# 由命令行参数生成各队列的 (策略, 容量)
+def queue_options(args):
+    return dict(QUEUE_DEFAULTS, **dict(args.queue))
+
+# 由命令行参数生成 DataSimulator 的参数
+def simulator_options(args):
+    return {"rate": args.sim_rate, "waveform": args.sim_waveform, "seed": args.sim_seed, "burst": args.sim_burst}
+
+# 解析命令行参数
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="基于Qt上位机的数据可视化系统")
+    parser.add_argument("--headless", action="store_true", help="无界面模式，只采集并写入数据库")
+    parser.add_argument("--port", action="append", default=[],
+                        help="要连接的串口，可以多次指定以同时采集多个设备")
+    parser.add_argument("--baud", type=int, default=115200, help="波特率，默认115200")
+    parser.add_argument("--protocol", choices=("ascii", "binary"), default="ascii",
+                        help="数据协议: ascii(文本行) 或 binary(二进制帧)")
+    parser.add_argument("--simulate", action="store_true", help="生成模拟数据")
+    parser.add_argument("--sim-rate", type=float, default=1.0, help="模拟数据每秒样本数，默认1")
+    parser.add_argument("--sim-waveform", choices=DataSimulator.WAVEFORMS, default="sine",
+                        help="模拟量通道的波形，默认sine")
+    parser.add_argument("--sim-seed", type=int, default=None, help="模拟数据的随机数种子，用于复现")
+    parser.add_argument("--sim-burst", type=parse_burst, default=None, metavar="周期,持续时间,倍数",
+                        help="突发模式，例如 10,2,20 表示每10秒中有2秒速率为20倍")
+    parser.add_argument("--sim-pty", action="store_true",
+                        help="模拟数据写入pty虚拟串口，经串口读取线程接收(仅Linux/macOS)")
+    parser.add_argument("--db", default="sensor_data.db", help="数据库文件，默认sensor_data.db")
+    parser.add_argument("--channels", default="channels.json", help="通道配置文件，默认channels.json")
+    parser.add_argument("--storage", choices=DatabaseManager.STORAGE_MODES, default="raw",
+                        help="原始数据的存储方式: raw保存每个样本；compressed写入时压缩，0/1通道按游程保存，"
+                        "模拟量通道按配置的旋转门/死区方法在允许误差内只保存转折点，查询时自动还原，默认raw")
+    parser.add_argument("--max-error", type=float, default=None, metavar="误差",
+                        help="压缩存储时所有模拟量通道的允许误差，默认使用通道配置中的max_error")
+    parser.add_argument("--archive", default=None, metavar="目录",
+                        help="超过保留期的原始数据移入该目录下按天分段的列式归档文件(可用numpy.memmap直接读取)，"
+                        "查询和导出同时覆盖数据库和归档，默认直接删除")
+    parser.add_argument("--archive-days", type=float, default=None, metavar="天数",
+                        help="归档的保留天数，超过后按整天删除段文件，默认永久保留")
+    parser.add_argument("--metrics-file", default=None,
+                        help="定期写入Prometheus文本格式的性能指标，供node exporter的textfile collector采集")
+    parser.add_argument("--metrics-interval", type=float, default=15.0, help="性能指标文件的写入间隔(s)，默认15")
+    parser.add_argument("--stats-interval", type=float, default=10.0,
+                        help="无界面模式下统计输出间隔(s)，默认10")
+    parser.add_argument("--export", default=None, metavar="路径",
+                        help="导出数据后退出，路径以.csv结尾时导出CSV文件，否则导出为每列一个.npy文件的目录")
+    parser.add_argument("--export-start", type=parse_time_ms, default=0, metavar="时间",
+                        help="导出的开始时间(本地时间或毫秒时间戳)，默认最早的数据")
+    parser.add_argument("--export-end", type=parse_time_ms, default=None, metavar="时间",
+                        help="导出的结束时间(不含)，默认当前时间")
+    parser.add_argument("--export-device", default=None, metavar="设备",
+                        help="只导出指定设备(设备名称如串口名，或设备ID)，默认导出所有设备")
+    parser.add_argument("--export-format", choices=DataExporter.FORMATS, default=None,
+                        help="导出格式，默认按路径的扩展名选择")
+    parser.add_argument("--vacuum", action="store_true",
+                        help="整理数据库文件并启用增量回收后退出，旧版本创建的数据库需要执行一次；需要独占数据库，应在停止采集后执行")
+    parser.add_argument("--queue", type=parse_queue, action="append", default=[], metavar="名称=策略[,容量]",
+                        help="设置队列满时的策略和容量(样本数)，名称为 ingest(串口->合并)、storage(合并->数据库)、"
+                        "ui(合并->界面)，策略为 block、drop_oldest 或 decimate，例如 --queue ui=drop_oldest,20000")
+    parser.add_argument("--tile-cache-mb", type=float, default=64.0,
+                        help="图形界面历史浏览时缓存数据块占用内存的上限(MB)，默认64")
+    parser.add_argument("--hot-window", type=float, default=HotStore.DEFAULT_WINDOW / 60,
+                        help=f"图形界面: 在内存中保留最近多少分钟的数据，默认{HotStore.DEFAULT_WINDOW // 60}，"
+                        "图表、最近数据的查询和导出直接使用内存中的数据")
+    parser.add_argument("--hot-capacity", type=int, default=HotStore.DEFAULT_CAPACITY,
+                        help=f"图形界面: 内存中每个设备最多保存的样本数，决定占用的内存，默认{HotStore.DEFAULT_CAPACITY}")
+    parser.add_argument("--acquisition-process", action="store_true",
+                        help="图形界面: 串口读取和数据库写入在独立的采集进程中运行，通过共享内存把数据传给界面")
+    parser.add_argument("--ring", default=None, metavar="名称",
+                        help="共享内存名称。无界面模式: 把合并后的样本发布到该共享内存；图形界面: 连接该名称的采集进程，"
+                        "默认按数据库路径生成")
+    parser.add_argument("--ring-capacity", type=int, default=SharedSampleRing.DEFAULT_CAPACITY,
+                        help=f"共享内存环形缓冲区的容量(样本数)，默认{SharedSampleRing.DEFAULT_CAPACITY}")
+    parser.add_argument("--log-level", type=str.upper, default="INFO",
+                        choices=("DEBUG", "INFO", "WARNING", "ERROR", "CRITICAL"), help="日志级别，默认INFO")
+    parser.add_argument("--log-component", type=parse_log_component, action="append", default=[],
+                        metavar="组件=级别", help="单独设置某个组件的日志级别，组件为 serial/db/sim/perf/app/ui，"
+                        "可以多次指定，例如 --log-component serial=DEBUG")
+    parser.add_argument("--log-file", default=None, help="日志写入文件，默认输出到终端")
+    args = parser.parse_args(argv)
+    if args.headless and not args.port and not args.simulate and not args.export and not args.vacuum:
+        parser.error("无界面模式需要至少指定一个 --port 或 --simulate")
+    if args.acquisition_process and not args.port and not args.simulate:
+        parser.error("独立采集进程需要至少指定一个 --port 或 --simulate")
+    return args
+
+# 命令行导出数据，返回进程退出码，Ctrl+C时取消导出并删除部分导出的文件
+# 导出时采集进程可能仍在写入，只读打开数据库和归档，不迁移、不清理任何表，导出不修改数据库
+def export_main(args):
+    if not os.path.exists(args.db):
+        app_log.error("数据库不存在: %s", args.db)
+        return 2
+    if args.archive and not os.path.isdir(args.archive):
+        app_log.error("归档目录不存在: %s", args.archive)
+        return 2
+    try:
+        db_manager = ReadOnlyDatabase(args.db, ChannelRegistry.load(args.channels), args.archive)
+    except (sqlite3.Error, ValueError) as e:
+        app_log.error("无法打开数据库 %s: %s", args.db, e)
+        return 2
+    device_id = args.export_device
+    if device_id is not None:
+        devices = {name: device_id for device_id, name in db_manager.get_devices()}
+        if device_id in devices:
+            device_id = devices[device_id]
+        elif device_id.isdigit() and int(device_id) in devices.values():
+            device_id = int(device_id)
+        else:
+            app_log.error("未知的设备: %s", device_id)
+            db_manager.close()
+            return 2
+    end_ms = args.export_end if args.export_end is not None else int(time.time() * 1000) + 1
+    exporter = DataExporter(db_manager, args.export, args.export_start, end_ms, device_id, args.export_format)
+
+    # 每秒输出一次进度
+    last_report = [time.monotonic()]
+
+    def report(done, total):
+        now = time.monotonic()
+        if now - last_report[0] >= 1.0:
+            last_report[0] = now
+            app_log.info("导出进度: %d/%d (%.0f%%)", done, total, 100 * done / max(1, total))
+
+    signal.signal(signal.SIGINT, lambda signum, frame: exporter.cancel())
+    signal.signal(signal.SIGTERM, lambda signum, frame: exporter.cancel())
+    ok = exporter.run(report)
+    db_manager.close()
+    return 0 if ok else 1
+
+# 命令行执行一次VACUUM，启用增量自动回收并整理数据库文件，返回进程退出码
+# VACUUM期间独占数据库，大数据库上可能需要很长时间，每隔5秒输出一次已耗时
+def vacuum_main(args):
+    if not os.path.exists(args.db):
+        app_log.error("数据库不存在: %s", args.db)
+        return 2
+    size = os.path.getsize(args.db)
+    start = time.monotonic()
+    last_report = [start]
+
+    def report():
+        now = time.monotonic()
+        if now - last_report[0] >= 5.0:
+            last_report[0] = now
+            app_log.info("VACUUM 进行中, 已耗时 %.0f 秒", now - start)
+        return 0
+
+    app_log.info("开始整理数据库 %s (%.1f MB)", args.db, size / 1e6)
+    try:
+        conn = sqlite3.connect(args.db)
+        try:
+            conn.execute("PRAGMA auto_vacuum = INCREMENTAL")
+            conn.set_progress_handler(report, 100000)
+            conn.execute("VACUUM")
+            conn.set_progress_handler(None, 0)
+            conn.execute("PRAGMA journal_mode = WAL")
+        finally:
+            conn.close()
+    except sqlite3.Error as e:
+        app_log.error("VACUUM失败: %s", e)
+        return 1
+    app_log.info("数据库整理完成, %.1f MB -> %.1f MB, 耗时 %.1f 秒",
+                 size / 1e6, os.path.getsize(args.db) / 1e6, time.monotonic() - start)
+    return 0
+
+# 无界面模式入口，返回进程退出码；指定 --export 时导出数据后退出，指定 --vacuum 时整理数据库后退出
+def headless_main(argv=None):
+    args = parse_args(argv)
+    setup_logging(args.log_level, dict(args.log_component), args.log_file)
+    if args.vacuum:
+        return vacuum_main(args)
+    if args.export:
+        return export_main(args)
+    app = QCoreApplication(sys.argv[:1])
+    try:
+        daemon = HeadlessDaemon(ChannelRegistry.load(args.channels), args.db, args.port, args.baud,
+                                args.protocol, args.simulate, args.stats_interval, simulator_options(args),
+                                args.sim_pty, args.metrics_file, args.metrics_interval, queue_options(args),
+                                args.ring, args.ring_capacity, args.storage, args.max_error, args.archive,
+                                args.archive_days)
+    except RuntimeError as e:
+        app_log.error("%s", e)
+        return 1
+
+    # SIGTERM/SIGINT时退出事件循环，由 daemon.stop 完成收尾
+    def request_stop(signum, frame):
+        app_log.info("收到信号 %s，正在停止采集", signal.Signals(signum).name)
+        app.quit()
+    signal.signal(signal.SIGTERM, request_stop)
+    signal.signal(signal.SIGINT, request_stop)
+
+    daemon.start()
+    app.exec_()
+    daemon.stop()
+    app_log.info("无界面采集已停止")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(headless_main(sys.argv[1:] + ["--headless"]))
@@ -0,0 +1,93 @@
+# 压缩存储的测试: PointCompressor 写入的保存点经 DatabaseManager.restore_points 还原后
+# 每个样本的误差不超过允许误差，0/1通道的状态变化不丢失，同一毫秒的多个样本和分在两批的同一毫秒都要覆盖
+import os
+import sys
+
+import numpy as np
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sensor_core import ChannelRegistry, DatabaseManager, PointCompressor  # noqa: E402
+
+MAX_ERROR = 1.0
+TOLERANCE = 1e-9
+
+
+@pytest.fixture
+def db_manager(tmp_path):
+    manager = DatabaseManager(str(tmp_path / "compression.db"), ChannelRegistry.default(),
+                              retention=dict.fromkeys(DatabaseManager.DEFAULT_RETENTION))
+    yield manager
+    manager.close()
+
+
+# 按批压缩后写入原始数据表，再读出并还原，返回 (时间戳数组, (行数, 通道数) 的数值数组)
+def store_and_restore(db_manager, batches):
+    compressor = PointCompressor(db_manager.channels, MAX_ERROR)
+    rows = []
+    for ts_ms, values in batches:
+        rows += compressor.compress(np.asarray(ts_ms, dtype=np.int64), np.asarray(values, dtype=np.float64),
+                                    np.zeros(len(ts_ms), dtype=np.int64))
+    rows += compressor.flush()
+    columns = db_manager.channels.columns
+    conn = db_manager.conn
+    conn.executemany(f"INSERT INTO sensor_data (device_id, ts_ms, {', '.join(columns)}) "
+                     f"VALUES ({', '.join('?' * (len(columns) + 2))})", rows)
+    conn.commit()
+    data = np.array(conn.execute(f"SELECT ts_ms, {', '.join(columns)} FROM sensor_data ORDER BY ts_ms, id")
+                    .fetchall(), dtype=np.float64)
+    data = db_manager.restore_points(conn, data, np.zeros(len(data), dtype=np.int64))
+    assert not np.isnan(data).any()
+    return data[:, 0], data[:, 1:]
+
+
+# 检查每个样本: 同一毫秒的样本原样保存时逐个相同，否则在该时刻的还原值的允许误差内(0/1通道相同)
+def check_restored(ts_ms, values, restored_ts, restored):
+    ts_ms = np.asarray(ts_ms, dtype=np.float64)
+    values = np.asarray(values, dtype=np.float64)
+    for ts in np.unique(ts_ms):
+        samples = values[ts_ms == ts]
+        stored = restored[restored_ts == ts]
+        if len(stored) == len(samples) and np.array_equal(stored, samples):
+            continue
+        assert len(stored) <= 1, f"{ts}: 同一时刻的保存点与样本不一致"
+        expected = np.array([np.interp(ts, restored_ts, restored[:, i]) for i in range(restored.shape[1])])
+        assert np.array_equal(samples[:, 0], np.full(len(samples), expected[0])), f"{ts}: 状态值不一致"
+        assert np.abs(samples[:, 1] - expected[1]).max() <= MAX_ERROR + TOLERANCE, f"{ts}: 超过允许误差"
+    # 按保存顺序的状态变化次数与样本相同
+    assert np.count_nonzero(np.diff(restored[:, 0])) == np.count_nonzero(np.diff(values[:, 0]))
+
+
+def test_pulse_within_one_millisecond(db_manager):
+    ts_ms = [1000, 2000, 2000, 2000, 3000]
+    values = [[0, 50], [0, 0], [1, 100], [0, 0], [0, 50]]
+    restored_ts, restored = store_and_restore(db_manager, [(ts_ms, values)])
+    check_restored(ts_ms, values, restored_ts, restored)
+    assert restored[:, 0].max() == 1
+    assert restored[:, 1].max() == 100
+
+
+def test_millisecond_split_across_batches(db_manager):
+    ts_ms = [1000, 1001, 2000, 2000, 2000, 2001]
+    values = [[0, 50], [0, 50], [0, 50], [1, 80], [0, 50], [0, 50]]
+    batches = [(ts_ms[:3], values[:3]), (ts_ms[3:4], values[3:4]), (ts_ms[4:], values[4:])]
+    restored_ts, restored = store_and_restore(db_manager, batches)
+    check_restored(ts_ms, values, restored_ts, restored)
+    assert restored[:, 0].max() == 1
+    assert restored[:, 1].max() == 80
+
+
+def test_random_batches(db_manager):
+    rng = np.random.default_rng(1)
+    count = 20000
+    ts_ms = np.sort(rng.integers(0, count // 2, count)) + 1000  # 平均每毫秒两个样本
+    thermal = (np.cumsum(rng.random(count) < 0.02) % 2).astype(np.float64)
+    light = 2000 + np.cumsum(rng.normal(0, 0.5, count))
+    light[rng.random(count) < 0.001] += 200  # 偶发的尖峰
+    values = np.column_stack((thermal, light))
+    cuts = np.sort(rng.choice(np.arange(1, count), 50, replace=False))
+    batches = list(zip(np.split(ts_ms, cuts), np.split(values, cuts)))
+    restored_ts, restored = store_and_restore(db_manager, batches)
+    check_restored(ts_ms, values, restored_ts, restored)
+    assert len(restored) < count / 2